@@ -11,7 +11,7 @@ from accessories.models import Accessory, AccessoryCategory
 
 
 class Command(BaseCommand):
-    help = "Seed the database with mock accessories and categories."
+    help = "Seed the database with mock accessories and categories (see seed_bulk for benchmark-sized data)."
 
     def add_arguments(self, parser):
         parser.add_argument('--count', type=int, default=24, help='Number of accessories to create')
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-17 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accessories', '0003_accessoryorder_accessoryorderitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accessory',
+            name='image_manifest',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
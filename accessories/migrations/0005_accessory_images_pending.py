@@ -0,0 +1,33 @@
+# Generated by Django 4.2.24 on 2026-10-17 04:04
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def mark_existing_uploads(apps, schema_editor):
+    """Queue photos uploaded before renditions existed for ``process_images``."""
+    model = apps.get_model('accessories', 'Accessory')
+    has_image = Q()
+    for name in ('image', 'image2', 'image3'):
+        has_image |= Q(**{f'{name}__gt': ''})
+    model.objects.filter(has_image).update(images_pending=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accessories', '0004_accessory_image_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accessory',
+            name='images_pending',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='accessory',
+            index=models.Index(condition=models.Q(('images_pending', True)), fields=['id'], name='accessory_images_pending_idx'),
+        ),
+        migrations.RunPython(mark_existing_uploads, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,12 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from decimal import Decimal
 
+from dogs.images import ImageProcessingMixin
+
 User = get_user_model()
 
 
@@ -22,7 +26,7 @@ class AccessoryCategory(models.Model):
         return self.name
 
 
-class Accessory(models.Model):
+class Accessory(ImageProcessingMixin, models.Model):
     """Model for dog accessories and food"""
     
     CATEGORY_CHOICES = [
@@ -46,6 +50,8 @@ class Accessory(models.Model):
     image = models.ImageField(upload_to='accessories/', blank=True, null=True)
     image2 = models.ImageField(upload_to='accessories/', blank=True, null=True)
     image3 = models.ImageField(upload_to='accessories/', blank=True, null=True)
+    image_manifest = models.JSONField(default=dict, blank=True, editable=False)
+    images_pending = models.BooleanField(default=False, editable=False)
     
     # Seller information
     seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='accessories')
@@ -64,6 +70,8 @@ class Accessory(models.Model):
     # Status
     is_featured = models.BooleanField(default=False)
     is_approved = models.BooleanField(default=True)
+    # Maintained by the AccessoryFavorite signal receivers; see dogs.favorites
+    favorites_count = models.PositiveIntegerField(default=0, editable=False)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -71,6 +79,10 @@ class Accessory(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['id'], name='accessory_images_pending_idx',
+                         condition=models.Q(images_pending=True)),
+        ]
         verbose_name_plural = "Accessories"
     
     def __str__(self):
@@ -78,6 +90,8 @@ class Accessory(models.Model):
     
     def get_absolute_url(self):
         return reverse('accessories:detail', kwargs={'pk': self.pk})
+
+    IMAGE_FIELDS = ('image', 'image2', 'image3')
     
     @property
     def primary_image(self):
@@ -119,6 +133,23 @@ class AccessoryFavorite(models.Model):
         return f"{self.user.username} - {self.accessory.name}"
 
 
+@receiver(post_save, sender=AccessoryFavorite)
+def count_accessory_favorite(sender, instance: AccessoryFavorite, created: bool, **kwargs):
+    from accounts import notifications
+    from dogs.favorites import adjust_favorite_counts
+    if created:
+        adjust_favorite_counts(Accessory, instance.accessory_id, 1)
+        notifications.adjust(instance.user_id, 'favorites_given', 1)
+
+
+@receiver(post_delete, sender=AccessoryFavorite)
+def uncount_accessory_favorite(sender, instance: AccessoryFavorite, **kwargs):
+    from accounts import notifications
+    from dogs.favorites import adjust_favorite_counts
+    adjust_favorite_counts(Accessory, instance.accessory_id, -1)
+    notifications.adjust(instance.user_id, 'favorites_given', -1)
+
+
 class AccessoryOrder(models.Model):
     """Order for accessories via Stripe checkout"""
 
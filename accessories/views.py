@@ -8,19 +8,24 @@ from collections import defaultdict
 import stripe
 from django.conf import settings
 
+from dogs.favorites import annotate_favorites
+from dogs.pagination import CursorPaginationMixin
+
 from .forms import AccessoryForm, AccessorySearchForm
 from .models import Accessory, AccessoryFavorite
 from .models import AccessoryOrder, AccessoryOrderItem
 
 
-class AccessoryListView(ListView):
+class AccessoryListView(CursorPaginationMixin, ListView):
     model = Accessory
     template_name = 'accessories/list.html'
     context_object_name = 'accessories'
     paginate_by = 12
 
     def get_queryset(self):
-        queryset = Accessory.objects.filter(is_available=True, is_approved=True).order_by('-created_at')
+        # Every card shows its seller
+        queryset = (Accessory.objects.filter(is_available=True, is_approved=True)
+                    .select_related('seller').order_by('-created_at'))
         form = AccessorySearchForm(self.request.GET or None)
         if form.is_valid():
             query = form.cleaned_data.get('query')
@@ -45,10 +50,12 @@ class AccessoryListView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['search_form'] = AccessorySearchForm(self.request.GET or None)
-        if self.request.user.is_authenticated and not self.request.user.is_seller:
-            context['favorited_ids'] = set(
-                AccessoryFavorite.objects.filter(user=self.request.user).values_list('accessory_id', flat=True)
-            )
+        # Heart state for the cards on this page only
+        user = self.request.user
+        if user.is_authenticated and user.is_seller:
+            user = None
+        accessories = annotate_favorites(context['object_list'], user)
+        context['favorited_ids'] = {accessory.pk for accessory in accessories if accessory.is_favorited}
         return context
 
 
@@ -104,7 +111,7 @@ def edit_accessory(request, pk):
             return redirect(accessory.get_absolute_url())
     else:
         form = AccessoryForm(instance=accessory)
-    return render(request, 'accessories/edit.html', {'form': form, 'accessory': accessory})
+    return render(request, 'accessories/add.html', {'form': form, 'accessory': accessory})
 
 
 @login_required
@@ -160,7 +167,7 @@ def toggle_accessory_favorite(request, pk):
     return JsonResponse({
         'is_favorited': is_favorited,
         'message': message,
-        'favorites_count': accessory.favorited_by.count()
+        'favorites_count': Accessory.objects.filter(pk=accessory.pk).values_list('favorites_count', flat=True).first()
     })
 
 
@@ -325,6 +332,8 @@ def checkout_pay(request):
         return redirect('accessories:checkout')
 
     stripe.api_key = settings.STRIPE_SECRET_KEY
+    if getattr(settings, 'STRIPE_API_BASE', ''):
+        stripe.api_base = settings.STRIPE_API_BASE
 
     line_items = []
     order_total_cents = 0
@@ -379,7 +388,7 @@ def checkout_pay(request):
 
 
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 
 
 @csrf_exempt
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.24 on 2026-10-17 04:25
+
+from django.db import migrations, models
+from django.db.models import OuterRef
+
+
+def count_existing_favorites(apps, schema_editor):
+    from accounts.notifications import SubqueryCount
+    User = apps.get_model('accounts', 'User')
+    Favorite = apps.get_model('dogs', 'Favorite')
+    User.objects.update(favorites_received_count=SubqueryCount(
+        Favorite.objects.filter(dog__seller=OuterRef('pk')).order_by().values('pk')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_sellerreview_sellerreview_no_self_review'),
+        ('dogs', '0010_dog_favorites_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='favorites_received_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing_favorites, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,163 @@
+"""Cached per-user notification counters.
+
+The navbar badges (``message_notifications``) and the 30s ``notifications_poll``
+read four small integers per user from the cache with one ``get_many``. The
+``Message``/``Order``/``Favorite``/``AccessoryFavorite`` signal receivers keep
+them current with ``cache.incr``, or drop a counter when a change cannot be
+applied as a delta; a missing counter is rebuilt from the database with one
+query. Deltas and drops are applied when the surrounding transaction
+commits, so a rolled-back change never moves a counter.
+``NOTIFICATION_COUNTS_TTL`` bounds how long a missed delta can linger.
+
+The no-query common path needs a cache shared by every worker (Redis via
+``REDIS_URL``). On a per-process cache (``LocMemCache``) the deltas only
+reach the worker that made the change, so counters there live
+``LOCAL_COUNTS_TTL`` seconds and are rebuilt about that often per user;
+``warn_if_cache_is_local`` logs a warning about this at startup outside
+``DEBUG``.
+Unread messages are rebuilt from the per-conversation counters in
+``messaging.state`` and favorites received from the seller's
+``favorites_received_count``, rather than by counting rows.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, IntegerField, QuerySet, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('unread_messages', 'pending_orders', 'favorites_given', 'favorites_received')
+# Longest a worker may show counts another worker has changed, without a shared cache
+LOCAL_COUNTS_TTL = 5
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+class SubqueryCount(Subquery):
+    template = '(SELECT COUNT(*) FROM (%(subquery)s) _count)'
+    output_field = IntegerField()
+
+
+def cache_is_shared(alias='default'):
+    """False when ``CACHES[alias]`` lives in each process, so other workers never see its writes."""
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+def warn_if_cache_is_local():
+    """Called from ``AccountsConfig.ready``: production wants the shared cache."""
+    if not settings.DEBUG and not cache_is_shared():
+        logger.warning('The default cache is per-process: notification badges are recounted from the '
+                       'database every %ss per user. Set REDIS_URL to share counters between workers.',
+                       LOCAL_COUNTS_TTL)
+
+
+def _key(user_id, name):
+    return f'notifications:v1:{user_id}:{name}'
+
+
+def _counter_querysets(user_id):
+    from dogs.models import Favorite, Order
+    from messaging.models import ConversationParticipant
+    from accessories.models import AccessoryFavorite
+    return {
+        'unread_messages': Coalesce(Subquery(
+            ConversationParticipant.objects.filter(user_id=user_id).order_by()
+            .values('user_id').annotate(total=Sum('unread_count')).values('total')
+        ), 0),
+        'pending_orders': Order.objects.filter(dog__seller_id=user_id, status='pending'),
+        'favorites_given': [Favorite.objects.filter(user_id=user_id),
+                            AccessoryFavorite.objects.filter(user_id=user_id)],
+        # Denormalised on the seller row by the Favorite receivers
+        'favorites_received': F('favorites_received_count'),
+    }
+
+
+def compute_counts(user_id):
+    """All counters for one user, straight from the database in a single query."""
+    from accounts.models import User
+    annotations = {}
+    for name, querysets in _counter_querysets(user_id).items():
+        if not isinstance(querysets, list):
+            querysets = [querysets]
+        for i, queryset in enumerate(querysets):
+            # Querysets are counted; anything else is already an expression
+            annotations[f'{name}__{i}'] = (SubqueryCount(queryset.order_by().values('pk'))
+                                           if isinstance(queryset, QuerySet) else queryset)
+    row = User.objects.filter(pk=user_id).annotate(**annotations).values(*annotations).first() or {}
+    counts = dict.fromkeys(COUNTERS, 0)
+    for alias, value in row.items():
+        counts[alias.split('__')[0]] += value or 0
+    return counts
+
+
+def get_counts(user_id):
+    keys = {_key(user_id, name): name for name in COUNTERS}
+    cached = cache.get_many(keys)
+    if len(cached) == len(keys):
+        return {keys[key]: value for key, value in cached.items()}
+    counts = compute_counts(user_id)
+    ttl = getattr(settings, 'NOTIFICATION_COUNTS_TTL', 3600)
+    if not cache_is_shared():
+        ttl = min(ttl, LOCAL_COUNTS_TTL)
+    cache.set_many({_key(user_id, name): value for name, value in counts.items()}, ttl)
+    return counts
+
+
+def badge_payload(user):
+    """The counts ``notifications_poll`` and the event stream send to the browser."""
+    counts = get_counts(user.pk)
+    return {
+        # Unread messages for any user
+        'unread_messages': counts['unread_messages'],
+        # Seller-specific: pending orders for their dogs
+        'seller_pending_orders': counts['pending_orders'] if user.is_seller else 0,
+        # Sellers: favorites on their dogs; buyers: favorites they have added
+        'my_items_favorited_count': (
+            counts['favorites_received'] if user.is_seller else counts['favorites_given']
+        ),
+    }
+
+
+def _counts_changed(user_id):
+    # Open event streams re-read the counters and push them to the tab
+    from messaging.realtime import publish
+    publish([user_id], {'type': 'counts'})
+
+
+def adjust(user_id, name, delta):
+    """Apply a delta to a cached counter; a counter that is not cached is left to be rebuilt."""
+    if not user_id or not delta:
+        return
+
+    def apply():
+        try:
+            cache.incr(_key(user_id, name), delta)
+        except ValueError:
+            pass
+    transaction.on_commit(apply)
+    _counts_changed(user_id)
+
+
+def forget(user_ids, *names, batch_size=1000):
+    """Drop counters for many users at once (no events); they are rebuilt on next read."""
+    names = names or COUNTERS
+    batch = []
+    for user_id in user_ids:
+        batch.extend(_key(user_id, name) for name in names)
+        if len(batch) >= batch_size:
+            cache.delete_many(batch)
+            batch = []
+    if batch:
+        cache.delete_many(batch)
+
+
+def invalidate(user_id, *names):
+    if user_id:
+        keys = [_key(user_id, name) for name in names or COUNTERS]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+        _counts_changed(user_id)
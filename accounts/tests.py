@@ -1,3 +1,102 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accessories.models import Accessory, AccessoryFavorite
+from dogs.models import Favorite, Order
+from dogs.tests import TEST_MEDIA_ROOT, make_dog
+from messaging.models import Conversation, Message
+from .models import User
+from .notifications import LOCAL_COUNTS_TTL, cache_is_shared, compute_counts, get_counts
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class NotificationCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+        cls.buyer = User.objects.create_user(username='buyer', password='pw')
+        cls.dog = make_dog(cls.seller)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_signals_keep_cached_counts_current(self):
+        get_counts(self.seller.pk)
+        get_counts(self.buyer.pk)
+        # Counter deltas are applied when the writes commit
+        with self.captureOnCommitCallbacks(execute=True):
+            conversation = Conversation.objects.create(dog=self.dog)
+            conversation.participants.add(self.buyer, self.seller)
+            Message.objects.create(sender=self.buyer, receiver=self.seller, content='Hi',
+                                   conversation=conversation)
+            Favorite.objects.create(user=self.buyer, dog=self.dog)
+            accessory = Accessory.objects.create(name='Ball', description='d', price='5.00', seller=self.seller)
+            AccessoryFavorite.objects.create(user=self.buyer, accessory=accessory)
+            Order.objects.create(buyer=self.buyer, dog=self.dog, buyer_name='B',
+                                 buyer_email='b@example.com', buyer_phone='1')
+
+        with self.assertNumQueries(0):
+            seller_counts = get_counts(self.seller.pk)
+            buyer_counts = get_counts(self.buyer.pk)
+        self.assertEqual(seller_counts, compute_counts(self.seller.pk))
+        self.assertEqual(buyer_counts, compute_counts(self.buyer.pk))
+        self.assertEqual(seller_counts['unread_messages'], 1)
+        self.assertEqual(seller_counts['pending_orders'], 1)
+        self.assertEqual(seller_counts['favorites_received'], 1)
+        self.assertEqual(buyer_counts['favorites_given'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.get().delete()
+            order = Order.objects.get()
+            order.status = 'accepted'
+            order.save(update_fields=['status'])
+        self.assertEqual(get_counts(self.seller.pk), compute_counts(self.seller.pk))
+        self.assertEqual(get_counts(self.buyer.pk)['favorites_given'], 1)
+
+    def test_reading_a_conversation_clears_the_badge(self):
+        conversation = Conversation.objects.create(dog=self.dog)
+        conversation.participants.add(self.buyer, self.seller)
+        Message.objects.create(sender=self.buyer, receiver=self.seller, content='Hi',
+                               conversation=conversation)
+        self.client.force_login(self.seller)
+        self.assertEqual(self.client.get(reverse('accounts:notifications_poll')).json()['unread_messages'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('messaging:conversation', args=[conversation.pk]))
+        # Session and user lookups only; the counts come from the cache
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse('accounts:notifications_poll')).json()
+        self.assertEqual(data, {'unread_messages': 0, 'seller_pending_orders': 0, 'my_items_favorited_count': 0})
+
+    def test_poll_returns_304_until_counts_change(self):
+        self.client.force_login(self.seller)
+        url = reverse('accounts:notifications_poll')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(sender=self.buyer, receiver=self.seller, content='Hi')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['unread_messages'], 1)
+
+    def test_rolled_back_writes_leave_the_counters_alone(self):
+        get_counts(self.seller.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Message.objects.create(sender=self.buyer, receiver=self.seller, content='Hi')
+                transaction.set_rollback(True)
+        self.assertEqual(get_counts(self.seller.pk)['unread_messages'], 0)
+
+    def test_counts_are_short_lived_on_a_per_process_cache(self):
+        self.assertFalse(cache_is_shared())
+        with mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            get_counts(self.seller.pk)
+        self.assertEqual(set_many.call_args.args[1], LOCAL_COUNTS_TTL)
+        cache.clear()
+        with mock.patch('accounts.notifications.cache_is_shared', return_value=True), \
+                mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            get_counts(self.seller.pk)
+        self.assertEqual(set_many.call_args.args[1], 3600)
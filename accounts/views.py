@@ -9,9 +9,14 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from .models import User
 from .forms import UserRegistrationForm, UserProfileForm
 from .forms import SellerReviewForm
+from .notifications import COUNTERS, badge_payload, get_counts
 from dogs.models import Dog, Favorite, Order
+from dogs.counters import pending_views
 from accessories.models import Accessory
 from django.http import JsonResponse
+from django.db.models import Avg
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
 
 class CustomLoginView(LoginView):
@@ -59,10 +64,15 @@ def dashboard(request):
     
     if request.user.is_seller:
         # Seller dashboard data
-        context['my_dogs'] = Dog.objects.filter(seller=request.user).order_by('-created_at')
-        context['total_dogs'] = context['my_dogs'].count()
-        context['available_dogs'] = context['my_dogs'].filter(status='available').count()
-        context['sold_dogs'] = context['my_dogs'].filter(status='sold').count()
+        my_dogs = list(Dog.objects.filter(seller=request.user).order_by('-created_at'))
+        # Include views still buffered in the counter store
+        unflushed = pending_views(dog.pk for dog in my_dogs)
+        for dog in my_dogs:
+            dog.views_count += unflushed.get(dog.pk, 0)
+        context['my_dogs'] = my_dogs
+        context['total_dogs'] = len(my_dogs)
+        context['available_dogs'] = sum(1 for dog in my_dogs if dog.status == 'available')
+        context['sold_dogs'] = sum(1 for dog in my_dogs if dog.status == 'sold')
         context['pending_orders'] = Order.objects.filter(
             dog__seller=request.user,
             status='pending'
@@ -71,7 +81,7 @@ def dashboard(request):
             dog__seller=request.user,
             status='pending'
         ).count()
-        context['total_views'] = sum(dog.views_count for dog in context['my_dogs'])
+        context['total_views'] = sum(dog.views_count for dog in my_dogs)
         
         # Recent activity
         context['recent_orders'] = Order.objects.filter(
@@ -185,7 +195,7 @@ def seller_profile(request, pk):
         form = SellerReviewForm()
 
     reviews = SellerReview.objects.filter(seller=seller).select_related('reviewer')
-    avg_rating = reviews.aggregate(avg=models.Avg('rating'))['avg'] or 0
+    avg_rating = reviews.aggregate(avg=Avg('rating'))['avg'] or 0
 
     context = {
         'seller_user': seller,
@@ -209,32 +219,19 @@ class CustomLogoutView(LogoutView):
         return super().dispatch(request, *args, **kwargs)
 
 
+def _notifications_etag(request):
+    # The counters are all the response depends on, and they are cached
+    if not request.user.is_authenticated:
+        return None
+    counts = get_counts(request.user.pk)
+    return '-'.join([request.user.role] + [str(counts[name]) for name in COUNTERS])
+
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_notifications_etag)
 def notifications_poll(request):
     """Lightweight polling endpoint for client notifications.
     Returns counts for unread messages, pending orders (for sellers), and favorites on user's items.
     """
-    from messaging.models import Message
-    data = {
-        'unread_messages': 0,
-        'seller_pending_orders': 0,
-        'my_items_favorited_count': 0,
-    }
-
-    # Unread messages for any user
-    data['unread_messages'] = Message.objects.filter(receiver=request.user, is_read=False).count()
-
-    # Seller-specific: pending orders for their dogs
-    if request.user.is_seller:
-        data['seller_pending_orders'] = Order.objects.filter(dog__seller=request.user, status='pending').count()
-        # Favorites on seller's dogs
-        data['my_items_favorited_count'] = Favorite.objects.filter(dog__seller=request.user).count()
-    else:
-        # Buyer: favorites they have added (for badge updates)
-        try:
-            from accessories.models import AccessoryFavorite
-            data['my_items_favorited_count'] = Favorite.objects.filter(user=request.user).count() + AccessoryFavorite.objects.filter(user=request.user).count()
-        except Exception:
-            data['my_items_favorited_count'] = Favorite.objects.filter(user=request.user).count()
-
-    return JsonResponse(data)
\ No newline at end of file
+    return JsonResponse(badge_payload(request.user))
\ No newline at end of file
@@ -128,6 +128,42 @@ else:
     }
 
 
+# Cache
+# Per-process memory cache by default; set REDIS_URL to share it across workers.
+# Production needs Redis: cached notification badges only skip the database
+# when every worker sees the same counters (a warning is logged without it).
+_redis_url = os.environ.get('REDIS_URL', '').strip()
+if _redis_url:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': _redis_url,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds the homepage cards/statistics snapshot is cached for
+HOMEPAGE_CACHE_TTL = int(os.environ.get('HOMEPAGE_CACHE_TTL', '60'))
+
+# Seconds per-user notification badge counters live in the cache before being recounted
+# (a few seconds at most on the per-process LocMemCache, see accounts/notifications.py)
+NOTIFICATION_COUNTS_TTL = int(os.environ.get('NOTIFICATION_COUNTS_TTL', '3600'))
+
+# Server-Sent Events fan-out: 'local' reaches streams in this process only,
+# 'redis' relays events between workers through Redis pub/sub. The stream
+# tells the page which one is in use; with 'local' (any multi-worker deploy
+# without REDIS_URL) the page keeps its regular polling alongside the stream.
+REALTIME_BACKEND = os.environ.get('REALTIME_BACKEND', 'redis' if _redis_url else 'local')
+REALTIME_REDIS_URL = os.environ.get('REALTIME_REDIS_URL', _redis_url)
+# Seconds before a stream is closed and the browser reconnects
+REALTIME_STREAM_MAX_AGE = int(os.environ.get('REALTIME_STREAM_MAX_AGE', '300'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -174,6 +210,14 @@ MEDIA_URL = '/media/'
 _media_root_env = os.environ.get('MEDIA_ROOT')
 MEDIA_ROOT = Path(_media_root_env) if _media_root_env else (BASE_DIR / 'media')
 
+# Uploaded dog/accessory photos get thumb/card/full renditions (JPEG + WebP);
+# set IMAGE_RENDITION_AVIF=1 to also write AVIF when Pillow supports it.
+IMAGE_RENDITION_AVIF = os.environ.get('IMAGE_RENDITION_AVIF', 'False').lower() in ['1', 'true', 'yes']
+# Renditions are built off the request path: 'pool' runs them on a process pool
+# after commit, 'daemon' leaves them for `manage.py process_images --loop`.
+IMAGE_WORKER = os.environ.get('IMAGE_WORKER', 'pool')
+IMAGE_WORKER_PROCESSES = int(os.environ.get('IMAGE_WORKER_PROCESSES', '2'))
+
 # Authentication
 AUTH_USER_MODEL = 'accounts.User'
 LOGIN_URL = '/accounts/login/'
@@ -182,11 +226,18 @@ LOGOUT_REDIRECT_URL = '/'
 
 # Email (development)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# Notification emails go through the dogs.OutboundEmail outbox and are sent by
+# the `manage.py send_outbox --loop N` worker, never by a web request. Set
+# EMAIL_OUTBOX_AUTODRAIN=1 to also drain on the web process's background pool
+# after each enqueue (development without a worker).
+EMAIL_OUTBOX_AUTODRAIN = os.environ.get('EMAIL_OUTBOX_AUTODRAIN', 'False').lower() in ['1', 'true', 'yes']
 
 # Payments (Stripe)
 STRIPE_PUBLIC_KEY = os.environ.get('STRIPE_PUBLIC_KEY', '')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', '')
 STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET', '')
+# Point the Stripe client elsewhere, e.g. the local stub started by `python -m perf.loadtest`
+STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE', '')
 
 # Production security hardening (optional, enabled when not DEBUG)
 if not DEBUG:
@@ -202,6 +253,39 @@ if not DEBUG:
     # WhiteNoise static files settings for production
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Dog page views are buffered and written to Dog.views_count in bulk.
+# 'local' keeps a per-process buffer flushed by a background timer; 'cache'
+# shares counters through CACHES and is flushed by `manage.py flush_view_counts`.
+DOG_VIEW_COUNTER_BACKEND = os.environ.get('DOG_VIEW_COUNTER_BACKEND', 'local')
+DOG_VIEW_COUNTER_CACHE = os.environ.get('DOG_VIEW_COUNTER_CACHE', 'default')
+DOG_VIEW_COUNTER_FLUSH_INTERVAL = int(os.environ.get('DOG_VIEW_COUNTER_FLUSH_INTERVAL', '30'))
+
+# Post-commit background jobs (saved-search alerts, ...) run on a small thread
+# pool; set BACKGROUND_TASKS_EAGER=1 to run them inline instead.
+BACKGROUND_TASKS_EAGER = os.environ.get('BACKGROUND_TASKS_EAGER', 'False').lower() in ['1', 'true', 'yes']
+BACKGROUND_TASK_WORKERS = int(os.environ.get('BACKGROUND_TASK_WORKERS', '2'))
+
+# Opt-in request instrumentation (perf/middleware.py): Server-Timing headers and
+# a JSON log line per sampled request on the 'perf.requests' logger.
+PERF_INSTRUMENTATION = os.environ.get('PERF_INSTRUMENTATION', 'False').lower() in ['1', 'true', 'yes']
+PERF_SAMPLE_RATE = float(os.environ.get('PERF_SAMPLE_RATE', '1.0'))
+PERF_SLOW_QUERY_MS = int(os.environ.get('PERF_SLOW_QUERY_MS', '100'))
+PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', 'True').lower() in ['1', 'true', 'yes']
+if PERF_INSTRUMENTATION:
+    # First, so the wall time covers every other middleware
+    MIDDLEWARE.insert(0, 'perf.middleware.PerformanceMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'perf.requests': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Dog, Favorite, Order
+from .models import Dog, Favorite, Order, OutboundEmail
 
 
 @admin.register(Dog)
@@ -78,4 +78,15 @@ class OrderAdmin(admin.ModelAdmin):
     )
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('buyer', 'dog')
\ No newline at end of file
+        return super().get_queryset(request).select_related('buyer', 'dog')
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    """Admin configuration for the email outbox"""
+    
+    list_display = ('subject', 'to_email', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('to_email', 'subject', 'dedupe_key')
+    ordering = ('-created_at',)
+    readonly_fields = ('dedupe_key', 'created_at', 'sent_at', 'last_error')
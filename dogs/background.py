@@ -0,0 +1,46 @@
+"""Run small jobs after the current transaction commits, off the request thread.
+
+Jobs go to a shared thread pool once the surrounding transaction commits,
+so they never see uncommitted rows and never delay the HTTP response. With
+``BACKGROUND_TASKS_EAGER = True`` (tests, management commands) they run inline.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BACKGROUND_TASK_WORKERS', 2),
+                    thread_name_prefix='pawpalace-bg',
+                )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', getattr(func, '__name__', func))
+    finally:
+        close_old_connections()
+
+
+def submit(func, *args, **kwargs):
+    """Schedule ``func(*args, **kwargs)`` to run after commit on the worker pool."""
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        func(*args, **kwargs)
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run, func, args, kwargs))
@@ -0,0 +1,265 @@
+"""Buffered view counting for dog listings.
+
+Page views are recorded in a counter store instead of writing ``Dog.views_count``
+on every hit. Buffered counts are applied in bulk with ``F()`` updates, either
+by the background flusher of the in-process store or by
+``manage.py flush_view_counts`` for the cache-backed store.
+
+Select the store with ``DOG_VIEW_COUNTER_BACKEND`` (``'local'`` or ``'cache'``).
+"""
+import atexit
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import F
+
+
+class LocalViewCounterStore:
+    """Per-process buffer, flushed every ``flush_interval`` seconds from a daemon thread.
+
+    Views are only ever written to the database they were recorded against:
+    once the connection points elsewhere (the test runner restores the real
+    database before exit) ``flush`` keeps the counts and writes nothing.
+    """
+
+    def __init__(self, flush_interval=30, max_pending=500):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.database = connection.settings_dict['NAME']
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def incr(self, dog_id, amount=1):
+        with self._lock:
+            self._counts[dog_id] += amount
+            size = len(self._counts)
+        if size >= self.max_pending:
+            self.flush()
+        else:
+            self._schedule()
+
+    def pending(self, dog_ids):
+        with self._lock:
+            return {pk: self._counts[pk] for pk in dog_ids if self._counts.get(pk)}
+
+    def drain(self):
+        with self._lock:
+            counts, self._counts = dict(self._counts), defaultdict(int)
+        return counts
+
+    def restore(self, counts):
+        with self._lock:
+            for pk, amount in counts.items():
+                self._counts[pk] += amount
+
+    def flush(self):
+        if connection.settings_dict['NAME'] != self.database:
+            return 0
+        counts = self.drain()
+        try:
+            return apply_counts(counts)
+        except Exception:
+            # Keep the views for the next attempt rather than dropping them
+            self.restore(counts)
+            raise
+
+    def _schedule(self):
+        if not self.flush_interval or self._timer is not None:
+            return
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.flush_interval, self._run_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _run_timer(self):
+        from django.db import close_old_connections
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            pass
+        finally:
+            close_old_connections()
+
+
+class CacheViewCounterStore:
+    """Shared counters in a Django cache, so every worker feeds the same buffer.
+
+    Whenever a dog's counter goes from zero to non-zero its id is appended to a
+    journal of dirty ids, so a flush reads only the dogs viewed since the last
+    one instead of every dog. Each counter is decremented by the amount applied,
+    so views recorded mid-flush are kept (and journalled again) for the next
+    run. Run one flusher at a time; ``flush(full=True)`` walks every dog id and
+    recovers counters whose journal entry was lost.
+    """
+
+    key_prefix = 'dogviews:'
+
+    def __init__(self, alias='default', chunk_size=1000):
+        self.alias = alias
+        self.chunk_size = chunk_size
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, dog_id):
+        return f'{self.key_prefix}{dog_id}'
+
+    def _journal_key(self, seq):
+        return f'{self.key_prefix}dirty:{seq}'
+
+    @property
+    def _seq_key(self):
+        return f'{self.key_prefix}seq'
+
+    @property
+    def _cursor_key(self):
+        return f'{self.key_prefix}cursor'
+
+    @property
+    def _retry_key(self):
+        return f'{self.key_prefix}retry'
+
+    def incr(self, dog_id, amount=1):
+        key = self._key(dog_id)
+        # add() is a no-op when the key exists, so incr() never races a fresh set()
+        self.cache.add(key, 0, timeout=None)
+        try:
+            value = self.cache.incr(key, amount)
+        except ValueError:
+            self.cache.set(key, amount, timeout=None)
+            value = amount
+        if value == amount:
+            # Only the increment that left zero journals the id
+            self._mark_dirty(dog_id)
+
+    def _mark_dirty(self, dog_id):
+        self.cache.add(self._seq_key, 0, timeout=None)
+        seq = self.cache.incr(self._seq_key)
+        self.cache.set(self._journal_key(seq), dog_id, timeout=None)
+
+    def pending(self, dog_ids):
+        keys = {self._key(pk): pk for pk in dog_ids}
+        found = self.cache.get_many(list(keys))
+        return {keys[k]: int(v) for k, v in found.items() if v}
+
+    def flush(self, full=False):
+        if full:
+            return self._flush_all()
+        head = self.cache.get(self._seq_key) or 0
+        cursor = self.cache.get(self._cursor_key) or 0
+        retry = self.cache.get(self._retry_key) or []
+        seqs = list(retry) + list(range(cursor + 1, head + 1))
+        applied = 0
+        missing = []
+        for start in range(0, len(seqs), self.chunk_size):
+            keys = {self._journal_key(seq): seq for seq in seqs[start:start + self.chunk_size]}
+            found = self.cache.get_many(list(keys))
+            # A writer may have taken a sequence number without storing its entry
+            # yet; look again next flush, then give up (a full flush recovers it)
+            missing.extend(seq for key, seq in keys.items() if key not in found and seq > cursor)
+            if found:
+                applied += self._flush_chunk(set(found.values()))
+                self.cache.delete_many(list(found))
+        self.cache.set_many({self._cursor_key: max(head, cursor), self._retry_key: missing}, timeout=None)
+        return applied
+
+    def _flush_all(self):
+        from .models import Dog
+        applied = 0
+        ids = Dog.objects.order_by('pk').values_list('pk', flat=True)
+        chunk = []
+        for pk in ids.iterator(chunk_size=self.chunk_size):
+            chunk.append(pk)
+            if len(chunk) >= self.chunk_size:
+                applied += self._flush_chunk(chunk)
+                chunk = []
+        if chunk:
+            applied += self._flush_chunk(chunk)
+        return applied
+
+    def _flush_chunk(self, dog_ids):
+        counts = self.pending(dog_ids)
+        if not counts:
+            return 0
+        applied = apply_counts(counts)
+        for pk, amount in counts.items():
+            try:
+                left = self.cache.decr(self._key(pk), amount)
+            except ValueError:
+                continue
+            if left > 0:
+                self._mark_dirty(pk)
+        return applied
+
+
+def apply_counts(counts):
+    """Add buffered views to ``Dog.views_count``; one UPDATE per distinct increment."""
+    from .models import Dog
+    by_amount = defaultdict(list)
+    for pk, amount in counts.items():
+        if amount > 0:
+            by_amount[amount].append(pk)
+    for amount, ids in by_amount.items():
+        Dog.objects.filter(pk__in=ids).update(views_count=F('views_count') + amount)
+    return sum(amount * len(ids) for amount, ids in by_amount.items())
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_view_counter():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = getattr(settings, 'DOG_VIEW_COUNTER_BACKEND', 'local')
+                if backend == 'cache':
+                    _store = CacheViewCounterStore(getattr(settings, 'DOG_VIEW_COUNTER_CACHE', 'default'))
+                else:
+                    _store = LocalViewCounterStore(getattr(settings, 'DOG_VIEW_COUNTER_FLUSH_INTERVAL', 30))
+    return _store
+
+
+def reset_view_counter():
+    """Drop the process's store and whatever it has buffered; the next view creates a fresh one."""
+    global _store
+    with _store_lock:
+        if isinstance(_store, LocalViewCounterStore):
+            _store.drain()
+        _store = None
+
+
+@atexit.register
+def _flush_at_exit():
+    store = _store
+    if isinstance(store, LocalViewCounterStore):
+        try:
+            store.flush()
+        except Exception:
+            pass
+
+
+def record_view(dog_id):
+    get_view_counter().incr(dog_id)
+
+
+def pending_views(dog_ids):
+    """Views recorded but not yet written to ``Dog.views_count``, keyed by dog id."""
+    return get_view_counter().pending(list(dog_ids))
+
+
+def flush_views(full=False):
+    store = get_view_counter()
+    if full and isinstance(store, CacheViewCounterStore):
+        return store.flush(full=True)
+    return store.flush()
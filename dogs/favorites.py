@@ -0,0 +1,92 @@
+"""Favorites lookups sized to the page being rendered, and the denormalised counters.
+
+Listing pages only need to know which of the 8-12 cards on screen the user
+has favorited: ``favorited_ids`` answers that with one query filtered to the
+page's ids instead of loading the user's whole favorites history. Dogs and
+accessories share the same calls.
+
+How many favorites a listing has is stored on the row (``favorites_count``,
+plus ``User.favorites_received_count`` across a seller's dogs). The favorite
+signal receivers move them with ``F()`` updates inside the insert/delete
+transaction, so toggles and seller badges never ``COUNT`` the favorites table.
+``manage.py reconcile_favorite_counts`` repairs any drift.
+"""
+from django.apps import apps
+from django.db import transaction
+from django.db.models import F, OuterRef
+from django.db.models.functions import Greatest
+
+from accounts.notifications import SubqueryCount
+
+# Listing model -> (favorite model, its foreign key to the listing)
+FAVORITES = {
+    'dogs.Dog': ('dogs.Favorite', 'dog'),
+    'accessories.Accessory': ('accessories.AccessoryFavorite', 'accessory'),
+}
+
+
+def _favorites_for(model):
+    favorite_label, field = FAVORITES[model._meta.label]
+    return apps.get_model(favorite_label).objects, f'{field}_id'
+
+
+def favorited_ids(user, model, ids):
+    """The subset of ``ids`` (pks of ``model``) that ``user`` has favorited."""
+    ids = list(ids)
+    if not ids or user is None or not user.is_authenticated:
+        return set()
+    favorites, column = _favorites_for(model)
+    return set(favorites.filter(user=user, **{f'{column}__in': ids}).order_by().values_list(column, flat=True))
+
+
+def annotate_favorites(objects, user=None):
+    """Set ``is_favorited`` on a page of dogs or accessories with at most one query.
+
+    Returns the objects as a list; counts are already on the rows.
+    """
+    objects = list(objects)
+    if not objects:
+        return objects
+    mine = favorited_ids(user, type(objects[0]), [obj.pk for obj in objects])
+    for obj in objects:
+        obj.is_favorited = obj.pk in mine
+    return objects
+
+
+def adjust_favorite_counts(model, pk, delta, seller_id=None):
+    """Move a listing's ``favorites_count`` (and its seller's total, if given) by ``delta``."""
+    model.objects.filter(pk=pk).update(favorites_count=Greatest(F('favorites_count') + delta, 0))
+    if seller_id:
+        from accounts.models import User
+        User.objects.filter(pk=seller_id).update(
+            favorites_received_count=Greatest(F('favorites_received_count') + delta, 0)
+        )
+
+
+def _reconcile(queryset, field, actual, batch_size):
+    drifted = [
+        queryset.model(pk=pk, **{field: count})
+        for pk, count in queryset.annotate(actual=actual).exclude(**{field: F('actual')})
+        .values_list('pk', 'actual').iterator()
+    ]
+    queryset.model.objects.bulk_update(drifted, [field], batch_size=batch_size)
+    return [obj.pk for obj in drifted]
+
+
+def reconcile_favorite_counts(batch_size=1000):
+    """Recount every stored favorites counter; returns ``{label: rows fixed}``."""
+    from accounts import notifications
+    from accounts.models import User
+    fixed = {}
+    with transaction.atomic():
+        for label in FAVORITES:
+            model = apps.get_model(label)
+            favorites, column = _favorites_for(model)
+            actual = SubqueryCount(favorites.filter(**{column: OuterRef('pk')}).order_by().values('pk'))
+            fixed[label] = len(_reconcile(model.objects.all(), 'favorites_count', actual, batch_size))
+        favorites, _ = _favorites_for(apps.get_model('dogs.Dog'))
+        actual = SubqueryCount(favorites.filter(dog__seller=OuterRef('pk')).order_by().values('pk'))
+        sellers = _reconcile(User.objects.all(), 'favorites_received_count', actual, batch_size)
+    fixed[User._meta.label] = len(sellers)
+    notifications.forget(sellers, 'favorites_received')
+    return fixed
@@ -0,0 +1,50 @@
+"""Cached homepage snapshot.
+
+The home page shows the same cards and statistics to everyone, so they are
+computed together, cached for ``HOMEPAGE_CACHE_TTL`` seconds and dropped by the
+``Dog``/``Order``/``User`` signal receivers in ``dogs.models`` when the data
+behind them changes.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+CACHE_KEY = 'homepage:snapshot:v1'
+CARD_COUNT = 8
+
+
+def homepage_cards():
+    """Featured dogs first, then the most recent ones (served by ``dog_home_cards_idx``)."""
+    from .models import Dog
+    return Dog.objects.filter(status='available').order_by('-is_featured', '-created_at')
+
+
+def build_homepage_snapshot():
+    from accounts.models import User
+    from .models import Dog, Order
+
+    available = Dog.objects.filter(status='available')
+    dogs = list(homepage_cards()[:CARD_COUNT])
+    popular_breeds = available.values('breed').annotate(count=Count('id')).order_by('-count')[:6]
+    return {
+        'dogs': dogs,
+        'total_dogs': available.count(),
+        'total_sellers': User.objects.filter(role='seller').count(),
+        'total_orders': Order.objects.filter(status='completed').count(),
+        'popular_breeds': [
+            {'name': breed['breed'].title(), 'count': breed['count']}
+            for breed in popular_breeds
+        ],
+    }
+
+
+def get_homepage_snapshot():
+    snapshot = cache.get(CACHE_KEY)
+    if snapshot is None:
+        snapshot = build_homepage_snapshot()
+        cache.set(CACHE_KEY, snapshot, getattr(settings, 'HOMEPAGE_CACHE_TTL', 60))
+    return snapshot
+
+
+def invalidate_homepage_snapshot():
+    cache.delete(CACHE_KEY)
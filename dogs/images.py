@@ -0,0 +1,373 @@
+"""Derivative image renditions for uploaded photos.
+
+Each image field is normalised once to a browser-friendly JPEG no larger than
+the ``full`` rendition, then written out as ``thumb``/``card``/``full`` sizes in
+JPEG and WebP (plus AVIF with ``IMAGE_RENDITION_AVIF``). What was written is
+recorded per field in the model's ``image_manifest``::
+
+    {"image": {"source": "dogs/rex.jpg", "hash": "<sha256 of source>",
+               "renditions": {"card": {"width": 640, "height": 480,
+                                       "jpeg": "dogs/rex_card_<hash12>.jpg",
+                                       "webp": "dogs/rex_card_<hash12>.webp"}, ...}}}
+
+Change tracking is per field and content-addressed. A field whose name still
+matches its manifest ``source`` is skipped without any I/O; otherwise the file
+is hashed, and a file whose bytes match the manifest, or that is already a
+conforming JPEG whose renditions exist, is never decoded or re-encoded. A JPEG
+is only ever compressed once, however often the listing is saved.
+
+The work happens off the request path: ``save()`` only flags the row
+``images_pending`` and queues it. With ``IMAGE_WORKER = 'pool'`` jobs run on a
+process pool after commit; with ``'daemon'`` they wait for
+``manage.py process_images --loop``. Either way the flag is cleared only in
+the same UPDATE that records the results, so a crashed worker leaves the row
+pending and ``process_images`` picks it up again.
+"""
+import copy
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'thumb': (320, 240),
+    'card': (640, 480),
+    'full': (1200, 900),
+}
+SOURCE_SIZE = RENDITIONS['full']
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+IMAGE_MODELS = ('dogs.Dog', 'accessories.Accessory')
+
+
+def rendition_formats():
+    """Encodings written for every rendition, best compression first."""
+    formats = ['webp', 'jpeg']
+    if getattr(settings, 'IMAGE_RENDITION_AVIF', False) and features.check('avif'):
+        formats.insert(0, 'avif')
+    return formats
+
+
+def _fit(size, box):
+    """Size of ``size`` scaled down (never up) to fit inside ``box``, keeping the aspect ratio."""
+    width, height = size
+    scale = min(box[0] / width, box[1] / height, 1)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _to_rgb(img):
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def _encode(img, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'jpeg':
+        img.save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    elif fmt == 'webp':
+        img.save(buffer, format='WEBP', quality=WEBP_QUALITY, method=4)
+    else:
+        img.save(buffer, format='AVIF', quality=AVIF_QUALITY)
+    return buffer.getvalue()
+
+
+def _is_conforming_jpeg(img, name):
+    return (img.format == 'JPEG' and img.mode == 'RGB'
+            and os.path.splitext(name)[1].lower() in ('.jpg', '.jpeg')
+            and _fit(img.size, SOURCE_SIZE) == img.size)
+
+
+def _plan_renditions(root, digest, size, source_name):
+    """Deterministic rendition names and sizes for a source with this content hash."""
+    tag = digest[:12]
+    plan = {}
+    for label, box in RENDITIONS.items():
+        width, height = _fit(size, box)
+        rendition = {'width': width, 'height': height}
+        for fmt in rendition_formats():
+            if fmt == 'jpeg' and (width, height) == tuple(size):
+                rendition[fmt] = source_name
+            else:
+                rendition[fmt] = f"{root}_{label}_{tag}.{'jpg' if fmt == 'jpeg' else fmt}"
+        plan[label] = rendition
+    return plan
+
+
+def process_image_field(file, manifest, obsolete):
+    """Bring ``manifest[field]`` up to date with ``file``; returns True if the entry changed.
+
+    ``file.name`` is updated in place when a non-JPEG upload had to be
+    re-encoded; the replaced upload is added to ``obsolete`` rather than
+    deleted, so nothing the database still points at disappears before the
+    new name is committed.
+    """
+    field_name = file.field.name
+    entry = manifest.get(field_name)
+    if not file:
+        return manifest.pop(field_name, None) is not None
+    if entry and entry.get('source') == file.name:
+        return False
+
+    storage = file.storage
+    try:
+        with storage.open(file.name, 'rb') as handle:
+            data = handle.read()
+    except FileNotFoundError:
+        manifest[field_name] = {'source': file.name, 'error': 'missing', 'renditions': {}}
+        return True
+    digest = hashlib.sha256(data).hexdigest()
+    if entry and entry.get('hash') == digest:
+        # Same bytes under a new name (e.g. a remapped path): keep the renditions
+        for rendition in entry['renditions'].values():
+            if rendition.get('jpeg') == entry['source']:
+                rendition['jpeg'] = file.name
+        entry['source'] = file.name
+        return True
+
+    img = Image.open(io.BytesIO(data))
+    root = os.path.splitext(file.name)[0]
+    if _is_conforming_jpeg(img, file.name):
+        source_name = file.name
+    else:
+        # Normalised source: JPEG, at most the ``full`` size
+        img = _to_rgb(img).resize(_fit(img.size, SOURCE_SIZE), Image.Resampling.LANCZOS)
+        data = _encode(img, 'jpeg')
+        digest = hashlib.sha256(data).hexdigest()
+        source_name = storage.save(root + '.jpg', ContentFile(data))
+        obsolete.add(file.name)
+        file.name = source_name
+        root = os.path.splitext(source_name)[0]
+
+    plan = _plan_renditions(root, digest, img.size, source_name)
+    missing = [
+        (label, fmt, name) for label, rendition in plan.items()
+        for fmt, name in rendition.items() if fmt not in ('width', 'height') and not storage.exists(name)
+    ]
+    if missing:
+        img = _to_rgb(img)
+        variants = {}
+        for label, fmt, name in missing:
+            if label not in variants:
+                variants[label] = img.resize((plan[label]['width'], plan[label]['height']),
+                                             Image.Resampling.LANCZOS)
+            storage.save(name, ContentFile(_encode(variants[label], fmt)))
+
+    manifest[field_name] = {'source': source_name, 'hash': digest, 'renditions': plan}
+    return True
+
+
+def _delete_files(storage, names):
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception:
+            logger.warning('Could not delete replaced upload %s', name)
+
+
+def images_stale(instance, field_names):
+    """Cheap check (no file I/O) for fields whose file differs from the manifest."""
+    manifest = instance.image_manifest or {}
+    for field_name in field_names:
+        file = getattr(instance, field_name)
+        entry = manifest.get(field_name)
+        if (file.name or None) != (entry or {}).get('source'):
+            return True
+    return False
+
+
+def process_instance_images(instance, field_names):
+    """Process ``field_names`` of a saved instance and record the result with one UPDATE.
+
+    The UPDATE is conditional on the image names the job started from; if the
+    listing got new uploads meanwhile it matches no row, the written files are
+    left for the job those uploads queued, and False is returned.
+    """
+    manifest = copy.deepcopy(instance.image_manifest or {})
+    started_from = {name: getattr(instance, name).name or None for name in field_names}
+    changed = {}
+    obsolete = set()
+    for field_name in field_names:
+        file = getattr(instance, field_name)
+        before = file.name
+        try:
+            if not process_image_field(file, manifest, obsolete):
+                continue
+        except Exception:
+            # Recorded so the broken upload is not retried on every save; the
+            # templates fall back to the original file
+            logger.exception('Could not process %s.%s for pk=%s',
+                             type(instance).__name__, field_name, instance.pk)
+            file.name = before
+            obsolete.discard(before)
+            manifest[field_name] = {'source': before, 'error': 'unreadable', 'renditions': {}}
+        if file.name != before:
+            changed[field_name] = file.name
+        changed['image_manifest'] = manifest
+
+    unchanged = Q(pk=instance.pk)
+    for name, value in started_from.items():
+        unchanged &= Q(**{name: value}) if value else (Q(**{f'{name}__isnull': True}) | Q(**{name: ''}))
+    if not type(instance)._default_manager.filter(unchanged).update(images_pending=False, **changed):
+        return False
+    instance.image_manifest = manifest
+    instance.images_pending = False
+    _delete_files(getattr(instance, field_names[0]).storage, obsolete)
+    return True
+
+
+def process_pending(model_label, pk, invalidate=True):
+    """Worker entry point: process one pending row (a no-op if it is already done).
+
+    With ``invalidate`` a finished dog also drops the homepage snapshot; pool
+    children pass False and leave that to the parent, whose cache the site
+    actually reads when it is process-local.
+    """
+    model = apps.get_model(model_label)
+    instance = model._default_manager.filter(pk=pk, images_pending=True).first()
+    if instance is None:
+        return False
+    done = process_instance_images(instance, model.IMAGE_FIELDS)
+    if done and invalidate:
+        _invalidate_listings(model_label)
+    return done
+
+
+def _invalidate_listings(model_label):
+    if model_label == 'dogs.Dog':
+        from .homepage import invalidate_homepage_snapshot
+        invalidate_homepage_snapshot()
+
+
+def process_all_pending(batch_size=100):
+    """Process every pending row of every model with images; returns how many finished."""
+    done = 0
+    for model_label in IMAGE_MODELS:
+        model = apps.get_model(model_label)
+        pks = list(model._default_manager.filter(images_pending=True)
+                   .order_by('pk').values_list('pk', flat=True)[:batch_size])
+        for pk in pks:
+            done += process_pending(model_label, pk)
+    return done
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _run_job(model_label, pk):
+    try:
+        return process_pending(model_label, pk, invalidate=False)
+    finally:
+        close_old_connections()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Spawned (not forked) children never share the parent's DB sockets
+                _pool = ProcessPoolExecutor(
+                    max_workers=getattr(settings, 'IMAGE_WORKER_PROCESSES', 2),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                )
+    return _pool
+
+
+def _submit_to_pool(model_label, pk):
+    try:
+        _get_pool().submit(_run_job, model_label, pk).add_done_callback(partial(_job_done, model_label))
+    except Exception:
+        # Pool unavailable; the row stays pending for ``process_images``
+        logger.exception('Could not queue image processing for %s pk=%s', model_label, pk)
+
+
+def _job_done(model_label, future):
+    # Runs in the parent process, once the child has committed its UPDATE
+    if future.exception() is not None:
+        logger.error('Image processing job failed: %s', future.exception())
+    elif future.result():
+        _invalidate_listings(model_label)
+
+
+def enqueue_image_processing(instance):
+    """Queue a pending instance according to ``IMAGE_WORKER``."""
+    model_label = instance._meta.label
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        process_pending(model_label, instance.pk)
+        instance.refresh_from_db()
+        return
+    if getattr(settings, 'IMAGE_WORKER', 'pool') == 'pool':
+        transaction.on_commit(lambda: _submit_to_pool(model_label, instance.pk))
+
+
+class ImageProcessingMixin:
+    """Flag and queue a model's ``IMAGE_FIELDS`` for processing whenever they change on save.
+
+    The model needs an ``images_pending`` boolean and an ``image_manifest``
+    JSON field alongside the image fields themselves.
+    """
+    IMAGE_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        # Saves that do not write an image field (status flips, counters) never touch images
+        track_images = update_fields is None or not set(update_fields).isdisjoint(self.IMAGE_FIELDS)
+        if track_images and images_stale(self, self.IMAGE_FIELDS):
+            self.images_pending = True
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'images_pending'}
+        super().save(*args, **kwargs)
+        if track_images and self.images_pending:
+            enqueue_image_processing(self)
+
+
+def rendition(file, label, fmt='jpeg'):
+    """Stored name of one rendition of ``file``, or None when it has not been generated."""
+    if not file:
+        return None
+    entry = (getattr(file.instance, 'image_manifest', None) or {}).get(file.field.name)
+    if not entry or entry.get('source') != file.name:
+        return None
+    return entry['renditions'].get(label, {}).get(fmt)
+
+
+def srcset_entries(file, fmt='jpeg', largest='full'):
+    """``(name, width)`` pairs for ``fmt`` up to and including the ``largest`` rendition."""
+    entry = (getattr(file.instance, 'image_manifest', None) or {}).get(file.field.name) if file else None
+    if not entry or entry.get('source') != file.name:
+        return []
+    pairs = []
+    for label in RENDITIONS:
+        data = entry['renditions'].get(label, {})
+        if fmt in data:
+            pairs.append((data[fmt], data['width']))
+        if label == largest:
+            break
+    return pairs
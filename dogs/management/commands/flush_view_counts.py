@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dogs.counters import flush_views
+
+
+class Command(BaseCommand):
+    help = "Apply buffered dog page views to Dog.views_count in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', type=int, default=0, help='Keep flushing every N seconds')
+        parser.add_argument('--full', action='store_true',
+                            help='Check every dog instead of only those viewed since the last flush')
+
+    def handle(self, *args, **options):
+        while True:
+            applied = flush_views(full=options['full'])
+            self.stdout.write(self.style.SUCCESS(f"Flushed {applied} view(s)."))
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
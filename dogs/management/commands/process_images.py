@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dogs.images import process_all_pending
+
+
+class Command(BaseCommand):
+    help = "Build renditions for dog and accessory photos still marked as processing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Rows per model per pass')
+        parser.add_argument('--loop', type=int, default=0, help='Keep polling every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            done = 0
+            while True:
+                batch = process_all_pending(batch_size=options['batch_size'])
+                done += batch
+                if not batch:
+                    break
+            if done or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"Processed images for {done} listing(s)."))
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from dogs.matching import rebuild_saved_search_index
+from dogs.models import SavedSearchKey
+
+
+class Command(BaseCommand):
+    help = "Rebuild the saved-search anchor index used to match new dogs."
+
+    def handle(self, *args, **options):
+        rebuild_saved_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {SavedSearchKey.objects.count()} saved-search key(s)."))
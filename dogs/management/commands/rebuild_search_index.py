@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from dogs.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the dog full-text search index (PostgreSQL tsvector or SQLite FTS5)."
+
+    def handle(self, *args, **options):
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt ({connection.vendor})."))
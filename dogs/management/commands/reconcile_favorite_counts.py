@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from dogs.favorites import reconcile_favorite_counts
+
+
+class Command(BaseCommand):
+    help = "Recount the denormalised favorites counters on dogs, accessories and sellers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows written per UPDATE batch')
+
+    def handle(self, *args, **options):
+        fixed = reconcile_favorite_counts(batch_size=options['batch_size'])
+        summary = ', '.join(f'{label}: {count}' for label, count in fixed.items())
+        self.stdout.write(self.style.SUCCESS(f"Favorite counts reconciled ({summary} rows fixed)."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from dogs.seeding import DEFAULT_COUNTS, SEED_PASSWORD, seed
+
+
+class Command(BaseCommand):
+    help = ("Bulk-seed a large synthetic catalogue (users, dogs, accessories, favorites, orders, "
+            "conversations, messages) for benchmarks. Idempotent: reruns only add what is missing.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1,
+                            help='Multiply every default count (1 is ~88k rows, 12 is ~1M)')
+        for kind, default in DEFAULT_COUNTS.items():
+            parser.add_argument(f'--{kind}', type=int, help=f'Number of {kind} (default {default} x scale)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT and transaction')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated values')
+        parser.add_argument('--image-pool', type=int, default=8, help='Distinct generated photos to share')
+
+    def handle(self, *args, **options):
+        counts = {kind: options[kind] for kind in DEFAULT_COUNTS if options[kind] is not None}
+        log = (lambda message: self.stdout.write(message)) if options['verbosity'] > 1 else None
+        created = seed(counts, scale=options['scale'], batch_size=options['batch_size'],
+                       random_seed=options['seed'], pool_size=options['image_pool'], log=log)
+        summary = ', '.join(f'{kind}: {n}' for kind, n in created.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {sum(created.values())} rows ({summary}). Accounts: seed-seller-<n> / seed-buyer-<n>, "
+            f"password {SEED_PASSWORD}"
+        ))
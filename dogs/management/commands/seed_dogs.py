@@ -9,7 +9,7 @@ import requests
 
 
 class Command(BaseCommand):
-    help = "Seed the database with mock dogs and a demo seller."
+    help = "Seed the database with mock dogs and a demo seller (see seed_bulk for benchmark-sized data)."
 
     def add_arguments(self, parser):
         parser.add_argument('--count', type=int, default=20, help='Number of dogs to create')
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dogs.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued notification emails in batches over one SMTP connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Emails per SMTP connection')
+        parser.add_argument('--loop', type=int, default=0, help='Keep draining every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = drain_outbox(batch_size=options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"Sent {sent} email(s), {failed} failed."))
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
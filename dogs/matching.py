@@ -0,0 +1,140 @@
+"""Indexed matching of new dogs against saved searches.
+
+Each saved search is stored under one "anchor" posting in ``SavedSearchKey``:
+the most discriminating criterion it has (a location or breed word, a narrow
+price or age bucket range, the gender, or ``*`` when it has none of those).
+A new dog expands to every key it could satisfy, so one indexed ``IN`` lookup
+returns the only searches that can possibly match; ``_dog_matches_params``
+then makes the exact decision for those candidates alone.
+
+Breed and location are substring filters, so the anchor is the longest word of
+the search text (cut to ``SUBSTRING_LEN`` characters) and a dog emits every
+substring up to that length of each word in its breed and location.
+"""
+import math
+
+from django.conf import settings
+
+from .outbox import enqueue_email
+
+SUBSTRING_LEN = 8
+MAX_RANGE_BUCKETS = 8
+MAX_PRICE_BUCKET = 120
+MAX_AGE_BUCKET = 40
+ANY_KEY = '*'
+
+
+def _price_bucket(price):
+    # Quarter-octave buckets (about 19% wide), so a budget spans a handful of keys
+    return min(int(4 * math.log2(max(float(price), 1))), MAX_PRICE_BUCKET)
+
+
+def _age_bucket(age):
+    return min(int(age) // 6, MAX_AGE_BUCKET)
+
+
+def _word_anchor(text):
+    words = (text or '').lower().split()
+    if not words:
+        return None
+    return max(words, key=len)[:SUBSTRING_LEN]
+
+
+def _substrings(text):
+    keys = set()
+    for word in (text or '').lower().split():
+        for start in range(len(word)):
+            for end in range(start + 1, min(start + SUBSTRING_LEN, len(word)) + 1):
+                keys.add(word[start:end])
+    return keys
+
+
+def _range_keys(prefix, low, high, bucket, top):
+    first = bucket(low) if low not in (None, '') else 0
+    last = bucket(high) if high not in (None, '') else top
+    if last - first + 1 > MAX_RANGE_BUCKETS:
+        return None
+    return [f'{prefix}:{b}' for b in range(first, last + 1)]
+
+
+def search_keys(params):
+    """Anchor postings for a saved search's ``params``."""
+    try:
+        word_anchors = [
+            (anchor, f'l:{anchor}') for anchor in [_word_anchor(params.get('location'))] if anchor
+        ] + [
+            (anchor, f'b:{anchor}') for anchor in [_word_anchor(params.get('breed'))] if anchor
+        ]
+        if word_anchors:
+            return [max(word_anchors, key=lambda item: len(item[0]))[1]]
+        for prefix, low, high, bucket, top in (
+            ('p', params.get('min_price'), params.get('max_price'), _price_bucket, MAX_PRICE_BUCKET),
+            ('a', params.get('min_age'), params.get('max_age'), _age_bucket, MAX_AGE_BUCKET),
+        ):
+            if low in (None, '') and high in (None, ''):
+                continue
+            keys = _range_keys(prefix, low, high, bucket, top)
+            if keys:
+                return keys
+        if params.get('gender'):
+            return [f"g:{params['gender']}"]
+    except (TypeError, ValueError):
+        pass
+    return [ANY_KEY]
+
+
+def dog_keys(dog):
+    """Every posting key a saved search matching ``dog`` could be filed under."""
+    keys = {ANY_KEY, f'g:{dog.gender}', f'p:{_price_bucket(dog.price)}', f'a:{_age_bucket(dog.age)}'}
+    keys.update(f'l:{s}' for s in _substrings(dog.location))
+    keys.update(f'b:{s}' for s in _substrings(dog.breed))
+    return keys
+
+
+def index_saved_search(saved_search):
+    from .models import SavedSearchKey
+    SavedSearchKey.objects.filter(saved_search=saved_search).delete()
+    SavedSearchKey.objects.bulk_create([
+        SavedSearchKey(saved_search=saved_search, key=key) for key in search_keys(saved_search.params)
+    ])
+
+
+def rebuild_saved_search_index(batch_size=5000):
+    from .models import SavedSearch, SavedSearchKey
+    SavedSearchKey.objects.all().delete()
+    batch = []
+    for pk, params in SavedSearch.objects.values_list('pk', 'params').iterator(chunk_size=batch_size):
+        batch.extend(SavedSearchKey(saved_search_id=pk, key=key) for key in search_keys(params or {}))
+        if len(batch) >= batch_size:
+            SavedSearchKey.objects.bulk_create(batch)
+            batch = []
+    SavedSearchKey.objects.bulk_create(batch)
+
+
+def candidate_searches(dog):
+    from .models import SavedSearch, SavedSearchKey
+    return SavedSearch.objects.filter(
+        pk__in=SavedSearchKey.objects.filter(key__in=dog_keys(dog)).values('saved_search_id')
+    )
+
+
+def matching_searches(dog):
+    from .models import _dog_matches_params
+    for search in candidate_searches(dog).select_related('user').iterator(chunk_size=2000):
+        if _dog_matches_params(dog, search.params):
+            yield search
+
+
+def notify_saved_searches_for(dog_id):
+    """Email every user whose saved search matches the dog (runs off the request path)."""
+    from .models import Dog
+    dog = Dog.objects.filter(pk=dog_id).first()
+    if dog is None:
+        return
+    for search in matching_searches(dog):
+        enqueue_email(
+            f'dog:{dog.pk}:saved_search:{search.pk}',
+            search.user.email,
+            subject=f"New dog matches your search: {dog.name}",
+            body=f"{dog.name} ({dog.breed}) in {dog.location} for ${dog.price}. View: {settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'}{dog.get_absolute_url()}",
+        )
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE dogs_dog ADD COLUMN search_vector tsvector")
+        schema_editor.execute(
+            "CREATE INDEX dogs_dog_search_vector_gin ON dogs_dog USING GIN (search_vector)"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE dogs_dog_fts USING fts5("
+            "name, breed, location, description, tokenize='unicode61 remove_diacritics 2')"
+        )
+    else:
+        return
+    from dogs.search import rebuild_index
+    rebuild_index(using=schema_editor.connection.alias)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS dogs_dog_search_vector_gin")
+        schema_editor.execute("ALTER TABLE dogs_dog DROP COLUMN IF EXISTS search_vector")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS dogs_dog_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dogs', '0003_order_carrier_order_delivered_at_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.24 on 2026-10-17 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dogs', '0004_dog_search_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='dog',
+            name='dogs_dog_breed_8b76fa_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='dog',
+            name='dogs_dog_status_c70e42_idx',
+        ),
+        migrations.AlterField(
+            model_name='dog',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to='dogs/'),
+        ),
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(fields=['status', '-created_at'], name='dog_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(fields=['status', 'price'], name='dog_status_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(fields=['seller', 'status', '-created_at'], name='dog_seller_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(fields=['breed', 'status', '-created_at'], name='dog_breed_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(condition=models.Q(('status', 'available')), fields=['-is_featured', '-created_at'], name='dog_home_cards_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.24 on 2026-10-17 03:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_keys(apps, schema_editor):
+    from dogs.matching import search_keys
+    SavedSearch = apps.get_model('dogs', 'SavedSearch')
+    SavedSearchKey = apps.get_model('dogs', 'SavedSearchKey')
+    SavedSearchKey.objects.bulk_create([
+        SavedSearchKey(saved_search_id=pk, key=key)
+        for pk, params in SavedSearch.objects.values_list('pk', 'params')
+        for key in search_keys(params or {})
+    ], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dogs', '0005_dog_browse_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearchKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40)),
+                ('saved_search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='index_keys', to='dogs.savedsearch')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key', 'saved_search'], name='savedsearch_key_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_keys, migrations.RunPython.noop),
+    ]
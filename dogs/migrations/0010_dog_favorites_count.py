@@ -0,0 +1,29 @@
+# Generated by Django 4.2.24 on 2026-10-17 04:25
+
+from django.db import migrations, models
+from django.db.models import OuterRef
+
+
+def count_existing_favorites(apps, schema_editor):
+    from accounts.notifications import SubqueryCount
+    Dog = apps.get_model('dogs', 'Dog')
+    Favorite = apps.get_model('dogs', 'Favorite')
+    Dog.objects.update(favorites_count=SubqueryCount(
+        Favorite.objects.filter(dog=OuterRef('pk')).order_by().values('pk')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dogs', '0009_dog_images_pending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dog',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing_favorites, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.24 on 2026-10-17 05:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dogs', '0011_outbound_email_sending'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='dog',
+            name='dog_status_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='dog',
+            name='dog_status_price_idx',
+        ),
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(condition=models.Q(('status', 'available')), fields=['-created_at'], name='dog_available_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(condition=models.Q(('status', 'available')), fields=['price'], name='dog_available_price_idx'),
+        ),
+    ]
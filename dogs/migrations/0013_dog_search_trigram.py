@@ -0,0 +1,46 @@
+from django.db import migrations
+
+FTS_COLUMNS = 'name, breed, location, description'
+
+# dogs.search.PG_TEXT_SQL at the time of this migration
+PG_TEXT_SQL = (
+    "lower(coalesce(name, '') || ' ' || coalesce(breed, '') || ' ' || "
+    "coalesce(location, '') || ' ' || coalesce(description, ''))"
+)
+
+
+def _recreate_fts(schema_editor, tokenize):
+    from dogs.search import rebuild_index
+    schema_editor.execute("DROP TABLE IF EXISTS dogs_dog_fts")
+    schema_editor.execute(f"CREATE VIRTUAL TABLE dogs_dog_fts USING fts5({FTS_COLUMNS}, tokenize='{tokenize}')")
+    rebuild_index(using=schema_editor.connection.alias)
+
+
+def use_trigram_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            f"CREATE INDEX dogs_dog_search_trgm ON dogs_dog USING GIN (({PG_TEXT_SQL}) gin_trgm_ops)"
+        )
+    elif vendor == 'sqlite':
+        _recreate_fts(schema_editor, 'trigram')
+
+
+def use_word_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS dogs_dog_search_trgm")
+    elif vendor == 'sqlite':
+        _recreate_fts(schema_editor, 'unicode61 remove_diacritics 2')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dogs', '0012_dog_available_browse_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(use_trigram_search, use_word_search),
+    ]
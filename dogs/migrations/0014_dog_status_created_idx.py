@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-17 05:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dogs', '0013_dog_search_trigram'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(fields=['status', '-created_at'], name='dog_status_created_idx'),
+        ),
+    ]
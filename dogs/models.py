@@ -1,19 +1,19 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from PIL import Image
-import os
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.core.mail import send_mail
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.postgres.fields import ArrayField
 import json
 
+from .images import ImageProcessingMixin
+
 User = get_user_model()
 
 
-class Dog(models.Model):
+class Dog(ImageProcessingMixin, models.Model):
     """Dog model representing dogs for sale"""
     
     GENDER_CHOICES = [
@@ -50,6 +50,8 @@ class Dog(models.Model):
     image2 = models.ImageField(upload_to='dogs/', blank=True, null=True)
     image3 = models.ImageField(upload_to='dogs/', blank=True, null=True)
     image4 = models.ImageField(upload_to='dogs/', blank=True, null=True)
+    image_manifest = models.JSONField(default=dict, blank=True, editable=False)
+    images_pending = models.BooleanField(default=False, editable=False)
     
     # Status & Relations
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='available')
@@ -59,15 +61,39 @@ class Dog(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     views_count = models.PositiveIntegerField(default=0)
+    # Maintained by the Favorite signal receivers; see dogs.favorites
+    favorites_count = models.PositiveIntegerField(default=0, editable=False)
     is_featured = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['breed']),
             models.Index(fields=['price']),
             models.Index(fields=['location']),
-            models.Index(fields=['status']),
+            # Any status by recency: admin and sold/pending listings and counts
+            models.Index(fields=['status', '-created_at'], name='dog_status_created_idx'),
+            # Browse shapes: available dogs sorted by recency or price. Partial, so
+            # sold and pending listings never bloat the indexes the list page walks
+            models.Index(fields=['-created_at'], name='dog_available_created_idx',
+                         condition=models.Q(status='available')),
+            models.Index(fields=['price'], name='dog_available_price_idx',
+                         condition=models.Q(status='available')),
+            # Seller listings and "more from this seller"
+            models.Index(fields=['seller', 'status', '-created_at'], name='dog_seller_status_idx'),
+            # Similar dogs on the detail page
+            models.Index(fields=['breed', 'status', '-created_at'], name='dog_breed_status_idx'),
+            # Homepage cards: featured first, then newest, available only
+            models.Index(
+                fields=['-is_featured', '-created_at'],
+                name='dog_home_cards_idx',
+                condition=models.Q(status='available'),
+            ),
+            # Backlog scan for ``manage.py process_images``
+            models.Index(
+                fields=['id'],
+                name='dog_images_pending_idx',
+                condition=models.Q(images_pending=True),
+            ),
         ]
     
     def __str__(self):
@@ -88,57 +114,8 @@ class Dog(models.Model):
             else:
                 return f"{years} year{'s' if years != 1 else ''}, {months} month{'s' if months != 1 else ''}"
     
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-
-        # Normalize and resize uploaded images so browsers can render them reliably
-        if self.image:
-            self._normalize_and_resize_field('image')
-        if self.image2:
-            self._normalize_and_resize_field('image2')
-        if self.image3:
-            self._normalize_and_resize_field('image3')
-        if self.image4:
-            self._normalize_and_resize_field('image4')
-    
-    def _normalize_and_resize_field(self, field_name: str, max_size=(1200, 900)) -> None:
-        """Ensure uploaded image is browser-friendly (convert to JPEG) and resized."""
-        try:
-            field = getattr(self, field_name)
-            if not field or not field.name:
-                return
-            path = field.path
-            with Image.open(path) as img:
-                # Convert to RGB for JPEG and handle images with alpha
-                if img.mode in ('RGBA', 'LA'):
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    background.paste(img, mask=img.split()[-1])
-                    img = background
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-
-                # Resize
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-
-                # If file is not .jpg/.jpeg, rewrite to .jpg and update field
-                root, ext = os.path.splitext(path)
-                if ext.lower() not in ['.jpg', '.jpeg']:
-                    new_path = root + '.jpg'
-                    img.save(new_path, format='JPEG', optimize=True, quality=85)
-                    try:
-                        os.remove(path)
-                    except Exception:
-                        pass
-                    # Update field to point to new path relative to MEDIA_ROOT
-                    from django.conf import settings
-                    rel = os.path.relpath(new_path, str(settings.MEDIA_ROOT))
-                    field.name = rel.replace('\\', '/')
-                    super().save(update_fields=[field_name])
-                else:
-                    img.save(path, format='JPEG', optimize=True, quality=85)
-        except Exception:
-            # Best-effort; do not break saving if processing fails
-            pass
+    # New uploads are normalized and given renditions by the image worker (see dogs.images)
+    IMAGE_FIELDS = ('image', 'image2', 'image3', 'image4')
 
 
 class Favorite(models.Model):
@@ -220,6 +197,54 @@ class SavedSearch(models.Model):
         return f"SavedSearch {self.name} by {self.user.username}"
 
 
+class SavedSearchKey(models.Model):
+    """Anchor posting used to find candidate saved searches for a new dog (see dogs.matching)"""
+
+    saved_search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name='index_keys')
+    key = models.CharField(max_length=40)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'saved_search'], name='savedsearch_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} -> SavedSearch {self.saved_search_id}"
+
+
+class OutboundEmail(models.Model):
+    """Queued notification email, delivered in batches by the send_outbox worker"""
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    # e.g. "order:12:accepted:buyer@example.com"; a second enqueue of the same key is ignored
+    dedupe_key = models.CharField(max_length=255, unique=True)
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True, default='')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to_email} ({self.status})"
+
+
 class Report(models.Model):
     """Reports for moderation on users or dog listings"""
 
@@ -283,18 +308,78 @@ def _dog_matches_params(dog: 'Dog', params: dict) -> bool:
 def notify_saved_searches(sender, instance: 'Dog', created: bool, **kwargs):
     if not created:
         return
-    try:
-        from .models import SavedSearch
-        searches = SavedSearch.objects.select_related('user').all()
-        for s in searches:
-            if _dog_matches_params(instance, s.params):
-                if s.user.email:
-                    send_mail(
-                        subject=f"New dog matches your search: {instance.name}",
-                        message=f"{instance.name} ({instance.breed}) in {instance.location} for ${instance.price}. View: {settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'}{instance.get_absolute_url()}",
-                        from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', None),
-                        recipient_list=[s.user.email],
-                        fail_silently=True,
-                    )
-    except Exception:
-        pass
\ No newline at end of file
+    # Matching and emails run after commit on the background pool, not in the seller's request
+    from .background import submit
+    from .matching import notify_saved_searches_for
+    submit(notify_saved_searches_for, instance.pk)
+
+
+@receiver(post_save, sender=SavedSearch)
+def index_saved_search(sender, instance: 'SavedSearch', **kwargs):
+    from .matching import index_saved_search as _index
+    _index(instance)
+
+
+@receiver(post_save, sender=Dog)
+def sync_search_index(sender, instance: 'Dog', update_fields=None, **kwargs):
+    from .search import index_dog, needs_reindex
+    if needs_reindex(update_fields):
+        index_dog(instance)
+
+
+@receiver(post_delete, sender=Dog)
+def drop_search_index(sender, instance: 'Dog', **kwargs):
+    from .search import unindex_dog
+    unindex_dog(instance.pk)
+
+
+def _invalidate_homepage(sender, update_fields=None, **kwargs):
+    # Logins only touch last_login, which the homepage never shows
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    from .homepage import invalidate_homepage_snapshot
+    invalidate_homepage_snapshot()
+
+
+for _model in (Dog, Order, User):
+    post_save.connect(_invalidate_homepage, sender=_model, dispatch_uid=f'homepage_save_{_model.__name__}')
+    post_delete.connect(_invalidate_homepage, sender=_model, dispatch_uid=f'homepage_delete_{_model.__name__}')
+
+
+@receiver(post_save, sender=Order)
+def count_pending_order(sender, instance: 'Order', created: bool, update_fields=None, **kwargs):
+    from accounts import notifications
+    if created:
+        if instance.status == 'pending':
+            notifications.adjust(instance.dog.seller_id, 'pending_orders', 1)
+    elif update_fields is None or 'status' in update_fields:
+        # The previous status is unknown here, so let the counter be recounted
+        notifications.invalidate(instance.dog.seller_id, 'pending_orders')
+
+
+@receiver(post_delete, sender=Order)
+def uncount_pending_order(sender, instance: 'Order', **kwargs):
+    from accounts import notifications
+    if instance.status == 'pending':
+        notifications.adjust(instance.dog.seller_id, 'pending_orders', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def count_favorite(sender, instance: 'Favorite', created: bool, **kwargs):
+    from accounts import notifications
+    from .favorites import adjust_favorite_counts
+    if created:
+        seller_id = instance.dog.seller_id
+        adjust_favorite_counts(Dog, instance.dog_id, 1, seller_id=seller_id)
+        notifications.adjust(instance.user_id, 'favorites_given', 1)
+        notifications.adjust(seller_id, 'favorites_received', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def uncount_favorite(sender, instance: 'Favorite', **kwargs):
+    from accounts import notifications
+    from .favorites import adjust_favorite_counts
+    seller_id = instance.dog.seller_id
+    adjust_favorite_counts(Dog, instance.dog_id, -1, seller_id=seller_id)
+    notifications.adjust(instance.user_id, 'favorites_given', -1)
+    notifications.adjust(seller_id, 'favorites_received', -1)
@@ -0,0 +1,136 @@
+"""Durable outbox for notification emails.
+
+Views call ``enqueue_email``/``enqueue_order_email`` which only insert an
+``OutboundEmail`` row; ``drain_outbox``, run by the ``manage.py send_outbox``
+worker, delivers due rows in batches over one SMTP connection, retrying
+failures with exponential backoff. ``EMAIL_OUTBOX_AUTODRAIN`` (off by
+default) also drains after each enqueue on the web process's background
+pool, for development setups without a worker.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=2)
+# How long a claimed row may stay in 'sending' before another worker retries it
+CLAIM_LEASE = timedelta(minutes=10)
+
+
+def enqueue_email(dedupe_key, to_email, subject, body):
+    """Queue one email; returns False when ``dedupe_key`` was already queued."""
+    from .models import OutboundEmail
+    if not to_email:
+        return False
+    try:
+        with transaction.atomic():
+            OutboundEmail.objects.create(
+                dedupe_key=dedupe_key[:255],
+                to_email=to_email,
+                subject=subject[:255],
+                body=body,
+                from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', None) or '',
+            )
+    except IntegrityError:
+        return False
+    if getattr(settings, 'EMAIL_OUTBOX_AUTODRAIN', False):
+        from .background import submit
+        submit(drain_outbox)
+    return True
+
+
+def enqueue_order_email(order, event, to_email, subject, body):
+    """Queue an order lifecycle email, at most once per (order, event, recipient)."""
+    return enqueue_email(f'order:{order.pk}:{event}:{to_email}', to_email, subject, body)
+
+
+def _backoff(attempts):
+    return min(BACKOFF_BASE * (2 ** (attempts - 1)), BACKOFF_MAX)
+
+
+def drain_outbox(batch_size=50):
+    """Send due emails until none are left; returns ``(sent, failed)`` counts."""
+    sent = failed = 0
+    while True:
+        batch_sent, batch_failed, claimed = _send_batch(batch_size)
+        sent += batch_sent
+        failed += batch_failed
+        if claimed < batch_size:
+            return sent, failed
+
+
+def _record_failure(row, exc):
+    row.last_error = str(exc)[:2000]
+    if row.attempts >= MAX_ATTEMPTS:
+        row.status = 'failed'
+    else:
+        row.status = 'pending'
+        row.next_attempt_at = timezone.now() + _backoff(row.attempts)
+    logger.warning('Outbox email %s failed (attempt %s): %s', row.pk, row.attempts, exc)
+
+
+def _claim(batch_size):
+    """Mark up to ``batch_size`` due rows as ``sending`` and return the ones this worker won.
+
+    The claim is one conditional UPDATE in a short transaction, so no row lock
+    is held while SMTP runs. ``next_attempt_at`` is set to a per-claim lease
+    deadline: it identifies the rows this call claimed, and a row left in
+    ``sending`` by a worker that died mid-batch becomes due again once it passes.
+    """
+    from .models import OutboundEmail
+    now = timezone.now()
+    lease_until = now + CLAIM_LEASE
+    due = OutboundEmail.objects.filter(status__in=('pending', 'sending'), next_attempt_at__lte=now)
+    with transaction.atomic():
+        ids = list(due.order_by('next_attempt_at').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return []
+        due.filter(pk__in=ids).update(
+            status='sending', next_attempt_at=lease_until, attempts=F('attempts') + 1,
+        )
+    return list(OutboundEmail.objects.filter(pk__in=ids, status='sending', next_attempt_at=lease_until))
+
+
+def _send_batch(batch_size):
+    rows = _claim(batch_size)
+    if not rows:
+        return 0, 0, 0
+
+    sent = failed = 0
+    smtp = get_connection(fail_silently=False)
+    open_error = None
+    try:
+        smtp.open()
+    except Exception as exc:
+        # Count the outage against every row so the batch backs off together
+        open_error = exc
+    for row in rows:
+        try:
+            if open_error is not None:
+                raise open_error
+            EmailMessage(
+                subject=row.subject, body=row.body, from_email=row.from_email or None,
+                to=[row.to_email], connection=smtp,
+            ).send()
+        except Exception as exc:
+            failed += 1
+            _record_failure(row, exc)
+        else:
+            sent += 1
+            row.status = 'sent'
+            row.sent_at = timezone.now()
+        row.save(update_fields=['status', 'sent_at', 'next_attempt_at', 'last_error'])
+    if open_error is None:
+        try:
+            smtp.close()
+        except Exception:
+            pass
+    return sent, failed, len(rows)
@@ -0,0 +1,126 @@
+"""Keyset (cursor) pagination for listing pages.
+
+``?cursor=`` switches a ListView from OFFSET pages to keyset pages ordered on
+``(sort field, id)``: each page is one indexed range scan, whatever the depth,
+and no exact ``COUNT(*)`` is needed. An empty ``cursor`` starts at the top;
+only that first page carries an approximate result count.
+"""
+import base64
+import json
+
+from django.db import connection
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk):
+    payload = json.dumps([value, pk], separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return value, int(pk)
+    except Exception:
+        raise InvalidCursor(cursor)
+
+
+class CursorPage:
+    """A forward-only page of ``page_size`` rows after ``cursor``."""
+
+    def __init__(self, queryset, sort, cursor, page_size):
+        descending = sort.startswith('-')
+        field_name = sort.lstrip('-')
+        field = queryset.model._meta.get_field(field_name)
+        if descending:
+            queryset = queryset.order_by(f'-{field_name}', '-pk')
+        else:
+            queryset = queryset.order_by(field_name, 'pk')
+
+        if cursor:
+            value, pk = decode_cursor(cursor)
+            value = field.to_python(value)
+            op = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field_name}__{op}': value}) |
+                Q(**{field_name: value, f'pk__{op}': pk})
+            )
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.object_list = rows[:page_size]
+        self.next_cursor = None
+        if self.has_next:
+            last = self.object_list[-1]
+            self.next_cursor = encode_cursor(field.value_to_string(last), last.pk)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def approximate_count(queryset, cap=1000):
+    """Cheap row count for "about N results" labels; returns ``(count, is_exact)``.
+
+    PostgreSQL answers from the planner estimate; elsewhere counting stops at ``cap``.
+    """
+    if connection.vendor == 'postgresql':
+        try:
+            plan = json.loads(queryset.order_by().explain(format='json'))
+            return int(plan[0]['Plan']['Plan Rows']), False
+        except Exception:
+            pass
+    count = queryset.order_by()[:cap + 1].count()
+    return min(count, cap), count <= cap
+
+
+class CursorPaginationMixin:
+    """Opt-in ``?cursor=`` mode for ListViews; offset pagination stays the default.
+
+    ``get_cursor_sort()`` returning None keeps offset pages even with a cursor,
+    for orderings such as a computed search rank that have no keyset.
+    """
+
+    cursor_param = 'cursor'
+    approximate_count_cap = 1000
+
+    def get_cursor_sort(self):
+        return '-created_at'
+
+    def paginate_queryset(self, queryset, page_size):
+        sort = self.get_cursor_sort()
+        if self.cursor_param not in self.request.GET or sort is None:
+            return super().paginate_queryset(queryset, page_size)
+        cursor = self.request.GET.get(self.cursor_param)
+        try:
+            page = CursorPage(queryset, sort, cursor, page_size)
+        except InvalidCursor:
+            cursor = ''
+            page = CursorPage(queryset, sort, cursor, page_size)
+        self.cursor_first_page = not cursor
+        self.cursor_page = page
+        self.cursor_queryset = queryset
+        return (None, page, page.object_list, False)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = getattr(self, 'cursor_page', None)
+        if page is not None:
+            context['cursor_mode'] = True
+            if self.cursor_first_page:
+                count, exact = approximate_count(self.cursor_queryset, self.approximate_count_cap)
+                context['result_count'] = count
+                context['result_count_exact'] = exact
+            if page.next_cursor:
+                params = self.request.GET.copy()
+                params[self.cursor_param] = page.next_cursor
+                params.pop('page', None)
+                context['next_cursor_query'] = params.urlencode()
+        return context
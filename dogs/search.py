@@ -0,0 +1,160 @@
+"""Indexed substring search for dog listings.
+
+Every word of the query must appear somewhere in the name, breed, location
+or description, anywhere inside a word, exactly like the ``icontains`` scan
+this replaces ("ador" finds "Labrador"), but answered from an index:
+
+* PostgreSQL filters with ``LIKE`` over the lowercased fields, served by a
+  ``pg_trgm`` GIN index, and ranks with a weighted ``search_vector``
+  tsvector column;
+* SQLite keeps an FTS5 shadow table ``dogs_dog_fts`` (trigram tokenizer,
+  SQLite 3.34+) keyed by the dog id and ranks with ``bm25()``.
+
+Words shorter than three letters have no trigram and fall back to
+``icontains``. The index is maintained from the ``Dog`` save/delete signals
+and can be rebuilt with ``manage.py rebuild_search_index``. Other databases
+use the ``icontains`` scan throughout.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+
+FTS_TABLE = 'dogs_dog_fts'
+INDEXED_FIELDS = ('name', 'breed', 'location', 'description')
+
+_TOKEN_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+# Shortest word a trigram index can answer
+MIN_TRIGRAM = 3
+
+# Must match the expression of the dogs_dog_search_trgm index (migration 0013)
+PG_TEXT_SQL = (
+    "lower(coalesce(name, '') || ' ' || coalesce(breed, '') || ' ' || "
+    "coalesce(location, '') || ' ' || coalesce(description, ''))"
+)
+
+_PG_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(breed, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(location, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+
+def _tokens(query):
+    return [t.lower() for t in _TOKEN_RE.findall(query or '')][:10]
+
+
+def _backend(conn=connection):
+    vendor = conn.vendor
+    if vendor in ('postgresql', 'sqlite'):
+        return vendor
+    return None
+
+
+def needs_reindex(update_fields):
+    """Return False when a save cannot have touched any indexed column."""
+    if update_fields is None:
+        return True
+    return bool(set(update_fields) & set(INDEXED_FIELDS))
+
+
+def index_dog(dog):
+    """Write (or overwrite) the search entry for a single dog."""
+    backend = _backend()
+    with connection.cursor() as cursor:
+        if backend == 'postgresql':
+            cursor.execute(
+                f"UPDATE dogs_dog SET search_vector = {_PG_VECTOR_SQL} WHERE id = %s",
+                [dog.pk],
+            )
+        elif backend == 'sqlite':
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [dog.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, breed, location, description) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                [dog.pk, dog.name or '', dog.breed or '', dog.location or '', dog.description or ''],
+            )
+
+
+def unindex_dog(pk):
+    """Drop the search entry for a deleted dog (PostgreSQL drops it with the row)."""
+    if _backend() == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pk])
+
+
+def rebuild_index(using=DEFAULT_DB_ALIAS):
+    """Rebuild the whole index from ``dogs_dog`` in one statement per backend."""
+    conn = connections[using]
+    backend = _backend(conn)
+    with conn.cursor() as cursor:
+        if backend == 'postgresql':
+            cursor.execute(f"UPDATE dogs_dog SET search_vector = {_PG_VECTOR_SQL}")
+        elif backend == 'sqlite':
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, breed, location, description) "
+                "SELECT id, coalesce(name, ''), coalesce(breed, ''), coalesce(location, ''), "
+                "coalesce(description, '') FROM dogs_dog"
+            )
+
+
+def _icontains(queryset, tokens):
+    for token in tokens:
+        queryset = queryset.filter(
+            Q(name__icontains=token) |
+            Q(breed__icontains=token) |
+            Q(location__icontains=token) |
+            Q(description__icontains=token)
+        )
+    return queryset
+
+
+def search_dogs(queryset, query, with_rank=False):
+    """Filter ``queryset`` to dogs containing every word of ``query``.
+
+    Words match anywhere inside the indexed fields, so "ador retr" still
+    finds "Labrador Retriever". With ``with_rank`` the rows are annotated
+    with ``search_rank`` (higher is better) for relevance ordering.
+    """
+    tokens = _tokens(query)
+    if not tokens:
+        return queryset
+    backend = _backend()
+    indexed = [t for t in tokens if len(t) >= MIN_TRIGRAM] if backend else []
+    queryset = _icontains(queryset, [t for t in tokens if t not in indexed])
+
+    if backend == 'postgresql' and indexed:
+        queryset = queryset.filter(pk__in=RawSQL(
+            "SELECT id FROM dogs_dog WHERE " + ' AND '.join([f'{PG_TEXT_SQL} LIKE %s'] * len(indexed)),
+            [f'%{t}%' for t in indexed],
+        ))
+        if with_rank:
+            # Whole words and word prefixes outrank matches inside a word
+            tsquery = ' | '.join(f'{t}:*' for t in tokens)
+            queryset = queryset.annotate(search_rank=RawSQL(
+                "ts_rank(dogs_dog.search_vector, to_tsquery('simple', %s))", [tsquery]
+            ))
+        return queryset
+
+    if backend == 'sqlite' and indexed:
+        match = ' '.join(f'"{t}"' for t in indexed)
+        queryset = queryset.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        )
+        if with_rank:
+            # bm25() is lower-is-better; negate it so both backends sort the same way.
+            queryset = queryset.annotate(search_rank=RawSQL(
+                f"(SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = dogs_dog.id)",
+                [match],
+            ))
+        return queryset
+
+    if with_rank:
+        queryset = queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return queryset
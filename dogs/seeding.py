@@ -0,0 +1,394 @@
+"""Bulk synthetic data for benchmarks: users, listings, favorites, orders and conversations.
+
+``seed()`` writes every kind of row with ``bulk_create`` in batches, one
+transaction per batch, so nothing runs per row: no ``save()`` overrides, no
+signal receivers (search index, saved-search alerts, counters), no image
+jobs and no network. Listing photos come from a small pool of generated
+JPEGs whose renditions are made once and whose manifest entry is shared by
+every row, so the pages render exactly as they do for real uploads.
+
+Seeded accounts are ``seed-seller-<n>`` and ``seed-buyer-<n>`` (password
+``SEED_PASSWORD``) and everything else hangs off them. Each kind of row is
+numbered, and a run only creates the numbers that are not there yet, so
+repeating a run is a no-op and a larger run tops the data up. Users and
+listings carry their number in their name, orders in the buyer's phone and
+messages at the end of their text, so numbers freed by deleted rows are
+filled again. Favorites and conversations are topped up to the target count
+instead, skipping pairs that already exist (their pairs depend on how many
+users and dogs there are). Rows are generated from ``random_seed`` and their
+number, so the same counts give the same data. Orders and messages are
+spread over ``HISTORY_DAYS`` rather than all stamped with the time of the run.
+
+The state that the skipped receivers would have maintained is rebuilt in
+bulk at the end: the search and saved-search indexes, conversation state,
+favorite counts, and (on a shared cache) the homepage snapshot and the
+seeded users' notification counters. Conversations get their canonical
+``user_low``/``user_high`` key when they are inserted.
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from accessories.models import Accessory, AccessoryFavorite
+from accounts import notifications
+from accounts.models import User
+from messaging.models import Conversation, ConversationParticipant, Message
+from messaging.state import rebuild_conversation_state
+from .favorites import reconcile_favorite_counts
+from .homepage import invalidate_homepage_snapshot
+from .images import SOURCE_SIZE, _encode, process_image_field
+from .matching import rebuild_saved_search_index
+from .models import Dog, Favorite, Order
+from .search import rebuild_index
+
+SEED_PASSWORD = 'seed-password'
+SELLER_PREFIX = 'seed-seller-'
+BUYER_PREFIX = 'seed-buyer-'
+
+# Defaults add up to ~88k rows; ``scale`` multiplies them (``--scale 12`` is ~1M)
+DEFAULT_COUNTS = {
+    'sellers': 50,
+    'buyers': 500,
+    'dogs': 5000,
+    'accessories': 2000,
+    'favorites': 20000,
+    'orders': 5000,
+    'conversations': 5000,
+    'messages': 50000,
+}
+
+NAMES = ('Buddy', 'Bella', 'Max', 'Luna', 'Charlie', 'Lucy', 'Cooper', 'Daisy', 'Rocky', 'Molly',
+         'Bear', 'Sadie', 'Tucker', 'Maggie', 'Duke', 'Zoe')
+BREEDS = ('Labrador Retriever', 'German Shepherd', 'Golden Retriever', 'French Bulldog', 'Beagle',
+          'Poodle', 'Siberian Husky', 'Pomeranian', 'Dachshund', 'Boxer', 'Shih Tzu', 'Border Collie')
+LOCATIONS = ('New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix', 'Philadelphia', 'San Antonio',
+             'San Diego', 'Dallas', 'Austin', 'Denver', 'Seattle')
+COLORS = ('Black', 'Brown', 'White', 'Golden', 'Cream', 'Brindle', 'Tricolor')
+TRAITS = ('Friendly', 'Playful', 'Calm', 'Energetic', 'Loyal', 'Gentle', 'Curious', 'Affectionate')
+ACCESSORIES = ('Chew Toy', 'Leash', 'Harness', 'Dog Bed', 'Food Bowl', 'Raincoat', 'Collar', 'Treats',
+               'Travel Crate', 'Grooming Brush')
+BRANDS = ('Acme', 'PawCo', 'GlowPaw', 'RestEase', 'TrailDog', 'BarkBox')
+ORDER_STATUSES = ('pending', 'pending', 'confirmed', 'completed', 'completed', 'cancelled')
+HISTORY_DAYS = 90
+
+# Coprime strides spread buyer/dog pairs over the catalogue
+FAVORITE_STRIDE = 7919
+ORDER_STRIDE = 104729
+
+
+def _pair(k, buyers, items, stride):
+    """The k-th (buyer index, item index) pair; unique for ``k < buyers * items``."""
+    buyer, q = k % buyers, k // buyers
+    return buyer, (q + buyer * stride) % items
+
+
+def _rng(random_seed, kind, start):
+    return random.Random(f'{random_seed}:{kind}:{start}')
+
+
+def _chunks(numbers, size):
+    for start in range(0, len(numbers), size):
+        yield numbers[start:start + size]
+
+
+def _numbers(values, separator):
+    """The integers after the last ``separator`` of each value, skipping values that have none."""
+    found = set()
+    for value in values:
+        tail = value.rpartition(separator)[2]
+        if tail.isdigit():
+            found.add(int(tail))
+    return found
+
+
+def _missing(taken, target):
+    """Numbers below ``target`` not in ``taken``; gaps left by deleted rows come first."""
+    return [i for i in range(target) if i not in taken]
+
+
+def image_pool(model, size=8):
+    """``(name, manifest entry)`` for ``size`` generated photos, with renditions made once.
+
+    The files are reused when they already exist, so only the first run
+    spends any time on images.
+    """
+    field = model._meta.get_field('image')
+    storage = field.storage
+    pool = []
+    for i in range(size):
+        name = f'{field.upload_to}seed-pool-{i}.jpg'
+        if not storage.exists(name):
+            hue = (i * 47) % 256
+            img = Image.new('RGB', SOURCE_SIZE, (hue, 180 - hue % 120, 255 - hue))
+            draw = ImageDraw.Draw(img)
+            for y in range(0, SOURCE_SIZE[1], 60):
+                draw.rectangle([0, y, SOURCE_SIZE[0], y + 20], fill=(255 - hue, hue, 120))
+            name = storage.save(name, ContentFile(_encode(img, 'jpeg')))
+        manifest = {}
+        process_image_field(model(image=name).image, manifest, set())
+        pool.append((name, manifest['image']))
+    return pool
+
+
+class Seeder:
+    def __init__(self, counts, batch_size=5000, random_seed=0, pool_size=8, log=None):
+        self.counts = counts
+        self.batch_size = batch_size
+        self.random_seed = random_seed
+        self.pool_size = pool_size
+        self.log = log or (lambda message: None)
+        self.created = {}
+
+    def run(self):
+        self.seed_users('sellers', SELLER_PREFIX, role='seller')
+        self.seed_users('buyers', BUYER_PREFIX, role='buyer')
+        self.sellers = self._user_ids(SELLER_PREFIX)
+        self.buyers = self._user_ids(BUYER_PREFIX)
+        if not self.sellers or not self.buyers:
+            return self.created
+        self.seed_dogs()
+        self.seed_accessories()
+        self.dogs = list(self._seeded_dogs().order_by('pk').values_list('pk', 'seller_id'))
+        self.accessories = list(self._seeded_accessories().order_by('pk').values_list('pk', flat=True))
+        self.seed_favorites()
+        self.seed_orders()
+        self.seed_conversations()
+        self.seed_messages()
+        if any(self.created.values()):
+            self.rebuild()
+        return self.created
+
+    def _user_ids(self, prefix):
+        return list(User.objects.filter(username__startswith=prefix).order_by('pk').values_list('pk', flat=True))
+
+    def _seeded_dogs(self):
+        return Dog.objects.filter(seller__username__startswith=SELLER_PREFIX)
+
+    def _seeded_accessories(self):
+        return Accessory.objects.filter(seller__username__startswith=SELLER_PREFIX)
+
+    def _seeded_conversations(self):
+        return Conversation.objects.filter(dog__seller__username__startswith=SELLER_PREFIX)
+
+    def _insert(self, kind, numbers, build, model=None, restore=(), **options):
+        """Create the rows of ``kind`` numbered ``numbers``, ``build(rng, batch)`` making each batch.
+
+        ``restore`` names ``auto_now_add`` fields whose built values are
+        written back after the insert, which stamps them with the current time.
+        """
+        created = 0
+        for batch in _chunks(numbers, self.batch_size):
+            rows = build(_rng(self.random_seed, kind, batch[0]), batch)
+            model = model or type(rows[0])
+            built = [[getattr(row, name) for name in restore] for row in rows]
+            with transaction.atomic():
+                model.objects.bulk_create(rows, batch_size=self.batch_size, **options)
+                if restore:
+                    for row, values in zip(rows, built):
+                        for name, value in zip(restore, values):
+                            setattr(row, name, value)
+                    model.objects.bulk_update(rows, restore, batch_size=self.batch_size)
+            created += len(batch)
+            self.log(f'{kind}: {created}/{len(numbers)}')
+        self.created[kind] = created
+
+    def seed_users(self, kind, prefix, role):
+        password = make_password(SEED_PASSWORD)
+        taken = _numbers(User.objects.filter(username__startswith=prefix).values_list('username', flat=True),
+                         prefix)
+
+        def build(rng, batch):
+            return [
+                User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', password=password, role=role,
+                     first_name=rng.choice(NAMES), location=rng.choice(LOCATIONS))
+                for i in batch
+            ]
+        self._insert(kind, _missing(taken, self.counts[kind]), build)
+
+    def seed_dogs(self):
+        pool = image_pool(Dog, self.pool_size)
+
+        def build(rng, batch):
+            rows = []
+            for i in batch:
+                image, entry = pool[i % len(pool)]
+                rows.append(Dog(
+                    name=f'{NAMES[i % len(NAMES)]} {i}', breed=rng.choice(BREEDS), age=rng.randint(2, 120),
+                    gender=rng.choice(('male', 'female')),
+                    price=Decimal(rng.randrange(30000, 400000)) / 100,
+                    description=f'{rng.choice(TRAITS)} and {rng.choice(TRAITS).lower()} companion.',
+                    location=rng.choice(LOCATIONS), color=rng.choice(COLORS),
+                    weight=Decimal(rng.randrange(200, 6000)) / 100,
+                    is_vaccinated=rng.random() < 0.8, is_neutered=rng.random() < 0.5,
+                    image=image, image_manifest={'image': entry},
+                    status='available' if rng.random() < 0.9 else rng.choice(('sold', 'pending')),
+                    seller_id=self.sellers[i % len(self.sellers)], views_count=rng.randrange(500),
+                    is_featured=rng.random() < 0.02,
+                ))
+            return rows
+        taken = _numbers(self._seeded_dogs().values_list('name', flat=True), ' ')
+        self._insert('dogs', _missing(taken, self.counts['dogs']), build)
+
+    def seed_accessories(self):
+        pool = image_pool(Accessory, self.pool_size)
+        categories = [key for key, _ in Accessory.CATEGORY_CHOICES]
+
+        def build(rng, batch):
+            rows = []
+            for i in batch:
+                image, entry = pool[i % len(pool)]
+                rows.append(Accessory(
+                    name=f'{ACCESSORIES[i % len(ACCESSORIES)]} #{i}', description='Durable and easy to clean.',
+                    price=Decimal(rng.randrange(299, 9999)) / 100, category=rng.choice(categories),
+                    brand=rng.choice(BRANDS), image=image, image_manifest={'image': entry},
+                    seller_id=self.sellers[i % len(self.sellers)], quantity=rng.randint(1, 50),
+                ))
+            return rows
+        taken = _numbers(self._seeded_accessories().values_list('name', flat=True), '#')
+        self._insert('accessories', _missing(taken, self.counts['accessories']), build)
+
+    def seed_favorites(self):
+        # Split between dogs and accessories like the real tables
+        target = min(self.counts['favorites'], len(self.buyers) * len(self.dogs))
+        accessory_target = min(target // 4, len(self.buyers) * len(self.accessories))
+
+        def dog_pair(k):
+            buyer, dog = _pair(k, len(self.buyers), len(self.dogs), FAVORITE_STRIDE)
+            return self.buyers[buyer], self.dogs[dog][0]
+
+        def accessory_pair(k):
+            buyer, accessory = _pair(k, len(self.buyers), len(self.accessories), FAVORITE_STRIDE)
+            return self.buyers[buyer], self.accessories[accessory]
+
+        def build_dogs(rng, batch):
+            return [Favorite(user_id=user_id, dog_id=dog_id) for user_id, dog_id in map(dog_pair, batch)]
+
+        def build_accessories(rng, batch):
+            return [AccessoryFavorite(user_id=user_id, accessory_id=accessory_id)
+                    for user_id, accessory_id in map(accessory_pair, batch)]
+
+        taken = set(Favorite.objects.filter(user__username__startswith=BUYER_PREFIX).values_list('user_id', 'dog_id'))
+        numbers = [k for k in range(len(taken), target - accessory_target) if dog_pair(k) not in taken]
+        self._insert('favorites', numbers, build_dogs, Favorite, ignore_conflicts=True)
+        if self.accessories:
+            taken = set(AccessoryFavorite.objects.filter(user__username__startswith=BUYER_PREFIX)
+                        .values_list('user_id', 'accessory_id'))
+            numbers = [k for k in range(len(taken), accessory_target) if accessory_pair(k) not in taken]
+            self._insert('accessory_favorites', numbers, build_accessories, AccessoryFavorite,
+                         ignore_conflicts=True)
+
+    def seed_orders(self):
+        now = timezone.now()
+
+        def build(rng, batch):
+            rows = []
+            for k in batch:
+                buyer, dog = _pair(k, len(self.buyers), len(self.dogs), ORDER_STRIDE)
+                rows.append(Order(
+                    buyer_id=self.buyers[buyer], dog_id=self.dogs[dog][0], status=rng.choice(ORDER_STATUSES),
+                    buyer_name=f'Buyer {buyer}', buyer_email=f'{BUYER_PREFIX}{buyer}@example.com',
+                    buyer_phone=f'555-{k:04d}',
+                    created_at=now - timedelta(minutes=rng.randrange(HISTORY_DAYS * 24 * 60)),
+                ))
+            return rows
+        taken = _numbers(Order.objects.filter(buyer__username__startswith=BUYER_PREFIX)
+                         .values_list('buyer_phone', flat=True), '-')
+        self._insert('orders', _missing(taken, self.counts['orders']), build, restore=('created_at',))
+
+    def seed_conversations(self):
+        # The favorites' pairs: buyers ask about the dogs they favorited
+        target = min(self.counts['conversations'], len(self.buyers) * len(self.dogs))
+
+        def thread(k):
+            buyer, dog = _pair(k, len(self.buyers), len(self.dogs), FAVORITE_STRIDE)
+            buyer_id, (dog_id, seller_id) = self.buyers[buyer], self.dogs[dog]
+            return dog_id, buyer_id, seller_id
+
+        # The canonical key is unique, so a thread that is already there is skipped
+        taken = set(self._seeded_conversations().values_list('dog_id', 'user_low_id', 'user_high_id'))
+        numbers = []
+        for k in range(len(taken), target):
+            dog_id, buyer_id, seller_id = thread(k)
+            if (dog_id, min(buyer_id, seller_id), max(buyer_id, seller_id)) not in taken:
+                numbers.append(k)
+        created = 0
+        for batch in _chunks(numbers, self.batch_size):
+            conversations, pairs = [], []
+            for dog_id, buyer_id, seller_id in map(thread, batch):
+                conversations.append(Conversation(dog_id=dog_id, user_low_id=min(buyer_id, seller_id),
+                                                  user_high_id=max(buyer_id, seller_id)))
+                pairs.append((buyer_id, seller_id))
+            with transaction.atomic():
+                Conversation.objects.bulk_create(conversations, batch_size=self.batch_size)
+                ConversationParticipant.objects.bulk_create([
+                    ConversationParticipant(conversation_id=conversation.pk, user_id=user_id)
+                    for conversation, pair in zip(conversations, pairs) for user_id in pair
+                ], batch_size=self.batch_size)
+            created += len(batch)
+            self.log(f'conversations: {created}/{len(numbers)}')
+        self.created['conversations'] = created
+
+    def seed_messages(self):
+        conversations = list(
+            self._seeded_conversations().order_by('pk')
+            .values_list('pk', 'dog_id', 'dog__seller_id', 'user_low_id', 'user_high_id')
+        )
+        if not conversations:
+            return
+        now = timezone.now()
+        start = now - timedelta(days=HISTORY_DAYS)
+
+        def build(rng, batch):
+            rows = []
+            for j in batch:
+                index = j % len(conversations)
+                pk, dog_id, seller_id, low_id, high_id = conversations[index]
+                buyer_id = high_id if low_id == seller_id else low_id
+                round_ = j // len(conversations)
+                sender, receiver = (buyer_id, seller_id) if round_ % 2 == 0 else (seller_id, buyer_id)
+                # Each thread opens on its own day; replies follow hours apart, in round order
+                opened = start + timedelta(minutes=index * 7919 % ((HISTORY_DAYS - 30) * 24 * 60))
+                sent_at = min(opened + timedelta(hours=6 * round_, minutes=rng.randrange(300)), now)
+                is_read = rng.random() < 0.8
+                rows.append(Message(
+                    conversation_id=pk, dog_id=dog_id, sender_id=sender, receiver_id=receiver,
+                    subject='Is this dog still available?' if round_ == 0 else None,
+                    content=rng.choice(('Is this dog still available?', 'Yes, come and meet them!',
+                                        'What vaccinations have they had?', 'Can I visit this weekend?'))
+                    + f' #{j}',
+                    is_read=is_read, sent_at=sent_at,
+                    read_at=min(sent_at + timedelta(minutes=rng.randint(1, 48 * 60)), now) if is_read else None,
+                ))
+            return rows
+        taken = _numbers(Message.objects.filter(conversation__dog__seller__username__startswith=SELLER_PREFIX)
+                         .values_list('content', flat=True), '#')
+        self._insert('messages', _missing(taken, self.counts['messages']), build, restore=('sent_at',))
+
+    def rebuild(self):
+        """Recompute everything the bypassed receivers and ``save()`` overrides would have kept current.
+
+        Cached state can only be dropped here when the cache is shared with
+        the site (Redis). With a per-process cache the command clears nothing
+        the web workers can see; their badge counters expire within
+        ``LOCAL_COUNTS_TTL`` seconds and the homepage within ``HOMEPAGE_CACHE_TTL``.
+        """
+        self.log('rebuilding indexes and denormalised state')
+        rebuild_index()
+        rebuild_saved_search_index()
+        rebuild_conversation_state()
+        reconcile_favorite_counts()
+        if notifications.cache_is_shared():
+            invalidate_homepage_snapshot()
+            notifications.forget(self.sellers + self.buyers)
+
+
+def seed(counts=None, scale=1, batch_size=5000, random_seed=0, pool_size=8, log=None):
+    """Top the seeded data up to ``counts`` (``DEFAULT_COUNTS`` times ``scale``); returns rows created per kind."""
+    counts = {**{kind: round(n * scale) for kind, n in DEFAULT_COUNTS.items()}, **(counts or {})}
+    return Seeder(counts, batch_size=batch_size, random_seed=random_seed, pool_size=pool_size, log=log).run()
@@ -0,0 +1,49 @@
+"""Template helpers for the renditions written by ``dogs.images``.
+
+    {% load images %}
+    {% responsive_image dog.image 'card' alt=dog.name class="w-full h-64 object-cover" %}
+
+renders a ``<picture>`` offering WebP (and AVIF) sources with a ``srcset`` of
+the renditions up to the requested one; images without a manifest entry yet
+fall back to a plain ``<img>`` of the original.
+"""
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from dogs.images import rendition, rendition_formats, srcset_entries
+
+register = template.Library()
+
+CARD_SIZES = '(min-width: 1280px) 25vw, (min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw'
+
+
+def _srcset(file, fmt, largest):
+    return ', '.join(f'{file.storage.url(name)} {width}w' for name, width in srcset_entries(file, fmt, largest))
+
+
+@register.simple_tag
+def rendition_url(file, label='card', fmt='jpeg'):
+    """URL of one rendition, falling back to the original upload."""
+    if not file:
+        return ''
+    name = rendition(file, label, fmt)
+    return file.storage.url(name) if name else file.url
+
+
+@register.simple_tag
+def responsive_image(file, label='card', alt='', sizes=CARD_SIZES, loading='lazy', **attrs):
+    if not file:
+        return ''
+    extra = format_html_join('', ' {}="{}"', sorted(attrs.items()))
+    src = rendition(file, label)
+    if src is None:
+        return format_html('<img src="{}" alt="{}" loading="{}"{}>', file.url, alt, loading, extra)
+
+    sources = format_html_join('', '<source type="image/{}" srcset="{}" sizes="{}">', (
+        (fmt, _srcset(file, fmt, label), sizes) for fmt in rendition_formats() if fmt != 'jpeg'
+        if srcset_entries(file, fmt, label)
+    ))
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" loading="{}" decoding="async"{}></picture>',
+        sources, file.storage.url(src), _srcset(file, 'jpeg', label), sizes, alt, loading, extra,
+    )
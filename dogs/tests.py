@@ -1,3 +1,748 @@
-from django.test import TestCase
+import io
+import logging
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import F, Q
+from django.http import QueryDict
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from PIL import Image
+
+from accounts.models import User
+from .counters import CacheViewCounterStore, LocalViewCounterStore, flush_views, reset_view_counter
+from .images import RENDITIONS, _job_done, _run_job, process_all_pending, process_instance_images
+from .favorites import annotate_favorites, favorited_ids, reconcile_favorite_counts
+from .homepage import CACHE_KEY as HOMEPAGE_CACHE_KEY, homepage_cards, invalidate_homepage_snapshot
+from .matching import candidate_searches, dog_keys, matching_searches, search_keys
+from .models import Dog, Favorite, Order, OutboundEmail, SavedSearch, SavedSearchKey, _dog_matches_params
+from .outbox import MAX_ATTEMPTS, drain_outbox, enqueue_order_email
+from .search import search_dogs
+from .views import DogDetailView, DogListView
+
+
+def make_dog(seller, **overrides):
+    data = {
+        'name': 'Buddy', 'breed': 'Labrador Retriever', 'age': 12, 'gender': 'male',
+        'price': '850.00', 'description': 'Friendly and energetic.', 'location': 'Chicago',
+        'seller': seller, 'image': 'dogs/test.jpg',
+    }
+    data.update(overrides)
+    return Dog.objects.create(**data)
+
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+benchmark_log = logging.getLogger('dogs.benchmarks')
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class DogSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+
+    def test_prefix_search_matches_any_indexed_field(self):
+        lab = make_dog(self.seller)
+        make_dog(self.seller, name='Luna', breed='French Bulldog', location='Houston',
+                 description='Playful companion.')
+        found = search_dogs(Dog.objects.all(), 'lab retr')
+        self.assertEqual(list(found), [lab])
+        self.assertEqual(list(search_dogs(Dog.objects.all(), 'houst')), [Dog.objects.get(name='Luna')])
+
+    def test_words_match_inside_words_like_icontains(self):
+        lab = make_dog(self.seller, description='Loves the lake.')
+        luna = make_dog(self.seller, name='Luna', breed='French Bulldog', location='Houston')
+        for query, expected in [('ador', [lab]), ('ouston', [luna]), ('ves the', [lab]),
+                                ('ulldog lu', [luna]), ('o', [lab, luna]), ('xyz', [])]:
+            with self.subTest(query=query):
+                self.assertCountEqual(search_dogs(Dog.objects.all(), query), expected)
+                substring = Dog.objects.all()
+                for word in query.split():
+                    substring = substring.filter(Q(name__icontains=word) | Q(breed__icontains=word) |
+                                                 Q(location__icontains=word) | Q(description__icontains=word))
+                self.assertCountEqual(search_dogs(Dog.objects.all(), query), substring)
+
+    def test_index_follows_save_and_delete(self):
+        dog = make_dog(self.seller)
+        dog.name = 'Maximus'
+        dog.save()
+        self.assertEqual(list(search_dogs(Dog.objects.all(), 'maximus')), [dog])
+        self.assertFalse(search_dogs(Dog.objects.all(), 'buddy').exists())
+        dog.delete()
+        self.assertFalse(search_dogs(Dog.objects.all(), 'maximus').exists())
+
+    def test_list_view_keeps_filters_and_sort(self):
+        cheap = make_dog(self.seller, price='500.00')
+        pricey = make_dog(self.seller, name='Buddy2', price='900.00')
+        make_dog(self.seller, name='Sold Buddy', status='sold')
+        response = self.client.get(reverse('dogs:list'), {'search': 'buddy', 'sort': '-price'})
+        self.assertEqual(list(response.context['dogs']), [pricey, cheap])
+        response = self.client.get(reverse('dogs:list'), {'search': 'buddy', 'sort': 'relevance'})
+        self.assertCountEqual(list(response.context['dogs']), [pricey, cheap])
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ViewCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+
+    def setUp(self):
+        # The process-wide store outlives each test; start and end with an empty one
+        reset_view_counter()
+        self.addCleanup(reset_view_counter)
+
+    def test_local_store_buffers_until_flush(self):
+        dog = make_dog(self.seller)
+        store = LocalViewCounterStore(flush_interval=0)
+        for _ in range(3):
+            store.incr(dog.pk)
+        self.assertEqual(store.pending([dog.pk]), {dog.pk: 3})
+        dog.refresh_from_db()
+        self.assertEqual(dog.views_count, 0)
+        self.assertEqual(store.flush(), 3)
+        dog.refresh_from_db()
+        self.assertEqual(dog.views_count, 3)
+        self.assertEqual(store.pending([dog.pk]), {})
+
+    def test_cache_store_keeps_views_recorded_after_read(self):
+        dog = make_dog(self.seller)
+        store = CacheViewCounterStore()
+        store.incr(dog.pk)
+        store.incr(dog.pk)
+        self.assertEqual(store.flush(), 2)
+        store.incr(dog.pk)
+        dog.refresh_from_db()
+        self.assertEqual(dog.views_count, 2)
+        self.assertEqual(store.pending([dog.pk]), {dog.pk: 1})
+        store.flush()
+        dog.refresh_from_db()
+        self.assertEqual(dog.views_count, 3)
+
+    def test_cache_store_flushes_only_dirty_dogs(self):
+        viewed, idle = make_dog(self.seller), make_dog(self.seller)
+        store = CacheViewCounterStore()
+        store.flush(full=True)
+        store.incr(viewed.pk, 2)
+        # One UPDATE for the journalled dog; no scan of the dogs table
+        with self.assertNumQueries(1):
+            self.assertEqual(store.flush(), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(store.flush(), 0)
+        viewed.refresh_from_db()
+        idle.refresh_from_db()
+        self.assertEqual((viewed.views_count, idle.views_count), (2, 0))
+        store.incr(viewed.pk)
+        self.assertEqual(store.flush(), 1)
+
+    def test_local_store_never_flushes_into_another_database(self):
+        dog = make_dog(self.seller)
+        store = LocalViewCounterStore(flush_interval=0)
+        store.incr(dog.pk)
+        with mock.patch.dict(connection.settings_dict, NAME='some-other-database'):
+            self.assertEqual(store.flush(), 0)
+        self.assertEqual(store.pending([dog.pk]), {dog.pk: 1})
+        self.assertEqual(store.flush(), 1)
+        dog.refresh_from_db()
+        self.assertEqual(dog.views_count, 1)
+
+    def test_detail_view_buffers_instead_of_saving(self):
+        dog = make_dog(self.seller)
+        response = self.client.get(reverse('dogs:detail', args=[dog.pk]))
+        self.assertEqual(response.context['dog'].views_count, 1)
+        dog.refresh_from_db()
+        self.assertEqual(dog.views_count, 0)
+        self.assertEqual(flush_views(), 1)
+        dog.refresh_from_db()
+        self.assertEqual(dog.views_count, 1)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class HomepageSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_featured_first_and_cached(self):
+        for i in range(10):
+            make_dog(self.seller, name=f'Dog{i}')
+        featured = make_dog(self.seller, name='Star', is_featured=True)
+        Dog.objects.filter(pk=featured.pk).update(created_at=featured.created_at.replace(year=2000))
+        invalidate_homepage_snapshot()
+        response = self.client.get(reverse('home'))
+        cards = response.context['featured_dogs']
+        self.assertEqual(len(cards), 8)
+        self.assertEqual(cards[0], featured)
+        self.assertEqual(response.context['total_dogs'], 11)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('home'))
+
+    def test_dog_save_invalidates_snapshot(self):
+        make_dog(self.seller)
+        self.assertEqual(self.client.get(reverse('home')).context['total_dogs'], 1)
+        make_dog(self.seller, name='Second')
+        self.assertEqual(self.client.get(reverse('home')).context['total_dogs'], 2)
+
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+        for i in range(30):
+            # Repeated prices exercise the id tie-break
+            make_dog(cls.seller, name=f'Dog{i}', price=f'{100 + (i % 7) * 50}.00')
+
+    def _walk(self, sort):
+        seen, responses, params = [], [], {'cursor': '', 'sort': sort}
+        while True:
+            response = self.client.get(reverse('dogs:list'), params)
+            self.assertIsNone(response.context['paginator'])
+            seen.extend(dog.pk for dog in response.context['dogs'])
+            responses.append(response)
+            query = response.context.get('next_cursor_query')
+            if not query:
+                return seen, responses
+            params = {'cursor': QueryDict(query)['cursor'], 'sort': sort}
+
+    def test_cursor_pages_match_offset_order(self):
+        orderings = {'-created_at': ('-created_at', '-pk'), 'price': ('price', 'pk'), '-price': ('-price', '-pk')}
+        for sort, ordering in orderings.items():
+            seen, responses = self._walk(sort)
+            expected = list(Dog.objects.order_by(*ordering).values_list('pk', flat=True))
+            self.assertEqual(seen, expected)
+            # Only the first page pays for the count
+            self.assertEqual(responses[0].context['result_count'], 30)
+            self.assertNotIn('result_count', responses[-1].context)
+
+    def test_relevance_stays_on_offset_pages(self):
+        params = {'cursor': '', 'search': 'Dog', 'sort': 'relevance'}
+        response = self.client.get(reverse('dogs:list'), params)
+        self.assertIsNotNone(response.context['paginator'])
+        self.assertNotIn('next_cursor_query', response.context)
+        self.assertEqual(response.context['paginator'].count, 30)
+
+    def test_invalid_cursor_restarts_from_top(self):
+        response = self.client.get(reverse('dogs:list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(len(response.context['dogs']), 12)
+
+
+
+def random_search_params(rng):
+    params = {}
+    if rng.random() < 0.3:
+        params['breed'] = rng.choice(['Labrador', 'retriever', 'poodle', 'french bull', 'shep', 'husky'])
+    if rng.random() < 0.3:
+        params['location'] = rng.choice(['Chicago', 'new york', 'york', 'Houston', 'san', 'phoenix'])
+    if rng.random() < 0.4:
+        params['gender'] = rng.choice(['male', 'female'])
+    if rng.random() < 0.3:
+        params['min_price'] = rng.choice([200, 500, 900, 1500])
+    if rng.random() < 0.3:
+        params['max_price'] = rng.choice([600, 1000, 2000, 5000])
+    if rng.random() < 0.2:
+        params['min_age'] = rng.randint(1, 24)
+    if rng.random() < 0.2:
+        params['max_age'] = rng.randint(12, 60)
+    if rng.random() < 0.1:
+        params['vaccinated'] = True
+    return params
+
+
+def random_dog(rng, seller, i):
+    return Dog(
+        name=f'Dog {i}', age=rng.randint(1, 100), gender=rng.choice(['male', 'female']),
+        breed=rng.choice(['Labrador Retriever', 'Golden Retriever', 'Poodle', 'French Bulldog',
+                          'German Shepherd', 'Siberian Husky']),
+        location=rng.choice(['Chicago', 'New York', 'Houston', 'San Diego', 'Phoenix', 'Yorkshire']),
+        price=Decimal(rng.randint(100, 3000)), is_vaccinated=rng.random() < 0.5,
+        description='Test dog', seller=seller, image='dogs/test.jpg',
+    )
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=True)
+class SavedSearchMatchingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+        cls.buyer = User.objects.create_user(username='buyer', password='pw', email='buyer@example.com')
+
+    def test_candidates_never_miss_a_match(self):
+        rng = random.Random(7)
+        searches = [SavedSearch.objects.create(user=self.buyer, name=f's{i}', params=random_search_params(rng))
+                    for i in range(300)]
+        for i in range(40):
+            dog = random_dog(rng, self.seller, i)
+            expected = {s.pk for s in searches if _dog_matches_params(dog, s.params)}
+            self.assertEqual({s.pk for s in matching_searches(dog)}, expected)
+            self.assertLess(candidate_searches(dog).count(), len(searches))
+
+    def test_new_dog_emails_matching_searches(self):
+        SavedSearch.objects.create(user=self.buyer, name='labs', params={'breed': 'labrador'})
+        SavedSearch.objects.create(user=self.buyer, name='poodles', params={'breed': 'poodle'})
+        make_dog(self.seller)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(drain_outbox(), (1, 0))
+        self.assertIn('Buddy', mail.outbox[0].subject)
+
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=True)
+class OutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller',
+                                              email='seller@example.com')
+        cls.buyer = User.objects.create_user(username='buyer', password='pw', email='buyer@example.com')
+        cls.dog = make_dog(cls.seller, status='pending')
+        cls.order = Order.objects.create(buyer=cls.buyer, dog=cls.dog, buyer_name='B',
+                                         buyer_email='buyer@example.com', buyer_phone='1')
+
+    def test_accept_order_only_enqueues_once(self):
+        self.client.force_login(self.seller)
+        self.client.post(reverse('dogs:accept_order', args=[self.order.pk]))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(enqueue_order_email(self.order, 'accepted', 'buyer@example.com', 's', 'b'))
+        self.assertEqual(OutboundEmail.objects.filter(status='pending').count(), 1)
+        self.assertEqual(drain_outbox(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OutboundEmail.objects.get().status, 'sent')
+
+    def test_each_tracking_change_is_emailed_once(self):
+        self.client.force_login(self.seller)
+        url = reverse('dogs:update_tracking', args=[self.order.pk])
+        shipped = {'shipment_status': 'shipped', 'carrier': 'UPS', 'tracking_number': '1Z9',
+                   'estimated_delivery': '2026-11-01'}
+        for data in (shipped, shipped, {**shipped, 'carrier': 'FedEx'},
+                     {**shipped, 'carrier': 'FedEx', 'estimated_delivery': '2026-11-03'}):
+            self.client.post(url, data)
+        self.assertEqual(OutboundEmail.objects.count(), 3)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_failed_send_backs_off_then_gives_up(self):
+        enqueue_order_email(self.order, 'accepted', 'buyer@example.com', 's', 'b')
+        with mock.patch('dogs.outbox.EmailMessage.send', side_effect=OSError('smtp down')), \
+                self.assertLogs('dogs.outbox', 'WARNING') as logs:
+            self.assertEqual(drain_outbox(), (0, 1))
+            row = OutboundEmail.objects.get()
+            self.assertEqual((row.status, row.attempts), ('pending', 1))
+            self.assertGreater(row.next_attempt_at, timezone.now())
+            self.assertEqual(drain_outbox(), (0, 0))
+            for _ in range(MAX_ATTEMPTS - 1):
+                OutboundEmail.objects.update(next_attempt_at=timezone.now())
+                drain_outbox()
+        self.assertEqual(OutboundEmail.objects.get().status, 'failed')
+        self.assertEqual(len(logs.output), MAX_ATTEMPTS)
+        self.assertIn('smtp down', logs.output[0])
+
+    def test_rows_claimed_by_another_worker_are_skipped_until_the_lease_expires(self):
+        enqueue_order_email(self.order, 'accepted', 'buyer@example.com', 's', 'b')
+        OutboundEmail.objects.update(status='sending', next_attempt_at=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(drain_outbox(), (0, 0))
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(drain_outbox(), (1, 0))
+        row = OutboundEmail.objects.get()
+        self.assertEqual((row.status, row.attempts), ('sent', 1))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class FavoritesServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from accessories.models import Accessory, AccessoryFavorite
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+        cls.buyer = User.objects.create_user(username='buyer', password='pw')
+        cls.other = User.objects.create_user(username='other', password='pw')
+        cls.dogs = [make_dog(cls.seller, name=f'Dog {i}') for i in range(4)]
+        for dog in cls.dogs[:2]:
+            Favorite.objects.create(user=cls.buyer, dog=dog)
+        Favorite.objects.create(user=cls.other, dog=cls.dogs[0])
+        cls.accessories = [
+            Accessory.objects.create(name=f'Toy {i}', description='d', price='5.00', seller=cls.seller)
+            for i in range(3)
+        ]
+        AccessoryFavorite.objects.create(user=cls.buyer, accessory=cls.accessories[1])
+
+    def test_lookups_are_limited_to_the_page(self):
+        page = [dog.pk for dog in self.dogs[1:]]
+        self.assertEqual(favorited_ids(self.buyer, Dog, page), {self.dogs[1].pk})
+        dogs = list(Dog.objects.filter(pk__in=[d.pk for d in self.dogs]).order_by('pk'))
+        with self.assertNumQueries(1):
+            annotate_favorites(dogs, self.buyer)
+        self.assertEqual([(d.favorites_count, d.is_favorited) for d in dogs],
+                         [(2, True), (1, True), (0, False), (0, False)])
+
+    def test_accessory_list_uses_page_sized_lookups(self):
+        self.client.force_login(self.buyer)
+        response = self.client.get(reverse('accessories:list'))
+        self.assertEqual(response.context['favorited_ids'], {self.accessories[1].pk})
+        self.assertEqual(sorted(a.favorites_count for a in response.context['accessories']), [0, 0, 1])
+
+    def test_toggles_move_the_stored_counters(self):
+        self.client.force_login(self.buyer)
+        data = self.client.post(reverse('dogs:toggle_favorite', args=[self.dogs[0].pk])).json()
+        self.assertEqual((data['is_favorited'], data['favorites_count']), (False, 1))
+        data = self.client.post(reverse('dogs:toggle_favorite', args=[self.dogs[3].pk])).json()
+        self.assertEqual((data['is_favorited'], data['favorites_count']), (True, 1))
+        data = self.client.post(reverse('accessories:toggle_favorite', args=[self.accessories[1].pk])).json()
+        self.assertEqual((data['is_favorited'], data['favorites_count']), (False, 0))
+        self.seller.refresh_from_db()
+        self.assertEqual(self.seller.favorites_received_count, Favorite.objects.count())
+
+    def test_reconcile_repairs_drift(self):
+        from accessories.models import Accessory
+        Dog.objects.filter(pk=self.dogs[0].pk).update(favorites_count=9)
+        Accessory.objects.update(favorites_count=0)
+        User.objects.filter(pk=self.seller.pk).update(favorites_received_count=0)
+        self.assertEqual(reconcile_favorite_counts(),
+                         {'dogs.Dog': 1, 'accessories.Accessory': 1, 'accounts.User': 1})
+        self.assertEqual(Dog.objects.get(pk=self.dogs[0].pk).favorites_count, 2)
+        self.assertEqual(User.objects.get(pk=self.seller.pk).favorites_received_count, 3)
+        self.assertEqual(reconcile_favorite_counts(),
+                         {'dogs.Dog': 0, 'accessories.Accessory': 0, 'accounts.User': 0})
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class BulkSeedingTests(TestCase):
+    COUNTS = {'sellers': 2, 'buyers': 3, 'dogs': 7, 'accessories': 4, 'favorites': 10, 'orders': 5,
+              'conversations': 6, 'messages': 20}
+
+    def test_seeding_is_idempotent_and_leaves_consistent_state(self):
+        from messaging.models import Conversation, ConversationParticipant, Message
+        from .seeding import seed
+        created = seed(self.COUNTS, batch_size=4, pool_size=2)
+        self.assertEqual((created['dogs'], created['messages'], created['conversations']), (7, 20, 6))
+        self.assertEqual(sum(seed(self.COUNTS, batch_size=4, pool_size=2).values()), 0)
+        self.assertEqual(seed({**self.COUNTS, 'dogs': 9}, pool_size=2)['dogs'], 2)
+
+        self.assertFalse(Dog.objects.filter(images_pending=True).exists())
+        self.assertTrue(all(dog.image_manifest['image']['renditions'] for dog in Dog.objects.all()))
+        self.assertTrue(search_dogs(Dog.objects.all(), Dog.objects.first().name.split()[0]).exists())
+        self.assertEqual(reconcile_favorite_counts(),
+                         {'dogs.Dog': 0, 'accessories.Accessory': 0, 'accounts.User': 0})
+        self.assertFalse(Conversation.objects.filter(last_message__isnull=True).exists())
+        self.assertFalse(Conversation.objects.exclude(user_low__lt=F('user_high')).exists())
+        self.assertEqual(sum(ConversationParticipant.objects.values_list('unread_count', flat=True)),
+                         Message.objects.filter(is_read=False).count())
+        # History is spread out, and nothing is read before it was sent
+        self.assertGreater(Message.objects.values('sent_at').distinct().count(), 10)
+        self.assertGreater(Order.objects.values('created_at').distinct().count(), 1)
+        self.assertFalse(Message.objects.filter(read_at__lt=F('sent_at')).exists())
+
+    def test_rerun_fills_gaps_left_by_deleted_rows(self):
+        from messaging.models import Conversation, Message
+        from .seeding import seed
+        seed(self.COUNTS, batch_size=4, pool_size=2)
+        User.objects.filter(username='seed-buyer-1').delete()
+        Dog.objects.filter(name__endswith=' 3').delete()
+        created = seed(self.COUNTS, batch_size=4, pool_size=2)
+        self.assertEqual((created['buyers'], created['dogs']), (1, 1))
+        self.assertEqual(User.objects.filter(username__startswith='seed-buyer-').count(), 3)
+        self.assertEqual(sorted(int(name.rsplit(' ', 1)[1]) for name in Dog.objects.values_list('name', flat=True)),
+                         list(range(7)))
+        # Threads whose canonical key is already taken are skipped rather than hitting the constraint
+        self.assertLessEqual(Conversation.objects.count(), 6)
+        # Orders and messages cascaded with the buyer come back under their old numbers
+        self.assertEqual(sorted(Order.objects.values_list('buyer_phone', flat=True)),
+                         [f'555-{k:04d}' for k in range(5)])
+        self.assertEqual(Message.objects.count(), 20)
+
+
+def png_upload(name='photo.png', size=(1600, 1200), color=(200, 120, 40, 255)):
+    buffer = io.BytesIO()
+    Image.new('RGBA', size, color).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=True)
+class ImageRenditionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+
+    def test_upload_gets_normalised_source_and_renditions(self):
+        dog = make_dog(self.seller, image=png_upload())
+        dog.refresh_from_db()
+        self.assertTrue(dog.image.name.endswith('.jpg'))
+        entry = dog.image_manifest['image']
+        self.assertEqual(entry['source'], dog.image.name)
+        self.assertEqual(set(entry['renditions']), set(RENDITIONS))
+        self.assertEqual(entry['renditions']['thumb']['width'], 320)
+        self.assertEqual(entry['renditions']['full']['jpeg'], dog.image.name)
+        with dog.image.storage.open(entry['renditions']['card']['webp']) as handle:
+            self.assertEqual(Image.open(handle).size, (640, 480))
+
+    def test_resave_with_same_content_is_skipped(self):
+        dog = make_dog(self.seller, image=png_upload())
+        with mock.patch('dogs.images.Image.open') as image_open:
+            dog.name = 'Renamed'
+            dog.save()
+        image_open.assert_not_called()
+
+    def test_pillow_runs_only_for_changed_files(self):
+        from . import images
+        dog = make_dog(self.seller, image=png_upload(), image2=png_upload('second.png'))
+        with mock.patch('dogs.images.Image.open', wraps=Image.open) as image_open, \
+                mock.patch('dogs.images._encode', wraps=images._encode) as encode:
+            dog.status = 'pending'
+            dog.save(update_fields=['status'])
+            dog.name = 'Renamed'
+            dog.save()
+            self.assertEqual((image_open.call_count, encode.call_count), (0, 0))
+
+            dog.image2 = png_upload('third.png', color=(0, 0, 255, 255))
+            dog.save()
+            self.assertEqual(image_open.call_count, 1)
+
+            # An already-normalised JPEG (e.g. a remapped path) reuses its renditions
+            image_open.reset_mock()
+            encode.reset_mock()
+            other = make_dog(self.seller, image=dog.image.name)
+            self.assertEqual((image_open.call_count, encode.call_count), (1, 0))
+        self.assertEqual(other.image_manifest['image'], dog.image_manifest['image'])
+
+    def test_responsive_image_tag(self):
+        dog = make_dog(self.seller, image=png_upload())
+        html = Template("{% load images %}{% responsive_image dog.image 'card' alt=dog.name %}").render(
+            Context({'dog': dog}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertRegex(html, r'_thumb_[0-9a-f]{12}\.jpg 320w')
+        self.assertNotIn('1200w', html)
+        plain = make_dog(self.seller)
+        html = Template("{% load images %}{% responsive_image dog.image %}").render(Context({'dog': plain}))
+        self.assertIn('src="/media/dogs/test.jpg"', html)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=False, IMAGE_WORKER='daemon')
+class ImageWorkerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+
+    def test_upload_is_pending_until_worker_runs(self):
+        with mock.patch('dogs.images.Image.open') as image_open:
+            dog = make_dog(self.seller, image=png_upload())
+        image_open.assert_not_called()
+        self.assertTrue(Dog.objects.get(pk=dog.pk).images_pending)
+        self.assertContains(self.client.get(dog.get_absolute_url()), 'Images processing')
+        reset_view_counter()
+
+        self.assertEqual(process_all_pending(), 1)
+        dog.refresh_from_db()
+        self.assertFalse(dog.images_pending)
+        self.assertIn('card', dog.image_manifest['image']['renditions'])
+        self.assertEqual(process_all_pending(), 0)
+
+    def test_job_for_replaced_upload_does_not_clobber_it(self):
+        dog = make_dog(self.seller, image=png_upload())
+        stale = Dog.objects.get(pk=dog.pk)
+        dog.image = png_upload('second.png')
+        dog.save()
+        self.assertFalse(process_instance_images(stale, Dog.IMAGE_FIELDS))
+        self.assertEqual(process_all_pending(), 1)
+        dog.refresh_from_db()
+        self.assertIn('second', dog.image.name)
+
+    def test_pool_jobs_invalidate_the_homepage_in_the_parent(self):
+        dog = make_dog(self.seller, image=png_upload())
+        cache.set(HOMEPAGE_CACHE_KEY, 'stale')
+        # What a pool child runs: the work, but no cache write it could only make to its own LocMemCache
+        self.assertTrue(_run_job('dogs.Dog', dog.pk))
+        self.assertEqual(cache.get(HOMEPAGE_CACHE_KEY), 'stale')
+        failed, finished = Future(), Future()
+        failed.set_exception(OSError('worker died'))
+        with self.assertLogs('dogs.images', 'ERROR'):
+            _job_done('dogs.Dog', failed)
+        self.assertEqual(cache.get(HOMEPAGE_CACHE_KEY), 'stale')
+        finished.set_result(True)
+        _job_done('dogs.Dog', finished)
+        self.assertIsNone(cache.get(HOMEPAGE_CACHE_KEY))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class DogBrowseIndexTests(TestCase):
+    """Always-on counterpart of ``DogIndexPlanBenchmark``: the browse queries can use the partial indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+        for i in range(12):
+            make_dog(cls.seller, name=f'Dog {i}', price=f'{100 + i}.00',
+                     status='available' if i % 3 else 'sold')
+
+    def plan(self, queryset):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # A dozen rows would otherwise always be a sequential scan
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            else:
+                # Without statistics SQLite guesses that every index is equally selective
+                cursor.execute('ANALYZE')
+        return queryset.explain()
+
+    def list_queryset(self, params=None):
+        view = DogListView()
+        view.setup(RequestFactory().get('/', params or {}))
+        return view.get_queryset()[:12]
+
+    def assertIndexOrdered(self, plan, *index_names):
+        """The plan reads one of ``index_names`` and needs no separate sort step."""
+        self.assertTrue(any(name in plan for name in index_names), plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertNotRegex(plan, r'(?m)^\s*(->\s*)?Sort\b')
+
+    def test_browse_sorts_are_served_by_an_index(self):
+        # Either the partial index or the status composite answers "newest available"
+        self.assertIndexOrdered(self.plan(self.list_queryset()),
+                                'dog_available_created_idx', 'dog_status_created_idx')
+        self.assertIndexOrdered(self.plan(self.list_queryset({'sort': 'price'})), 'dog_available_price_idx')
+
+    def test_other_statuses_use_the_status_composite(self):
+        sold = Dog.objects.filter(status='sold').order_by('-created_at')[:12]
+        self.assertIndexOrdered(self.plan(sold), 'dog_status_created_idx')
+        self.assertIn('dog_status_created_idx', self.plan(Dog.objects.filter(status='pending').values('pk')))
+
+
+@skipUnless(os.environ.get('RUN_BENCHMARKS'), 'set RUN_BENCHMARKS=1 to seed the index benchmark')
+class DogIndexPlanBenchmark(TestCase):
+    """Seeds BENCH_DOGS dogs (default 100k) and checks the browse queries hit the composite indexes.
+
+    Timings go to the ``dogs.benchmarks`` logger at INFO.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        total = int(os.environ.get('BENCH_DOGS', '100000'))
+        rng = random.Random(42)
+        sellers = User.objects.bulk_create([
+            User(username=f'bench_seller{i}', role='seller') for i in range(200)
+        ])
+        breeds = [f'Breed {i}' for i in range(150)]
+        started = time.perf_counter()
+        batch = []
+        for i in range(total):
+            batch.append(Dog(
+                name=f'Dog {i}', breed=rng.choice(breeds), age=rng.randint(1, 120),
+                gender=rng.choice(['male', 'female']), price=Decimal(rng.randint(100, 5000)),
+                description='Benchmark dog', location=f'City {i % 300}', seller=rng.choice(sellers),
+                status=rng.choices(['available', 'sold', 'pending'], [80, 15, 5])[0],
+                is_featured=rng.random() < 0.01, image='dogs/test.jpg',
+            ))
+            if len(batch) == 5000:
+                Dog.objects.bulk_create(batch)
+                batch = []
+        Dog.objects.bulk_create(batch)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        benchmark_log.info('Seeded %s dogs in %.1fs', total, time.perf_counter() - started)
+        cls.dog = Dog.objects.filter(status='available').first()
+
+    def assertPlanUses(self, queryset, *index_names):
+        started = time.perf_counter()
+        list(queryset)
+        elapsed = (time.perf_counter() - started) * 1000
+        plan = queryset.explain()
+        benchmark_log.info('%s: %.2fms', ' or '.join(index_names), elapsed)
+        self.assertTrue(any(name in plan for name in index_names), plan)
+
+    def _view(self, view_class, params=None, **kwargs):
+        view = view_class()
+        view.setup(RequestFactory().get('/', params or {}), **kwargs)
+        return view
+
+    def test_list_view_newest(self):
+        self.assertPlanUses(self._view(DogListView).get_queryset()[:12],
+                            'dog_available_created_idx', 'dog_status_created_idx')
+
+    def test_list_view_by_price(self):
+        queryset = self._view(DogListView, {'sort': 'price'}).get_queryset()[:12]
+        self.assertPlanUses(queryset, 'dog_available_price_idx')
+
+    def test_home_view_cards(self):
+        self.assertPlanUses(homepage_cards()[:8], 'dog_home_cards_idx')
+
+    def test_detail_view_related_listings(self):
+        view = self._view(DogDetailView, pk=self.dog.pk)
+        view.object = self.dog
+        self.assertPlanUses(view.get_similar_dogs()[:4], 'dog_breed_status_idx')
+        self.assertPlanUses(view.get_seller_dogs()[:4], 'dog_seller_status_idx')
+
+
+@skipUnless(os.environ.get('RUN_BENCHMARKS'), 'set RUN_BENCHMARKS=1 to seed the saved-search benchmark')
+class SavedSearchMatchingBenchmark(TestCase):
+    """Seeds BENCH_SAVED_SEARCHES saved searches (default 1M) and times matching one new dog.
+
+    Timings go to the ``dogs.benchmarks`` logger at INFO.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        total = int(os.environ.get('BENCH_SAVED_SEARCHES', '1000000'))
+        rng = random.Random(11)
+        cls.seller = User.objects.create_user(username='bench_seller', role='seller')
+        users = User.objects.bulk_create([User(username=f'bench_buyer{i}') for i in range(1000)])
+        started = time.perf_counter()
+        for offset in range(0, total, 10000):
+            searches = SavedSearch.objects.bulk_create([
+                SavedSearch(user=rng.choice(users), name='bench', params=cls.bench_params(rng))
+                for _ in range(min(10000, total - offset))
+            ])
+            SavedSearchKey.objects.bulk_create([
+                SavedSearchKey(saved_search=search, key=key)
+                for search in searches for key in search_keys(search.params)
+            ])
+        benchmark_log.info('Seeded %s saved searches in %.1fs', total, time.perf_counter() - started)
+        cls.total = total
+
+    BREEDS = [f'Breed{i} Hound' for i in range(150)]
+    CITIES = [f'City{i}' for i in range(300)]
+
+    @classmethod
+    def bench_params(cls, rng):
+        # Real alerts almost always name a breed, a place or a budget
+        params = {'gender': rng.choice(['', 'male', 'female'])}
+        roll = rng.random()
+        if roll < 0.5:
+            params['breed'] = rng.choice(cls.BREEDS)
+        elif roll < 0.85:
+            params['location'] = rng.choice(cls.CITIES)
+        else:
+            low = rng.choice([100, 300, 600, 1200])
+            params['min_price'], params['max_price'] = low, low * 2
+        return params
+
+    def bench_dog(self, rng, i):
+        dog = random_dog(rng, self.seller, i)
+        dog.breed, dog.location = rng.choice(self.BREEDS), rng.choice(self.CITIES)
+        return dog
+
+    def test_match_one_new_dog(self):
+        rng = random.Random(3)
+        for i in range(5):
+            dog = self.bench_dog(rng, i)
+            started = time.perf_counter()
+            candidates = candidate_searches(dog).count()
+            matches = sum(1 for _ in matching_searches(dog))
+            elapsed = time.perf_counter() - started
+            benchmark_log.info('%s / %s: %s keys, %s candidates, %s matches, %.2fs',
+                               dog.breed, dog.location, len(dog_keys(dog)), candidates, matches, elapsed)
+            # Candidates stay close to the true matches instead of the whole table
+            self.assertLess(candidates, 2 * matches + self.total / 100)
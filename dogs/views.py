@@ -7,11 +7,11 @@ from django.contrib import messages
 from django.db.models import Q, Count
 from django.urls import reverse_lazy
 from django.db import transaction
-from django.core.mail import send_mail
 from django.conf import settings
 from django.http import JsonResponse
 from django.core.paginator import Paginator
 from django.core.files.base import ContentFile
+import hashlib
 import requests
 from .models import Dog, Favorite, Order
 from .forms import DogForm, OrderForm, SavedSearchForm, ReportForm
@@ -19,6 +19,12 @@ from .models import Report
 from .forms import DogForm, OrderForm, SavedSearchForm
 from accounts.models import User
 from .models import SavedSearch
+from .search import search_dogs
+from .counters import record_view, pending_views
+from .favorites import favorited_ids
+from .homepage import get_homepage_snapshot
+from .pagination import CursorPaginationMixin
+from .outbox import enqueue_order_email
 
 
 class HomeView(ListView):
@@ -28,41 +34,28 @@ class HomeView(ListView):
     context_object_name = 'featured_dogs'
     
     def get_queryset(self):
-        # Show featured dogs first, then recent dogs
-        featured_dogs = Dog.objects.filter(status='available', is_featured=True).select_related('seller')
-        recent_dogs = Dog.objects.filter(status='available', is_featured=False).select_related('seller').order_by('-created_at')
-        
-        # Combine featured and recent dogs, limit to 8 total
-        all_dogs = list(featured_dogs) + list(recent_dogs)
-        return all_dogs[:8]
+        # Featured dogs first, then recent dogs, limited to 8 (cached snapshot)
+        self.snapshot = get_homepage_snapshot()
+        return self.snapshot['dogs']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Get statistics
-        context['total_dogs'] = Dog.objects.filter(status='available').count()
-        context['total_sellers'] = User.objects.filter(role='seller').count()
-        context['total_orders'] = Order.objects.filter(status='completed').count()
-        
-        # Get popular breeds
-        popular_breeds = Dog.objects.filter(status='available').values('breed').annotate(
-            count=Count('breed')
-        ).order_by('-count')[:6]
-        
-        context['popular_breeds'] = [
-            {'name': breed['breed'].title(), 'count': breed['count']} 
-            for breed in popular_breeds
-        ]
+        # Statistics and popular breeds come from the same snapshot
+        context['total_dogs'] = self.snapshot['total_dogs']
+        context['total_sellers'] = self.snapshot['total_sellers']
+        context['total_orders'] = self.snapshot['total_orders']
+        context['popular_breeds'] = self.snapshot['popular_breeds']
         
-        # Favorited ids for heart state
+        # Favorited ids for heart state, limited to the dogs on the page
         if self.request.user.is_authenticated and not self.request.user.is_seller:
-            context['favorited_ids'] = set(
-                Favorite.objects.filter(user=self.request.user).values_list('dog_id', flat=True)
+            context['favorited_ids'] = favorited_ids(
+                self.request.user, Dog, [dog.pk for dog in self.snapshot['dogs']]
             )
         return context
 
 
-class DogListView(ListView):
+class DogListView(CursorPaginationMixin, ListView):
     """List view for browsing all dogs"""
     model = Dog
     template_name = 'dogs/list.html'
@@ -74,13 +67,9 @@ class DogListView(ListView):
         
         # Search functionality
         search = self.request.GET.get('search')
+        sort_by = self.request.GET.get('sort', '-created_at')
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(breed__icontains=search) |
-                Q(location__icontains=search) |
-                Q(description__icontains=search)
-            )
+            queryset = search_dogs(queryset, search, with_rank=(sort_by == 'relevance'))
         
         # Filter by breed
         breed = self.request.GET.get('breed')
@@ -120,13 +109,23 @@ class DogListView(ListView):
             queryset = queryset.filter(is_neutered=True)
         
         # Sorting
-        sort_by = self.request.GET.get('sort', '-created_at')
         valid_sorts = ['-created_at', 'created_at', 'price', '-price', 'name', '-name']
-        if sort_by in valid_sorts:
+        if sort_by == 'relevance' and search:
+            queryset = queryset.order_by('-search_rank', '-created_at')
+        elif sort_by in valid_sorts:
             queryset = queryset.order_by(sort_by)
         
         return queryset
     
+    def get_cursor_sort(self):
+        sort_by = self.request.GET.get('sort', '-created_at')
+        if sort_by == 'relevance' and self.request.GET.get('search'):
+            # Ranked results have no keyset; they stay on numbered pages
+            return None
+        if sort_by in ['-created_at', 'created_at', 'price', '-price', 'name', '-name']:
+            return sort_by
+        return '-created_at'
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
@@ -159,8 +158,8 @@ class DogListView(ListView):
             }
             context['saved_search_form'] = SavedSearchForm(initial=initial)
         if self.request.user.is_authenticated and not self.request.user.is_seller:
-            context['favorited_ids'] = set(
-                Favorite.objects.filter(user=self.request.user).values_list('dog_id', flat=True)
+            context['favorited_ids'] = favorited_ids(
+                self.request.user, Dog, [dog.pk for dog in context['object_list']]
             )
         return context
 
@@ -173,9 +172,9 @@ class DogDetailView(DetailView):
     
     def get_object(self):
         obj = super().get_object()
-        # Increment view count
-        obj.views_count += 1
-        obj.save(update_fields=['views_count'])
+        # Buffer the view; counts are applied to views_count in bulk later
+        record_view(obj.pk)
+        obj.views_count += pending_views([obj.pk]).get(obj.pk, 0)
         return obj
     
     def get_context_data(self, **kwargs):
@@ -188,19 +187,24 @@ class DogDetailView(DetailView):
                 dog=self.object
             ).exists()
         
-        # Get similar dogs (same breed, different dog)
-        context['similar_dogs'] = Dog.objects.filter(
+        context['similar_dogs'] = self.get_similar_dogs()[:4]
+        context['seller_dogs'] = self.get_seller_dogs()[:4]
+        
+        return context
+    
+    def get_similar_dogs(self):
+        # Same breed, different dog
+        return Dog.objects.filter(
             breed=self.object.breed,
             status='available'
-        ).exclude(pk=self.object.pk).select_related('seller')[:4]
-        
-        # Get seller's other dogs
-        context['seller_dogs'] = Dog.objects.filter(
-            seller=self.object.seller,
+        ).exclude(pk=self.object.pk).select_related('seller')
+    
+    def get_seller_dogs(self):
+        # Seller's other dogs
+        return Dog.objects.filter(
+            seller_id=self.object.seller_id,
             status='available'
-        ).exclude(pk=self.object.pk).select_related('seller')[:4]
-        
-        return context
+        ).exclude(pk=self.object.pk).select_related('seller')
 
 
 class DogCreateView(LoginRequiredMixin, CreateView):
@@ -210,7 +214,8 @@ class DogCreateView(LoginRequiredMixin, CreateView):
     template_name = 'dogs/add.html'
     
     def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_seller:
+        # Anonymous visitors fall through to LoginRequiredMixin's redirect
+        if request.user.is_authenticated and not request.user.is_seller:
             messages.error(request, 'Only sellers can add dogs.')
             return redirect('home')
         return super().dispatch(request, *args, **kwargs)
@@ -295,7 +300,7 @@ def toggle_favorite(request, pk):
         return JsonResponse({
             'is_favorited': is_favorited,
             'message': message,
-            'favorites_count': dog.favorited_by.count()
+            'favorites_count': Dog.objects.filter(pk=dog.pk).values_list('favorites_count', flat=True).first()
         })
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
@@ -343,10 +348,7 @@ def create_order(request, pk):
             # Ensure a conversation exists and notify via message and email (best-effort)
             try:
                 from messaging.models import Conversation, Message
-                conversation = Conversation.objects.filter(dog=dog).filter(participants=request.user).filter(participants=dog.seller).first()
-                if not conversation:
-                    conversation = Conversation.objects.create(dog=dog)
-                    conversation.participants.add(request.user, dog.seller)
+                conversation, _ = Conversation.get_or_create_between(request.user, dog.seller, dog)
                 Message.objects.create(
                     sender=request.user,
                     receiver=dog.seller,
@@ -358,25 +360,17 @@ def create_order(request, pk):
             except Exception:
                 pass
 
-            # Email notifications (console backend in dev)
-            try:
-                send_mail(
-                    subject=f'New order placed for {dog.name}',
-                    message=f'Buyer {request.user.username} placed an order for {dog.name}. Log in to review.',
-                    from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', None),
-                    recipient_list=[dog.seller.email] if dog.seller.email else [],
-                    fail_silently=True,
-                )
-                if request.user.email:
-                    send_mail(
-                        subject=f'Order submitted for {dog.name}',
-                        message='Your order was submitted. The seller will review and respond shortly.',
-                        from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', None),
-                        recipient_list=[request.user.email],
-                        fail_silently=True,
-                    )
-            except Exception:
-                pass
+            # Email notifications are queued and delivered by the outbox worker
+            enqueue_order_email(
+                order, 'placed', dog.seller.email,
+                subject=f'New order placed for {dog.name}',
+                body=f'Buyer {request.user.username} placed an order for {dog.name}. Log in to review.',
+            )
+            enqueue_order_email(
+                order, 'submitted', request.user.email,
+                subject=f'Order submitted for {dog.name}',
+                body='Your order was submitted. The seller will review and respond shortly.',
+            )
 
             messages.success(request, 'Order submitted successfully! The seller will contact you soon.')
             return redirect('dogs:detail', pk=dog.pk)
@@ -404,17 +398,11 @@ def accept_order(request, order_id):
     order.status = 'confirmed'
     order.save(update_fields=['status', 'updated_at'])
     # Email notify buyer
-    try:
-        if order.buyer.email:
-            send_mail(
-                subject=f'Your order for {order.dog.name} was accepted',
-                message='The seller accepted your order. You can coordinate next steps via Messages.',
-                from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', None),
-                recipient_list=[order.buyer.email],
-                fail_silently=True,
-            )
-    except Exception:
-        pass
+    enqueue_order_email(
+        order, 'accepted', order.buyer.email,
+        subject=f'Your order for {order.dog.name} was accepted',
+        body='The seller accepted your order. You can coordinate next steps via Messages.',
+    )
     messages.success(request, 'Order accepted. Please coordinate with the buyer via messages.')
     return redirect('accounts:seller_orders')
 
@@ -435,17 +423,11 @@ def decline_order(request, order_id):
     except Exception:
         pass
     # Notify buyer
-    try:
-        if order.buyer.email:
-            send_mail(
-                subject=f'Your order for {order.dog.name} was declined',
-                message='The seller declined your order. You may explore other listings.',
-                from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', None),
-                recipient_list=[order.buyer.email],
-                fail_silently=True,
-            )
-    except Exception:
-        pass
+    enqueue_order_email(
+        order, 'declined', order.buyer.email,
+        subject=f'Your order for {order.dog.name} was declined',
+        body='The seller declined your order. You may explore other listings.',
+    )
     messages.info(request, 'Order declined.')
     return redirect('accounts:seller_orders')
 
@@ -487,17 +469,11 @@ def complete_order(request, order_id):
     order.dog.save(update_fields=['status'])
     order.save(update_fields=['status', 'updated_at'])
     # Notify buyer
-    try:
-        if order.buyer.email:
-            send_mail(
-                subject=f'Order completed for {order.dog.name}',
-                message='Congratulations! The order is marked completed. Please leave a review for the seller.',
-                from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', None),
-                recipient_list=[order.buyer.email],
-                fail_silently=True,
-            )
-    except Exception:
-        pass
+    enqueue_order_email(
+        order, 'completed', order.buyer.email,
+        subject=f'Order completed for {order.dog.name}',
+        body='Congratulations! The order is marked completed. Please leave a review for the seller.',
+    )
     messages.success(request, 'Order marked as completed. Congratulations!')
     return redirect('accounts:seller_orders')
 
@@ -547,21 +523,16 @@ def update_tracking(request, order_id):
         order.delivered_at = timezone.now()
     order.save()
     # Notify buyer via email when tracking changes
-    try:
-        if order.buyer.email:
-            from django.core.mail import send_mail
-            from django.conf import settings
-            status_readable = dict(Order.SHIPMENT_STATUS_CHOICES).get(order.shipment_status, order.shipment_status)
-            tracking_info = f"\nCarrier: {order.carrier or '-'}\nTracking #: {order.tracking_number or '-'}\nETA: {order.estimated_delivery or '-'}"
-            send_mail(
-                subject=f"Update on your order for {order.dog.name}: {status_readable}",
-                message=f"Hello {order.buyer.first_name or order.buyer.username},\n\nThe seller updated shipment status for {order.dog.name} to: {status_readable}.{tracking_info}\n\nThank you for using PawPalace!",
-                from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', None),
-                recipient_list=[order.buyer.email],
-                fail_silently=True,
-            )
-    except Exception:
-        pass
+    status_readable = dict(Order.SHIPMENT_STATUS_CHOICES).get(order.shipment_status, order.shipment_status)
+    tracking_info = f"\nCarrier: {order.carrier or '-'}\nTracking #: {order.tracking_number or '-'}\nETA: {order.estimated_delivery or '-'}"
+    # One email per distinct (status, carrier, tracking #, ETA); re-saving the same values sends nothing
+    shipment = '|'.join(str(value or '-') for value in (
+        order.shipment_status, order.carrier, order.tracking_number, order.estimated_delivery))
+    enqueue_order_email(
+        order, f'tracking:{hashlib.sha1(shipment.encode()).hexdigest()[:16]}', order.buyer.email,
+        subject=f"Update on your order for {order.dog.name}: {status_readable}",
+        body=f"Hello {order.buyer.first_name or order.buyer.username},\n\nThe seller updated shipment status for {order.dog.name} to: {status_readable}.{tracking_info}\n\nThank you for using PawPalace!",
+    )
     messages.success(request, 'Tracking updated.')
     return redirect('accounts:seller_orders')
 
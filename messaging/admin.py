@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Message, Conversation
+from .models import Message, Conversation, ConversationParticipant
 
 
 @admin.register(Message)
@@ -28,6 +28,13 @@ class MessageAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('sender', 'receiver', 'dog')
 
 
+class ConversationParticipantInline(admin.TabularInline):
+    model = ConversationParticipant
+    extra = 0
+    raw_id_fields = ('user',)
+    readonly_fields = ('unread_count',)
+
+
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
     """Admin configuration for Conversation model"""
@@ -36,8 +43,8 @@ class ConversationAdmin(admin.ModelAdmin):
     list_filter = ('created_at', 'updated_at')
     search_fields = ('dog__name', 'participants__username')
     ordering = ('-updated_at',)
-    readonly_fields = ('created_at', 'updated_at')
-    filter_horizontal = ('participants',)
+    readonly_fields = ('last_message', 'last_message_at', 'created_at', 'updated_at')
+    inlines = [ConversationParticipantInline]
     
     def get_participants(self, obj):
         return ", ".join([user.username for user in obj.participants.all()])
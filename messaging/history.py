@@ -0,0 +1,42 @@
+"""Keyset-paginated conversation history.
+
+``conversation_detail`` renders only the newest ``PAGE_SIZE`` messages; older
+pages are fetched from ``conversation_history`` with an opaque cursor naming
+the oldest message already shown. Pages are ordered on ``(sent_at, id)`` so the
+lookup is a range scan on the ``(conversation, sent_at)`` index however deep
+the thread goes, and messages sharing a timestamp are neither skipped nor
+repeated.
+"""
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+PAGE_SIZE = 50
+
+
+def encode_cursor(message):
+    return f'{message.sent_at.isoformat()},{message.pk}'
+
+
+def decode_cursor(cursor):
+    """``(sent_at, id)`` from a cursor; ValueError when it is malformed."""
+    sent_at, _, pk = (cursor or '').rpartition(',')
+    sent_at = parse_datetime(sent_at)
+    if sent_at is None:
+        raise ValueError('Invalid cursor')
+    return sent_at, int(pk)
+
+
+def history_page(conversation, before=None, per_page=None):
+    """``(messages, older_cursor)``: up to a page of messages before ``before``, oldest first.
+
+    ``older_cursor`` is None when there is nothing older to fetch.
+    """
+    per_page = per_page or PAGE_SIZE
+    messages = conversation.messages.select_related('sender', 'receiver').order_by('-sent_at', '-id')
+    if before:
+        sent_at, pk = decode_cursor(before)
+        messages = messages.filter(Q(sent_at__lt=sent_at) | Q(sent_at=sent_at, id__lt=pk))
+    page = list(messages[:per_page + 1])
+    has_older = len(page) > per_page
+    page = page[:per_page][::-1]
+    return page, encode_cursor(page[0]) if has_older else None
@@ -0,0 +1,44 @@
+"""Inbox rows built in a constant number of queries.
+
+The page of conversations comes from the caller's ``ConversationParticipant``
+rows joined to their conversations, with the denormalised last message (and
+its sender) and the caller's unread count riding along in the same query; the
+other participants are then loaded in one ``IN`` query, whatever the page
+size. ``Message`` is never scanned.
+"""
+from django.core.paginator import Paginator
+from django.db.models import F, OuterRef, Subquery
+
+from accounts.models import User
+from .models import Conversation, ConversationParticipant
+
+PAGE_SIZE = 20
+
+
+def inbox_conversations(user):
+    return Conversation.objects.filter(memberships__user=user).select_related(
+        'dog', 'last_message__sender'
+    ).annotate(
+        unread_count=F('memberships__unread_count'),
+        other_user_pk=Subquery(
+            ConversationParticipant.objects.filter(conversation_id=OuterRef('pk'))
+            .exclude(user_id=user.pk).values('user_id')[:1]
+        ),
+    ).order_by('-updated_at', '-pk')
+
+
+def inbox_page(user, page_number, per_page=None):
+    """``(page, rows)``; each row has the conversation, other user, last message, its time and unread count."""
+    page = Paginator(inbox_conversations(user), per_page or PAGE_SIZE).get_page(page_number)
+    conversations = list(page.object_list)
+    others = User.objects.in_bulk([c.other_user_pk for c in conversations if c.other_user_pk])
+    rows = []
+    for conversation in conversations:
+        rows.append({
+            'conversation': conversation,
+            'other_user': others.get(conversation.other_user_pk),
+            'last_message': conversation.last_message,
+            'activity_at': conversation.last_message_at or conversation.updated_at,
+            'unread_count': conversation.unread_count,
+        })
+    return page, rows
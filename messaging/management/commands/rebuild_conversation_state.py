@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from messaging.state import rebuild_conversation_state
+
+
+class Command(BaseCommand):
+    help = "Recompute conversations' last message and participants' unread counts from the messages."
+
+    def handle(self, *args, **options):
+        rebuild_conversation_state()
+        self.stdout.write(self.style.SUCCESS("Conversation state rebuilt."))
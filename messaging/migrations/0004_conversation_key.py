@@ -0,0 +1,66 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def backfill_keys(apps, schema_editor):
+    """Key every two-person conversation and fold duplicate threads into the oldest one."""
+    from accounts.notifications import SubqueryCount
+    Conversation = apps.get_model('messaging', 'Conversation')
+    ConversationParticipant = apps.get_model('messaging', 'ConversationParticipant')
+    Message = apps.get_model('messaging', 'Message')
+
+    members = defaultdict(list)
+    for conversation_id, user_id in ConversationParticipant.objects.values_list('conversation_id', 'user_id'):
+        members[conversation_id].append(user_id)
+    threads = defaultdict(list)
+    for conversation_id, dog_id in Conversation.objects.order_by('created_at', 'pk').values_list('pk', 'dog_id'):
+        users = sorted(members.get(conversation_id, []))
+        if len(users) == 2:
+            threads[(dog_id, users[0], users[1])].append(conversation_id)
+
+    merged = []
+    for (dog_id, user_low, user_high), conversation_ids in threads.items():
+        keep, duplicates = conversation_ids[0], conversation_ids[1:]
+        if duplicates:
+            Message.objects.filter(conversation_id__in=duplicates).update(conversation_id=keep)
+            Conversation.objects.filter(pk__in=duplicates).delete()
+            merged.append(keep)
+        Conversation.objects.filter(pk=keep).update(user_low_id=user_low, user_high_id=user_high)
+
+    if merged:
+        latest = Message.objects.filter(conversation=OuterRef('pk')).order_by('-sent_at', '-id')
+        Conversation.objects.filter(pk__in=merged).update(
+            last_message=Subquery(latest.values('pk')[:1]),
+            last_message_at=Subquery(latest.values('sent_at')[:1]),
+        )
+        ConversationParticipant.objects.filter(conversation_id__in=merged).update(unread_count=SubqueryCount(
+            Message.objects.filter(
+                conversation=OuterRef('conversation'), receiver=OuterRef('user'), is_read=False
+            ).order_by().values('pk')
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('messaging', '0003_conversation_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='user_high',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='user_low',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-17 05:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0005_conversation_key_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='read_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from dogs.models import Dog
 
 User = get_user_model()
@@ -22,39 +24,132 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['-sent_at']
+        indexes = [
+            models.Index(fields=['conversation', 'sent_at'], name='message_conversation_sent_idx'),
+            models.Index(fields=['receiver', 'is_read'], name='message_receiver_read_idx'),
+        ]
     
     def __str__(self):
         return f"Message from {self.sender.username} to {self.receiver.username}"
     
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        # The conversation's last message and unread counts commit with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if created and self.conversation_id:
+                from .state import record_message
+                record_message(self)
+    
     def mark_as_read(self):
         if not self.is_read:
-            from django.utils import timezone
-            self.is_read = True
-            self.read_at = timezone.now()
-            self.save()
+            from .state import mark_message_read
+            mark_message_read(self)
 
 
 class Conversation(models.Model):
     """Model to group messages between two users about a specific dog"""
     
-    participants = models.ManyToManyField(User, related_name='conversations')
+    participants = models.ManyToManyField(User, related_name='conversations', through='ConversationParticipant')
     dog = models.ForeignKey(Dog, on_delete=models.CASCADE, related_name='conversations', blank=True, null=True)
     
+    # Denormalised from Message so the inbox never has to look for the latest row
+    last_message = models.ForeignKey(Message, on_delete=models.SET_NULL, related_name='+', blank=True, null=True)
+    last_message_at = models.DateTimeField(blank=True, null=True)
+    # Bumped whenever messages in the thread are marked read; part of the polling ETag
+    read_version = models.PositiveIntegerField(default=0)
+    
+    # Canonical key of a two-person thread: (dog, lower user id, higher user id)
+    user_low = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', blank=True, null=True)
+    user_high = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', blank=True, null=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-updated_at']
+        constraints = [
+            models.UniqueConstraint(fields=['dog', 'user_low', 'user_high'], name='unique_dog_conversation'),
+            # NULLs never collide in a unique index, so direct threads need their own
+            models.UniqueConstraint(fields=['user_low', 'user_high'], condition=models.Q(dog__isnull=True),
+                                    name='unique_direct_conversation'),
+        ]
     
     def __str__(self):
         participants = ", ".join([user.username for user in self.participants.all()])
         dog_info = f" about {self.dog.name}" if self.dog else ""
         return f"Conversation between {participants}{dog_info}"
     
-    @property
-    def last_message(self):
-        return self.messages.first()
+    @classmethod
+    def between(cls, user_a, user_b, dog=None):
+        """The thread between two users (about ``dog``, or direct), as a single indexed lookup"""
+        user_low, user_high = sorted([user_a.pk, user_b.pk])
+        return cls.objects.filter(dog=dog, user_low_id=user_low, user_high_id=user_high)
+    
+    @classmethod
+    def get_or_create_between(cls, user_a, user_b, dog=None):
+        """``(conversation, created)``; concurrent first messages end up in the same thread"""
+        conversation = cls.between(user_a, user_b, dog).first()
+        if conversation:
+            return conversation, False
+        user_low, user_high = sorted([user_a.pk, user_b.pk])
+        try:
+            with transaction.atomic():
+                conversation = cls.objects.create(dog=dog, user_low_id=user_low, user_high_id=user_high)
+                conversation.participants.add(user_a, user_b)
+            return conversation, True
+        except IntegrityError:
+            # Lost the race to the unique constraint; use the winner's thread
+            return cls.between(user_a, user_b, dog).get(), False
     
     def get_other_participant(self, user):
         """Get the other participant in the conversation"""
-        return self.participants.exclude(id=user.id).first()
\ No newline at end of file
+        return self.participants.exclude(id=user.id).first()
+
+
+class ConversationParticipant(models.Model):
+    """Membership of a user in a conversation, with their unread message count"""
+    
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_memberships')
+    unread_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        # The table Django created for the original ManyToManyField
+        db_table = 'messaging_conversation_participants'
+        unique_together = [('conversation', 'user')]
+        indexes = [
+            models.Index(fields=['user', 'conversation'], name='participant_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} in conversation {self.conversation_id}"
+
+
+@receiver(post_save, sender=Message)
+def count_unread_message(sender, instance: Message, created: bool, update_fields=None, **kwargs):
+    from accounts import notifications
+    if created:
+        if not instance.is_read:
+            notifications.adjust(instance.receiver_id, 'unread_messages', 1)
+    elif update_fields is None or 'is_read' in update_fields:
+        notifications.invalidate(instance.receiver_id, 'unread_messages')
+
+
+@receiver(post_delete, sender=Message)
+def uncount_unread_message(sender, instance: Message, **kwargs):
+    from accounts import notifications
+    from .state import forget_message
+    if instance.conversation_id:
+        forget_message(instance)
+    if not instance.is_read:
+        notifications.adjust(instance.receiver_id, 'unread_messages', -1)
+
+
+@receiver(post_save, sender=Message)
+def push_new_message(sender, instance: Message, created: bool, **kwargs):
+    if created:
+        from .realtime import publish
+        publish([instance.sender_id, instance.receiver_id], {
+            'type': 'message', 'conversation_id': instance.conversation_id, 'id': instance.pk,
+        })
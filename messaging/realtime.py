@@ -0,0 +1,165 @@
+"""In-process pub/sub feeding the Server-Sent Events stream.
+
+Every open tab holds one ``event_stream`` connection subscribed to its user's
+channel (``user:<id>``). Views and signal receivers ``publish`` small events
+after commit (a new message, a read receipt, "counts changed"); the page then
+fetches the details through the existing delta endpoints.
+
+``REALTIME_BACKEND = 'local'`` delivers only to subscribers in this process,
+which is enough for a single worker and for tests. ``'redis'`` publishes via
+Redis pub/sub (``REALTIME_REDIS_URL``, default ``REDIS_URL``) and one listener
+thread per process fans messages out to the local subscribers, so an event
+raised on any worker reaches tabs connected to every worker.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """One stream's queue; events are pushed from any thread onto its event loop."""
+
+    def __init__(self, broker, channel, loop):
+        self.broker = broker
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def push(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Loop already closed; the stream is gone
+            self.close()
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A stalled client resynchronises through the delta endpoints anyway
+            pass
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+    def publish(self, channel, event):
+        self._deliver(channel, event)
+
+    def _deliver(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.push(event)
+
+
+class RedisBroker(LocalBroker):
+    prefix = 'pawpalace:events:'
+
+    def __init__(self, url):
+        super().__init__()
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._listener = None
+
+    def subscribe(self, channel):
+        self._ensure_listener()
+        return super().subscribe(channel)
+
+    def publish(self, channel, event):
+        try:
+            self._redis.publish(self.prefix + channel, json.dumps(event))
+        except Exception:
+            logger.exception('Could not publish realtime event to %s', channel)
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='pawpalace-realtime', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.prefix + '*')
+                for message in pubsub.listen():
+                    channel = message['channel']
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    self._deliver(channel[len(self.prefix):], json.loads(message['data']))
+            except Exception:
+                logger.exception('Realtime listener lost its Redis connection; retrying')
+                time.sleep(1)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                if getattr(settings, 'REALTIME_BACKEND', 'local') == 'redis':
+                    _broker = RedisBroker(settings.REALTIME_REDIS_URL)
+                else:
+                    _broker = LocalBroker()
+    return _broker
+
+
+def publish(user_ids, event):
+    """Send ``event`` to each user's streams once the current transaction commits."""
+    user_ids = [user_id for user_id in set(user_ids) if user_id]
+    if not user_ids:
+        return
+
+    def send():
+        broker = get_broker()
+        for user_id in user_ids:
+            broker.publish(user_channel(user_id), event)
+    transaction.on_commit(send)
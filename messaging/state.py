@@ -0,0 +1,108 @@
+"""Per-conversation state denormalised from ``Message``.
+
+``Conversation.last_message``/``last_message_at`` and each participant's
+``ConversationParticipant.unread_count`` (plus ``Conversation.read_version``,
+bumped by every read-marking) are kept current in the same
+transaction as the message insert or read-marking UPDATE that changes them, so
+the inbox and the unread-messages badge read a handful of conversation rows
+instead of scanning messages. ``manage.py rebuild_conversation_state``
+recomputes everything from ``Message`` should the two ever drift (e.g. after
+edits in the admin or raw SQL).
+"""
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from accounts import notifications
+from accounts.notifications import SubqueryCount
+from .models import Conversation, ConversationParticipant, Message
+from .realtime import publish
+
+
+def adjust_unread(conversation_id, user_id, delta):
+    if conversation_id and user_id and delta:
+        ConversationParticipant.objects.filter(conversation_id=conversation_id, user_id=user_id).update(
+            unread_count=Greatest(F('unread_count') + delta, 0)
+        )
+
+
+def record_message(message):
+    """Make a newly inserted message its conversation's latest and count it as unread."""
+    Conversation.objects.filter(
+        Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.sent_at),
+        pk=message.conversation_id,
+    ).update(last_message=message, last_message_at=message.sent_at, updated_at=timezone.now())
+    if not message.is_read:
+        adjust_unread(message.conversation_id, message.receiver_id, 1)
+
+
+def _latest_message(conversation_ref):
+    return Message.objects.filter(conversation=conversation_ref).order_by('-sent_at', '-id')
+
+
+def forget_message(message):
+    """Undo a deleted message's contribution; the latest one is looked up again if it was the last."""
+    if not message.is_read:
+        adjust_unread(message.conversation_id, message.receiver_id, -1)
+    # Deleting the last message already nulled the pointer (``on_delete=SET_NULL``)
+    latest = _latest_message(OuterRef('pk'))
+    Conversation.objects.filter(pk=message.conversation_id, last_message__isnull=True).update(
+        last_message=Subquery(latest.values('pk')[:1]),
+        last_message_at=Subquery(latest.values('sent_at')[:1]),
+    )
+
+
+def _mark(unread, conversation_id, user_id, now):
+    # The message UPDATE, the participant counter and the cached badge move together
+    with transaction.atomic():
+        marked = unread.update(is_read=True, read_at=now)
+        adjust_unread(conversation_id, user_id, -marked)
+        if marked and conversation_id:
+            Conversation.objects.filter(pk=conversation_id).update(read_version=F('read_version') + 1)
+        notifications.adjust(user_id, 'unread_messages', -marked)
+    if marked and conversation_id:
+        others = ConversationParticipant.objects.filter(conversation_id=conversation_id).exclude(user_id=user_id)
+        publish(others.values_list('user_id', flat=True), {'type': 'read', 'conversation_id': conversation_id})
+    return marked
+
+
+def mark_read(conversation, user, up_to_id=None, now=None):
+    """Mark ``user``'s unread messages in ``conversation`` read (optionally only ids <= ``up_to_id``).
+
+    One UPDATE on the messages plus one on the participant's counter; the
+    badge counter is adjusted and the other participant's open pages are told
+    to fetch the receipts. Returns how many messages were marked.
+    """
+    unread = Message.objects.filter(conversation=conversation, receiver=user, is_read=False)
+    if up_to_id is not None:
+        unread = unread.filter(pk__lte=up_to_id)
+    return _mark(unread, conversation.pk, user.pk, now or timezone.now())
+
+
+def mark_message_read(message):
+    """Mark one message read without rewriting the rest of its row."""
+    now = timezone.now()
+    unread = Message.objects.filter(pk=message.pk, is_read=False)
+    if _mark(unread, message.conversation_id, message.receiver_id, now):
+        message.is_read, message.read_at = True, now
+    else:
+        # Someone else got there first; report their receipt
+        message.refresh_from_db(fields=['is_read', 'read_at'])
+
+
+def rebuild_conversation_state():
+    """Recompute every conversation's last message and every participant's unread count."""
+    latest = _latest_message(OuterRef('pk'))
+    with transaction.atomic():
+        Conversation.objects.update(
+            last_message=Subquery(latest.values('pk')[:1]),
+            last_message_at=Subquery(latest.values('sent_at')[:1]),
+        )
+        ConversationParticipant.objects.update(unread_count=SubqueryCount(
+            Message.objects.filter(
+                conversation=OuterRef('conversation'), receiver=OuterRef('user'), is_read=False
+            ).order_by().values('pk')
+        ))
+    user_ids = ConversationParticipant.objects.values_list('user_id', flat=True).distinct()
+    notifications.forget(user_ids.iterator(), 'unread_messages')
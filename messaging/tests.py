@@ -1,3 +1,329 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import User
+from dogs.tests import TEST_MEDIA_ROOT, make_dog
+from .models import Conversation, Message
+from .realtime import LocalBroker
+from .state import mark_read, rebuild_conversation_state
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ConversationPollingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+        cls.buyer = User.objects.create_user(username='buyer', password='pw')
+        cls.dog = make_dog(cls.seller)
+        cls.conversation = Conversation.objects.create(dog=cls.dog)
+        cls.conversation.participants.add(cls.buyer, cls.seller)
+
+    def setUp(self):
+        cache.clear()
+
+    def send(self, sender, receiver, content='Hi'):
+        return Message.objects.create(sender=sender, receiver=receiver, content=content,
+                                      conversation=self.conversation, dog=self.dog)
+
+    def test_unchanged_conversation_returns_304(self):
+        self.send(self.buyer, self.seller)
+        url = reverse('messaging:get_messages', args=[self.conversation.pk])
+        self.client.force_login(self.seller)
+        first = self.client.get(url)
+        self.assertEqual(len(first.json()['messages']), 1)
+
+        # Session, user and membership (with its conversation); no message queries at all
+        with self.assertNumQueries(3):
+            repeat = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat.content, b'')
+
+        self.send(self.seller, self.buyer, 'Still available')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()['messages']), 2)
+
+    def test_read_receipt_changes_etag_for_sender(self):
+        self.send(self.buyer, self.seller)
+        url = reverse('messaging:get_messages', args=[self.conversation.pk])
+        self.client.force_login(self.buyer)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        mark_read(self.conversation, self.seller)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_reader_gets_a_stable_etag_after_marking(self):
+        self.send(self.buyer, self.seller)
+        url = reverse('messaging:get_messages', args=[self.conversation.pk])
+        self.client.force_login(self.seller)
+        first = self.client.get(url)
+        self.assertTrue(first.json()['messages'][0]['is_read'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+    def test_delta_fetch_returns_new_messages_and_receipts(self):
+        first = self.send(self.buyer, self.seller)
+        url = reverse('messaging:get_messages', args=[self.conversation.pk])
+        self.client.force_login(self.buyer)
+        since = timezone.now().isoformat()
+        data = self.client.get(url, {'since_id': first.pk, 'since': since}).json()
+        self.assertEqual((data['messages'], data['read_receipts'], data['last_id']), ([], [], first.pk))
+
+        reply = self.send(self.seller, self.buyer, 'Yes!')
+        Message.objects.filter(pk=first.pk).update(is_read=True, read_at=timezone.now())
+        data = self.client.get(url, {'since_id': first.pk, 'since': since}).json()
+        self.assertEqual([m['id'] for m in data['messages']], [reply.pk])
+        self.assertEqual([r['id'] for r in data['read_receipts']], [first.pk])
+
+    def test_poll_without_unread_messages_skips_the_update(self):
+        self.send(self.seller, self.buyer)
+        url = reverse('messaging:get_messages', args=[self.conversation.pk])
+        self.client.force_login(self.seller)
+        # Session, user, membership (with its conversation) and message fetch; no UPDATE
+        with self.assertNumQueries(4):
+            self.client.get(url, {'since_id': 0})
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ConversationStateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+        cls.buyer = User.objects.create_user(username='buyer', password='pw')
+        cls.dog = make_dog(cls.seller)
+        cls.conversation = Conversation.objects.create(dog=cls.dog)
+        cls.conversation.participants.add(cls.buyer, cls.seller)
+
+    def state(self):
+        self.conversation.refresh_from_db()
+        unread = dict(self.conversation.memberships.values_list('user_id', 'unread_count'))
+        return self.conversation.last_message_id, unread[self.buyer.pk], unread[self.seller.pk]
+
+    def send(self, sender, receiver, content='Hi'):
+        return Message.objects.create(sender=sender, receiver=receiver, content=content,
+                                      conversation=self.conversation)
+
+    def test_send_read_and_delete_keep_state_current(self):
+        first = self.send(self.buyer, self.seller)
+        second = self.send(self.buyer, self.seller)
+        reply = self.send(self.seller, self.buyer)
+        self.assertEqual(self.state(), (reply.pk, 1, 2))
+
+        self.assertEqual(mark_read(self.conversation, self.seller, up_to_id=first.pk), 1)
+        self.assertEqual(self.state(), (reply.pk, 1, 1))
+        second.mark_as_read()
+        reply.delete()
+        self.assertEqual(self.state(), (second.pk, 0, 0))
+        self.assertIsNotNone(Message.objects.get(pk=first.pk).read_at)
+
+    def test_bulk_read_receipt_marks_up_to_a_message(self):
+        cache.clear()
+        first, second, third = (self.send(self.buyer, self.seller, f'msg {n}') for n in range(3))
+        self.client.force_login(self.seller)
+        self.assertEqual(self.client.get(reverse('accounts:notifications_poll')).json()['unread_messages'], 3)
+        url = reverse('messaging:mark_conversation_read', args=[self.conversation.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'up_to': second.pk})
+        self.assertEqual(response.json()['marked'], 2)
+        self.assertEqual(self.state(), (third.pk, 0, 1))
+        self.assertEqual(
+            list(Message.objects.order_by('pk').values_list('read_at', flat=True)),
+            [parse_datetime(response.json()['read_at'])] * 2 + [None],
+        )
+        self.assertEqual(self.client.get(reverse('accounts:notifications_poll')).json()['unread_messages'], 1)
+        self.assertEqual(self.client.post(url, {'up_to': 'x'}).status_code, 400)
+
+    def test_mark_as_read_only_writes_the_receipt(self):
+        message = self.send(self.buyer, self.seller)
+        Message.objects.filter(pk=message.pk).update(content='Edited')
+        message.mark_as_read()
+        message.refresh_from_db()
+        self.assertEqual((message.content, message.is_read), ('Edited', True))
+        self.assertEqual(self.state(), (message.pk, 0, 0))
+
+    def test_rebuild_recomputes_drifted_state(self):
+        message = self.send(self.buyer, self.seller)
+        Conversation.objects.update(last_message=None)
+        self.conversation.memberships.update(unread_count=7)
+        rebuild_conversation_state()
+        self.assertEqual(self.state(), (message.pk, 0, 1))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ConversationKeyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+        cls.buyer = User.objects.create_user(username='buyer', password='pw')
+        cls.dog = make_dog(cls.seller)
+
+    def test_thread_is_shared_whoever_starts_it(self):
+        conversation, created = Conversation.get_or_create_between(self.buyer, self.seller, self.dog)
+        self.assertTrue(created)
+        self.assertEqual(set(conversation.participants.all()), {self.buyer, self.seller})
+        with self.assertNumQueries(1):
+            self.assertEqual(Conversation.get_or_create_between(self.seller, self.buyer, self.dog),
+                             (conversation, False))
+        direct, created = Conversation.get_or_create_between(self.buyer, self.seller)
+        self.assertTrue(created)
+        self.assertNotEqual(direct, conversation)
+
+    def test_losing_the_creation_race_reuses_the_winner(self):
+        winner, _ = Conversation.get_or_create_between(self.buyer, self.seller, self.dog)
+        # Both requests saw no thread; the second insert hits the unique constraint
+        with mock.patch('django.db.models.query.QuerySet.first', return_value=None):
+            self.assertEqual(Conversation.get_or_create_between(self.buyer, self.seller, self.dog),
+                             (winner, False))
+        self.assertEqual(Conversation.objects.count(), 1)
+
+    def test_send_message_reuses_the_thread(self):
+        self.client.force_login(self.buyer)
+        url = reverse('messaging:send_message', args=[self.dog.pk])
+        for content in ('Hi', 'Still there?'):
+            self.client.post(url, {'subject': 'Rex', 'content': content})
+        conversation = Conversation.objects.get()
+        self.assertEqual(conversation.messages.count(), 2)
+        self.assertEqual(conversation.last_message.content, 'Still there?')
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ConversationHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+        cls.buyer = User.objects.create_user(username='buyer', password='pw')
+        cls.dog = make_dog(cls.seller)
+        cls.conversation, _ = Conversation.get_or_create_between(cls.buyer, cls.seller, cls.dog)
+        cls.messages = [
+            Message.objects.create(sender=cls.buyer, receiver=cls.seller, content=f'msg {n}',
+                                   conversation=cls.conversation)
+            for n in range(5)
+        ]
+        # Two messages in the same instant must still page cleanly
+        Message.objects.filter(pk__in=[m.pk for m in cls.messages[1:3]]).update(sent_at=cls.messages[1].sent_at)
+
+    @mock.patch('messaging.history.PAGE_SIZE', 2)
+    def test_detail_renders_newest_page_and_cursor_walks_back(self):
+        self.client.force_login(self.seller)
+        response = self.client.get(reverse('messaging:conversation', args=[self.conversation.pk]))
+        self.assertEqual([m.content for m in response.context['thread_messages']], ['msg 3', 'msg 4'])
+        self.assertContains(response, 'Load earlier messages')
+
+        url = reverse('messaging:history', args=[self.conversation.pk])
+        seen, cursor = [], response.context['older_cursor']
+        while cursor:
+            data = self.client.get(url, {'before': cursor}).json()
+            seen = [m['content'] for m in data['messages']] + seen
+            cursor = data['older_cursor']
+        self.assertEqual(seen, ['msg 0', 'msg 1', 'msg 2'])
+        self.assertEqual(self.client.get(url, {'before': 'nope'}).status_code, 400)
+
+    def test_detail_queries_do_not_grow_with_the_page(self):
+        self.client.force_login(self.seller)
+        url = reverse('messaging:conversation', args=[self.conversation.pk])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get(url)
+        for n in range(10):
+            Message.objects.create(sender=self.seller, receiver=self.buyer, content=f'more {n}',
+                                   conversation=self.conversation)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+        self.assertEqual(len(few), len(many))
+        # Chat rows are not rendered as flash messages
+        self.assertNotContains(response, 'Message from buyer to seller')
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class InboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+        cls.dog = make_dog(cls.seller)
+        for i in range(5):
+            buyer = User.objects.create_user(username=f'buyer{i}', password='pw', first_name=f'B{i}')
+            conversation = Conversation.objects.create(dog=cls.dog)
+            conversation.participants.add(buyer, cls.seller)
+            for n in range(i + 1):
+                Message.objects.create(sender=buyer, receiver=cls.seller, content=f'msg {i}.{n}',
+                                       conversation=conversation, dog=cls.dog)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_inbox_queries_do_not_grow_with_conversations(self):
+        self.client.force_login(self.seller)
+        # Session, user, counters rebuild, count, page (with last messages), other users
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('messaging:inbox'))
+        rows = response.context['conversations_with_other']
+        self.assertEqual(len(rows), 5)
+        newest = rows[0]
+        self.assertEqual(newest['other_user'].username, 'buyer4')
+        self.assertEqual(newest['last_message'].content, 'msg 4.4')
+        self.assertEqual(newest['unread_count'], 5)
+        self.assertContains(response, '5 New Messages')
+
+    def test_inbox_is_paginated(self):
+        self.client.force_login(self.seller)
+        with mock.patch('messaging.inbox.PAGE_SIZE', 2):
+            response = self.client.get(reverse('messaging:inbox'), {'page': 3})
+        self.assertEqual(len(response.context['conversations_with_other']), 1)
+        self.assertEqual(response.context['page_obj'].paginator.count, 5)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, REALTIME_BACKEND='local')
+class EventStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='pw', role='seller')
+        cls.buyer = User.objects.create_user(username='buyer', password='pw')
+        cls.dog = make_dog(cls.seller)
+        cls.conversation = Conversation.objects.create(dog=cls.dog)
+        cls.conversation.participants.add(cls.buyer, cls.seller)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_local_broker_delivers_across_threads(self):
+        async def scenario():
+            broker = LocalBroker()
+            subscription = broker.subscribe('user:1')
+            await asyncio.get_running_loop().run_in_executor(None, broker.publish, 'user:1', {'type': 'x'})
+            event = await subscription.get(1)
+            subscription.close()
+            return event, broker.subscriber_count('user:1')
+        self.assertEqual(asyncio.run(scenario()), ({'type': 'x'}, 0))
+
+    async def test_stream_pushes_counts_and_new_messages(self):
+        await sync_to_async(self.client.force_login)(self.seller)
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get(reverse('messaging:stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = response.streaming_content.__aiter__()
+        self.assertEqual(await chunks.__anext__(), b'retry: 5000\n\n')
+        self.assertEqual(await chunks.__anext__(), b'event: hello\ndata: {"backend": "local"}\n\n')
+        self.assertIn(b'"unread_messages": 0', await chunks.__anext__())
+
+        def send():
+            with self.captureOnCommitCallbacks(execute=True):
+                return Message.objects.create(sender=self.buyer, receiver=self.seller, content='Hi',
+                                              conversation=self.conversation)
+        message = await sync_to_async(send)()
+        received = [await chunks.__anext__(), await chunks.__anext__()]
+        await chunks.aclose()
+        self.assertIn(b'event: counts', received[0])
+        self.assertIn(b'"unread_messages": 1', received[0])
+        self.assertIn(f'"id": {message.pk}'.encode(), received[1])
+
+    def test_wsgi_request_is_declined(self):
+        self.client.force_login(self.seller)
+        self.assertEqual(self.client.get(reverse('messaging:stream')).status_code, 204)
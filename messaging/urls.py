@@ -9,5 +9,8 @@ urlpatterns = [
     path('send/<int:dog_pk>/', views.send_message, name='send_message'),
     path('start/<int:user_pk>/', views.create_conversation, name='start_conversation'),
     path('message/<int:message_id>/read/', views.mark_message_read, name='mark_read'),
+    path('conversation/<int:conversation_id>/read/', views.mark_conversation_read, name='mark_conversation_read'),
     path('conversation/<int:conversation_id>/messages/', views.get_conversation_messages, name='get_messages'),
+    path('conversation/<int:conversation_id>/history/', views.conversation_history, name='history'),
+    path('stream/', views.event_stream, name='stream'),
 ]
@@ -1,33 +1,39 @@
+import asyncio
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from .models import Message, Conversation
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_POST
+from .models import Message, Conversation, ConversationParticipant
 from .forms import MessageForm
+from .history import history_page
+from .inbox import inbox_page
 from dogs.models import Dog
 from accounts.models import User
+from accounts import notifications
+from .realtime import get_broker, user_channel
+from .state import mark_read
 
 
 @login_required
 def inbox(request):
     """User's message inbox"""
-    conversations = Conversation.objects.filter(
-        participants=request.user
-    ).prefetch_related('participants').order_by('-updated_at')
-    
-    # Add other participant for each conversation
-    conversations_with_other = []
-    for conversation in conversations:
-        other_user = conversation.get_other_participant(request.user)
-        conversations_with_other.append({
-            'conversation': conversation,
-            'other_user': other_user
-        })
+    page_obj, conversations_with_other = inbox_page(request.user, request.GET.get('page'))
     
     return render(request, 'messaging/inbox.html', {
-        'conversations_with_other': conversations_with_other
+        'conversations_with_other': conversations_with_other,
+        'page_obj': page_obj,
     })
 
 
@@ -40,10 +46,8 @@ def conversation_detail(request, pk):
         participants=request.user
     )
     
-    messages_list = conversation.messages.select_related('sender', 'receiver').order_by('sent_at')
-    
     # Mark messages as read
-    messages_list.filter(receiver=request.user, is_read=False).update(is_read=True)
+    mark_read(conversation, request.user)
     
     if request.method == 'POST':
         form = MessageForm(request.POST)
@@ -53,20 +57,43 @@ def conversation_detail(request, pk):
             message.receiver = conversation.get_other_participant(request.user)
             message.dog = conversation.dog
             message.conversation = conversation
+            # Also moves the conversation's last message and timestamp
             message.save()
             
-            # Update conversation timestamp
-            conversation.save()
-            
             return redirect('messaging:conversation', pk=conversation.pk)
     else:
         form = MessageForm()
     
+    # Only the newest page; older ones are fetched from conversation_history
+    messages_list, older_cursor = history_page(conversation)
     return render(request, 'messaging/conversation.html', {
         'conversation': conversation,
-        'messages': messages_list,
+        # Not 'messages': that would shadow the flash messages in base.html
+        'thread_messages': messages_list,
+        'older_cursor': older_cursor,
         'form': form,
-        'other_user': conversation.get_other_participant(request.user)
+        'other_user': conversation.get_other_participant(request.user),
+        # Starting point for the page's delta polls
+        'poll_since_id': messages_list[-1].id if messages_list else 0,
+        'poll_since': timezone.now().isoformat(),
+    })
+
+
+@login_required
+def conversation_history(request, conversation_id):
+    """Older messages of a conversation: ``?before=<cursor>`` returns the page before that point"""
+    conversation = get_object_or_404(
+        Conversation,
+        pk=conversation_id,
+        participants=request.user
+    )
+    try:
+        messages_list, older_cursor = history_page(conversation, request.GET.get('before'))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    return JsonResponse({
+        'messages': [_message_data(message, request.user) for message in messages_list],
+        'older_cursor': older_cursor,
     })
 
 
@@ -82,12 +109,8 @@ def send_message(request, dog_pk):
     if request.method == 'POST':
         form = MessageForm(request.POST)
         if form.is_valid():
-            # Find an existing conversation scoped to this buyer, seller, and dog
-            conversation = Conversation.objects.filter(dog=dog)
-            conversation = conversation.filter(participants=request.user).filter(participants=dog.seller).first()
-            if not conversation:
-                conversation = Conversation.objects.create(dog=dog)
-                conversation.participants.add(request.user, dog.seller)
+            # Find or start the conversation scoped to this buyer, seller, and dog
+            conversation, _ = Conversation.get_or_create_between(request.user, dog.seller, dog)
             
             # Create message
             message = form.save(commit=False)
@@ -95,11 +118,9 @@ def send_message(request, dog_pk):
             message.receiver = dog.seller
             message.dog = dog
             message.conversation = conversation
+            # Also moves the conversation's last message and timestamp
             message.save()
             
-            # Update conversation timestamp
-            conversation.save()
-            
             messages.success(request, 'Message sent successfully!')
             return redirect('messaging:conversation', pk=conversation.pk)
     else:
@@ -124,7 +145,7 @@ def create_conversation(request, user_pk):
         return redirect('home')
     
     # Check if a direct conversation already exists between the two users (no dog context)
-    existing_conversation = Conversation.objects.filter(participants=request.user).filter(participants=other_user, dog__isnull=True).first()
+    existing_conversation = Conversation.between(request.user, other_user).first()
     
     if existing_conversation:
         return redirect('messaging:conversation', pk=existing_conversation.pk)
@@ -132,14 +153,14 @@ def create_conversation(request, user_pk):
     if request.method == 'POST':
         form = MessageForm(request.POST)
         if form.is_valid():
-            # Create conversation
-            conversation = Conversation.objects.create()
-            conversation.participants.add(request.user, other_user)
+            # Create conversation (or reuse one a concurrent request just created)
+            conversation, _ = Conversation.get_or_create_between(request.user, other_user)
             
             # Create message
             message = form.save(commit=False)
             message.sender = request.user
             message.receiver = other_user
+            message.conversation = conversation
             message.save()
             
             messages.success(request, 'Conversation started!')
@@ -162,33 +183,160 @@ def mark_message_read(request, message_id):
 
 
 @login_required
-def get_conversation_messages(request, conversation_id):
-    """Get messages for a conversation (for real-time updates)"""
+@require_POST
+def mark_conversation_read(request, conversation_id):
+    """Mark every message up to ``up_to`` (a message id) read in one UPDATE"""
     conversation = get_object_or_404(
         Conversation,
         pk=conversation_id,
         participants=request.user
     )
-    
-    messages_list = conversation.messages.select_related('sender', 'receiver').order_by('sent_at')
-    
-    # Mark messages as read when viewing
-    messages_list.filter(receiver=request.user, is_read=False).update(
-        is_read=True, 
-        read_at=timezone.now()
+    try:
+        up_to = int(request.POST.get('up_to', ''))
+    except ValueError:
+        return JsonResponse({'error': 'up_to must be a message id'}, status=400)
+    now = timezone.now()
+    marked = mark_read(conversation, request.user, up_to_id=up_to, now=now)
+    return JsonResponse({'status': 'success', 'marked': marked, 'read_at': now.isoformat()})
+
+
+RECEIPT_OVERLAP = timedelta(seconds=5)
+
+
+def _message_data(message, user):
+    return {
+        'id': message.id,
+        'content': message.content,
+        'subject': message.subject or '',
+        'sender': message.sender.username,
+        'sender_name': message.sender.first_name + ' ' + message.sender.last_name,
+        'sent_at': message.sent_at.isoformat(),
+        'is_read': message.is_read,
+        'read_at': message.read_at.isoformat() if message.read_at else None,
+        'is_sender': message.sender_id == user.pk
+    }
+
+
+def _messages_etag(membership, read_version):
+    conversation = membership.conversation
+    return quote_etag(
+        f'{conversation.pk}-{membership.user_id}-{conversation.last_message_id or 0}'
+        f'-{read_version}-{membership.unread_count}'
+    )
+
+
+@login_required
+def get_conversation_messages(request, conversation_id):
+    """Get messages for a conversation (for real-time updates)
+
+    ``?since_id=N`` returns only messages newer than N, and ``?since=<ISO time>``
+    adds read receipts for the caller's messages read since then, so polls
+    transfer deltas instead of the whole history.
+    """
+    membership = get_object_or_404(
+        ConversationParticipant.objects.select_related('conversation'),
+        conversation_id=conversation_id,
+        user=request.user,
     )
+    conversation = membership.conversation
+
+    # Version token from the denormalised thread state: a new message moves
+    # last_message, a read receipt bumps read_version
+    etag = _messages_etag(membership, conversation.read_version)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        return not_modified
+
+    now = timezone.now()
+    marked = 0
+    if membership.unread_count:
+        # Mark messages as read when viewing
+        marked = mark_read(conversation, request.user, now=now)
+
+    messages_list = conversation.messages.select_related('sender').order_by('sent_at', 'id')
+    try:
+        since_id = int(request.GET.get('since_id', ''))
+    except ValueError:
+        since_id = None
+    if since_id is not None:
+        messages_list = messages_list.filter(id__gt=since_id)
     
-    messages_data = []
-    for message in messages_list:
-        messages_data.append({
-            'id': message.id,
-            'content': message.content,
-            'sender': message.sender.username,
-            'sender_name': message.sender.first_name + ' ' + message.sender.last_name,
-            'sent_at': message.sent_at.isoformat(),
-            'is_read': message.is_read,
-            'read_at': message.read_at.isoformat() if message.read_at else None,
-            'is_sender': message.sender == request.user
-        })
+    messages_data = [_message_data(message, request.user) for message in messages_list]
+
+    data = {
+        'messages': messages_data,
+        'last_id': conversation.last_message_id or 0,
+        'server_time': now.isoformat(),
+    }
+    try:
+        since = parse_datetime(request.GET.get('since', ''))
+    except ValueError:
+        since = None
+    if since is not None:
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        # Overlap a little so a receipt committed just after the last poll is not missed
+        data['read_receipts'] = [
+            {'id': pk, 'read_at': read_at.isoformat()}
+            for pk, read_at in conversation.messages.filter(
+                sender=request.user, read_at__gte=since - RECEIPT_OVERLAP
+            ).values_list('id', 'read_at')
+        ]
     
-    return JsonResponse({'messages': messages_data})
\ No newline at end of file
+    response = JsonResponse(data)
+    # The body already shows the rows just marked read
+    if marked:
+        membership.unread_count = 0
+    response['ETag'] = _messages_etag(membership, conversation.read_version + (1 if marked else 0))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+KEEPALIVE_SECONDS = 15
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+async def _stream_events(user):
+    subscription = get_broker().subscribe(user_channel(user.pk))
+    loop = asyncio.get_running_loop()
+    # Connections are recycled so clients reconnect to healthy workers
+    deadline = loop.time() + getattr(settings, 'REALTIME_STREAM_MAX_AGE', 300)
+    try:
+        yield 'retry: 5000\n\n'
+        # With the 'local' backend, events raised on other workers never arrive
+        # here, so the page keeps polling alongside the stream
+        yield _sse('hello', {'backend': getattr(settings, 'REALTIME_BACKEND', 'local')})
+        counts = await sync_to_async(notifications.badge_payload)(user)
+        yield _sse('counts', counts)
+        while loop.time() < deadline:
+            event = await subscription.get(min(KEEPALIVE_SECONDS, max(deadline - loop.time(), 0)))
+            if event is None:
+                yield ': keepalive\n\n'
+            elif event['type'] == 'counts':
+                latest = await sync_to_async(notifications.badge_payload)(user)
+                if latest != counts:
+                    counts = latest
+                    yield _sse('counts', counts)
+            else:
+                yield _sse(event['type'], event)
+    finally:
+        subscription.close()
+
+
+async def event_stream(request):
+    """Server-Sent Events for the current user: new messages, read receipts and badge counts"""
+    user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+    if user is None:
+        return HttpResponse(status=401)
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker cannot hold the stream open; 204 tells EventSource to stop
+        # and the pages keep polling instead
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(_stream_events(user), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
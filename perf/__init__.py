@@ -0,0 +1 @@
+"""Performance tooling that spans the apps: query budgets, request instrumentation and load tests."""
@@ -0,0 +1,124 @@
+"""Query-count budgets for every named URL, as each kind of visitor.
+
+``measure_urls`` requests every named route in ``URLCONFS`` as an anonymous
+visitor, a buyer and a seller, and records the status, query count, SQL time,
+template render time and wall time of each response. Query counts are
+compared with the checked-in ``query_budgets.json``; times are reported for
+trend comparison only, since they are too noisy to gate on.
+
+Each URL is requested twice inside a rolled-back transaction: a warm-up (so
+per-process caches such as the homepage snapshot and notification counters
+are populated as they would be in production) and the measured request.
+"""
+import json
+import os
+import time
+from importlib import import_module
+
+from django.db import transaction
+from django.test import Client
+from django.urls import URLPattern, reverse
+
+from .instrument import recording
+
+URLCONFS = ('dogs.urls', 'accessories.urls', 'accounts.urls', 'messaging.urls')
+ROLES = ('anon', 'buyer', 'seller')
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), 'query_budgets.json')
+
+# Routes that would end the session being measured
+SKIP = {'accounts:logout'}
+
+# URL kwarg -> dataset object, per app (``pk`` means something different in each)
+KWARGS = {
+    'dogs': {'pk': lambda d: d.dogs[1].pk, 'order_id': lambda d: d.orders[0].pk},
+    'accessories': {'pk': lambda d: d.accessories[0].pk},
+    'accounts': {'pk': lambda d: d.seller.pk, 'uidb64': lambda d: 'MQ', 'token': lambda d: 'set-password'},
+    'messaging': {
+        'pk': lambda d: d.conversation.pk,
+        'conversation_id': lambda d: d.conversation.pk,
+        'message_id': lambda d: d.message.pk,
+        'dog_pk': lambda d: d.dogs[1].pk,
+        'user_pk': lambda d: d.seller.pk,
+    },
+}
+
+
+def named_urls():
+    """``(app_name, url_name, kwarg names)`` for every named route in ``URLCONFS``."""
+    for module_name in URLCONFS:
+        module = import_module(module_name)
+        for pattern in module.urlpatterns:
+            if isinstance(pattern, URLPattern) and pattern.name:
+                yield module.app_name, pattern.name, list(pattern.pattern.converters)
+
+
+def _request(client, path):
+    with transaction.atomic():
+        response = client.get(path)
+        if hasattr(response, 'streaming_content'):
+            b''.join(response.streaming_content)
+        transaction.set_rollback(True)
+    return response
+
+
+def measure_urls(dataset):
+    """One result dict per (role, URL), in a stable order."""
+    users = {'anon': None, 'buyer': dataset.buyer, 'seller': dataset.seller}
+    results = []
+    for role in ROLES:
+        client = Client()
+        if users[role] is not None:
+            client.force_login(users[role])
+        for app_name, url_name, kwarg_names in named_urls():
+            name = f'{app_name}:{url_name}'
+            if name in SKIP:
+                continue
+            path = reverse(name, kwargs={kwarg: KWARGS[app_name][kwarg](dataset) for kwarg in kwarg_names})
+            _request(client, path)
+            start = time.perf_counter()
+            with recording() as recorder:
+                response = _request(client, path)
+            results.append({
+                'key': f'{role} {name}',
+                'role': role,
+                'url': name,
+                'path': path,
+                'status': response.status_code,
+                'queries': recorder.queries,
+                'sql_ms': round(recorder.sql_time * 1000, 2),
+                'render_ms': round(recorder.render_time * 1000, 2),
+                'wall_ms': round((time.perf_counter() - start) * 1000, 2),
+            })
+    return results
+
+
+def load_budgets(path=BUDGETS_PATH):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return {}
+
+
+def save_budgets(results, path=BUDGETS_PATH):
+    """Write the measured query counts as the new budgets."""
+    budgets = {result['key']: result['queries'] for result in results}
+    with open(path, 'w') as handle:
+        json.dump(budgets, handle, indent=2, sort_keys=True)
+        handle.write('\n')
+
+
+def over_budget(results, budgets):
+    """Results with no budget or more queries than their budget, annotated with the budget."""
+    failures = []
+    for result in results:
+        result['budget'] = budgets.get(result['key'])
+        if result['budget'] is None or result['queries'] > result['budget']:
+            failures.append(result)
+    return failures
+
+
+def write_report(results, path):
+    with open(path, 'w') as handle:
+        json.dump({'results': results}, handle, indent=2)
+        handle.write('\n')
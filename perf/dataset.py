@@ -0,0 +1,86 @@
+"""A small but realistic dataset for query-budget runs.
+
+Every list the pages render has several rows with related rows of their own
+(favorites on each dog, several conversations with several messages, orders
+in each state), so a per-row query shows up as a count that grows with
+``scale`` rather than hiding behind a single row. At the default scale the
+listings fill less than a page (12), so a larger scale changes what the
+list pages render as well.
+"""
+from types import SimpleNamespace
+
+from accessories.models import Accessory, AccessoryFavorite, AccessoryOrder, AccessoryOrderItem
+from accounts.models import SellerReview, User
+from dogs.models import Dog, Favorite, Order, SavedSearch
+from messaging.models import Conversation, Message
+
+BREEDS = ('Labrador Retriever', 'Beagle', 'German Shepherd', 'Poodle')
+
+
+def _seller(username, **fields):
+    seller = User.objects.filter(username=username).first()
+    if seller is None:
+        seller = User.objects.create_user(username=username, password='pw', role='seller', **fields)
+    return seller
+
+
+def build_listings(scale=3, dogs=True, accessories=True):
+    """Create ``3 * scale`` dogs and/or accessories, reusing the perf sellers if they exist."""
+    seller = _seller('perf-seller', first_name='Sam', email='seller@example.com')
+    other_seller = _seller('perf-seller-2')
+    dog_rows = [
+        Dog.objects.create(
+            name=f'Dog {i}', breed=BREEDS[i % len(BREEDS)], age=6 + i, gender='male' if i % 2 else 'female',
+            price=f'{500 + 50 * i}.00', description='Friendly.', location='Chicago',
+            seller=seller if i % 4 else other_seller, image='dogs/test.jpg', is_featured=(i == 0),
+        )
+        for i in range(3 * scale if dogs else 0)
+    ]
+    accessory_rows = [
+        Accessory.objects.create(name=f'Toy {i}', description='Squeaky.', price=f'{5 + i}.00',
+                                 seller=seller, brand='Acme')
+        for i in range(3 * scale if accessories else 0)
+    ]
+    return seller, dog_rows, accessory_rows
+
+
+def build_dataset(scale=3):
+    """Create ``scale`` of most things per user (and ``3 * scale`` dogs and accessories)."""
+    seller, dogs, accessories = build_listings(scale)
+    buyer = User.objects.create_user(username='perf-buyer', password='pw', first_name='Bea',
+                                     email='buyer@example.com')
+    buyers = [buyer] + [
+        User.objects.create_user(username=f'perf-buyer-{i}', password='pw') for i in range(scale)
+    ]
+
+    for user in buyers:
+        for dog in dogs[:scale]:
+            Favorite.objects.create(user=user, dog=dog)
+        for accessory in accessories[:scale]:
+            AccessoryFavorite.objects.create(user=user, accessory=accessory)
+
+    orders = []
+    for i, status in enumerate(('pending', 'confirmed', 'completed')):
+        orders.append(Order.objects.create(buyer=buyer, dog=dogs[i + 1], status=status, buyer_name='Bea',
+                                           buyer_email='buyer@example.com', buyer_phone='555'))
+    accessory_order = AccessoryOrder.objects.create(user=buyer, status='paid', total_amount='5.00')
+    AccessoryOrderItem.objects.create(order=accessory_order, accessory=accessories[0], seller=seller,
+                                      quantity=1, unit_price='5.00', line_total='5.00')
+    SellerReview.objects.create(reviewer=buyer, seller=seller, rating=5, comment='Great')
+    SavedSearch.objects.create(user=buyer, name='Beagles', params={'breed': 'Beagle'})
+
+    conversations = []
+    for i, user in enumerate(buyers):
+        conversation, _ = Conversation.get_or_create_between(user, seller, dogs[i + 1])
+        for n in range(scale):
+            Message.objects.create(sender=user, receiver=seller, content=f'Question {n}',
+                                   dog=conversation.dog, conversation=conversation)
+            Message.objects.create(sender=seller, receiver=user, content=f'Answer {n}',
+                                   dog=conversation.dog, conversation=conversation)
+        conversations.append(conversation)
+
+    return SimpleNamespace(
+        seller=seller, buyer=buyer, buyers=buyers, dogs=dogs, accessories=accessories,
+        orders=orders, conversation=conversations[0], conversations=conversations,
+        message=conversations[0].messages.filter(receiver=buyer).first(),
+    )
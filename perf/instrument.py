@@ -0,0 +1,153 @@
+"""Per-request measurements: SQL queries and time, cache hits and misses, and template render time.
+
+``recording()`` installs a database execute wrapper on every connection of
+the current thread and marks the ``Recorder`` as current for template and
+cache timing, so anything run inside it is measured without ``DEBUG``.
+Template time covers the outermost render only (includes are part of it),
+and includes any SQL run lazily while rendering. Cache lookups are counted
+per ``get``/``get_many`` key on every configured cache.
+"""
+import contextlib
+import contextvars
+import re
+import time
+
+from django.db import connections
+
+_current = contextvars.ContextVar('perf_recorder', default=None)
+_MISSING = object()
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\bIN \((?:\?, )*\?\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """``sql`` with literals and parameters replaced by ``?`` and ``IN`` lists collapsed, for grouping."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class Recorder:
+    """Counters for one block of work; queries slower than ``slow_query_time`` (seconds) are kept."""
+
+    def __init__(self, slow_query_time=None):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_time = 0.0
+        self.slow_query_time = slow_query_time
+        self.slow_queries = []
+        self._render_depth = 0
+        self._cache_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_finished(sql, time.perf_counter() - start)
+
+    def query_finished(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        if self.slow_query_time is not None and duration >= self.slow_query_time:
+            self.slow_queries.append((normalize_sql(sql), duration))
+
+    @contextlib.contextmanager
+    def cache_lookup(self):
+        # get_many() on some backends calls get() per key; only the outer call counts
+        self._cache_depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._cache_depth -= 1
+            if not self._cache_depth:
+                self.cache_time += time.perf_counter() - start
+
+
+def install_template_timer():
+    """Wrap Django template rendering once per process; only active inside ``recording()``."""
+    from django.template.backends.django import Template
+    if getattr(Template.render, 'timed', False):
+        return
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        recorder = _current.get()
+        if recorder is None:
+            return original(self, context, request)
+        recorder._render_depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            recorder._render_depth -= 1
+            if not recorder._render_depth:
+                recorder.render_time += time.perf_counter() - start
+
+    render.timed = True
+    Template.render = render
+
+
+def _time_cache_class(cls):
+    if getattr(cls.get, 'timed', False):
+        return
+    original_get, original_get_many = cls.get, cls.get_many
+
+    def get(self, key, default=None, version=None):
+        recorder = _current.get()
+        if recorder is None or recorder._cache_depth:
+            return original_get(self, key, default, version)
+        with recorder.cache_lookup():
+            value = original_get(self, key, _MISSING, version)
+        if value is _MISSING:
+            recorder.cache_misses += 1
+            return default
+        recorder.cache_hits += 1
+        return value
+
+    def get_many(self, keys, version=None):
+        recorder = _current.get()
+        if recorder is None or recorder._cache_depth:
+            return original_get_many(self, keys, version)
+        keys = list(keys)
+        with recorder.cache_lookup():
+            found = original_get_many(self, keys, version)
+        recorder.cache_hits += len(found)
+        recorder.cache_misses += len(keys) - len(found)
+        return found
+
+    get.timed = get_many.timed = True
+    cls.get, cls.get_many = get, get_many
+
+
+def install_cache_counter():
+    """Wrap ``get``/``get_many`` of every configured cache backend once per process."""
+    from django.core.cache import caches
+    for cache in caches.all(initialized_only=False):
+        _time_cache_class(type(cache))
+
+
+@contextlib.contextmanager
+def recording(recorder=None):
+    """Measure everything run inside the block; yields the ``Recorder``."""
+    recorder = recorder or Recorder()
+    install_template_timer()
+    install_cache_counter()
+    token = _current.set(recorder)
+    try:
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            yield recorder
+    finally:
+        _current.reset(token)
@@ -0,0 +1,23 @@
+"""Load tests for the marketplace's busiest journeys, run against a live server.
+
+Start the site against the database to test, with Stripe pointed at the stub
+this package starts (any secret key will do)::
+
+    STRIPE_SECRET_KEY=sk_test_stub STRIPE_API_BASE=http://127.0.0.1:12111 \
+        python manage.py runserver --noreload
+    # or: uvicorn dog_marketplace.dog_marketplace.asgi:application --port 8000
+
+then, from the repository root with the same database settings::
+
+    python -m perf.loadtest --users 8 --duration 60 --json before.json
+
+The buyer accounts are created with a fixed password, so the runner refuses
+to start against settings with ``DEBUG`` off unless ``--allow-production``
+is passed.
+
+Each virtual user logs in as its own ``loadtest-buyer-<n>`` account and runs
+weighted journeys (``journeys.JOURNEYS``) until the time is up; ``--iterations``
+instead runs every journey that many times per user, in a seeded order.
+The report gives p50/p95/p99 latency and throughput per endpoint; compare
+the JSON of two runs to measure a change before deploying it.
+"""
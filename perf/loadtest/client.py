@@ -0,0 +1,55 @@
+"""One virtual user's HTTP session, timing every request under an endpoint label."""
+import time
+
+import requests
+from django.urls import reverse
+
+
+class LoginFailed(Exception):
+    pass
+
+
+class Client:
+    def __init__(self, base_url, stats, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def request(self, method, endpoint, path, expect=(200,), location=None, **kwargs):
+        """Time one request; redirects are not followed, so each is measured on its own.
+
+        The response counts as an error unless its status is in ``expect``
+        (and, for a redirect, its ``Location`` starts with ``location``).
+        Returns ``None`` if the request did not complete.
+        """
+        headers = kwargs.pop('headers', {})
+        if method == 'POST':
+            headers['X-CSRFToken'] = self.session.cookies.get('csrftoken', '')
+            headers['Referer'] = self.base_url + path
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, headers=headers,
+                                            allow_redirects=False, timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            self.stats.record(endpoint, time.perf_counter() - start, None, False)
+            return None
+        ok = response.status_code in expect
+        if ok and location is not None:
+            ok = response.headers.get('Location', '').startswith(location)
+        self.stats.record(endpoint, time.perf_counter() - start, response.status_code, ok)
+        return response
+
+    def get(self, endpoint, path, **kwargs):
+        return self.request('GET', endpoint, path, **kwargs)
+
+    def post(self, endpoint, path, **kwargs):
+        return self.request('POST', endpoint, path, **kwargs)
+
+    def login(self, username, password):
+        path = reverse('accounts:login')
+        self.get('accounts:login', path)
+        response = self.post('accounts:login', path, data={'username': username, 'password': password},
+                             expect=(302,))
+        if response is None or response.status_code != 302:
+            raise LoginFailed(username)
@@ -0,0 +1,71 @@
+"""The scripted journeys; each takes a logged-in ``Client``, the ``Catalog`` and a seeded ``Random``."""
+from django.urls import reverse
+
+# Query strings a shopper would build from the list page's filter form
+DOG_FILTERS = (
+    {},
+    {'breed': 'Labrador'},
+    {'gender': 'female', 'sort': 'price'},
+    {'min_price': '500', 'max_price': '1500'},
+    {'search': 'friendly', 'sort': '-price'},
+    {'vaccinated': 'on', 'min_age': '3', 'max_age': '24'},
+)
+AJAX = {'X-Requested-With': 'XMLHttpRequest'}
+
+
+def browse(client, catalog, rng):
+    client.get('dogs:list', reverse('dogs:list'), params=rng.choice(DOG_FILTERS))
+    client.get('accessories:list', reverse('accessories:list'))
+
+
+def detail(client, catalog, rng):
+    client.get('dogs:detail', reverse('dogs:detail', args=[rng.choice(catalog.dog_ids)]))
+    client.get('accessories:detail', reverse('accessories:detail', args=[rng.choice(catalog.accessory_ids)]))
+
+
+def favorite(client, catalog, rng):
+    # Twice each, so the user's favorites end where they started
+    dog = reverse('dogs:toggle_favorite', args=[rng.choice(catalog.dog_ids)])
+    accessory = reverse('accessories:toggle_favorite', args=[rng.choice(catalog.accessory_ids)])
+    for _ in range(2):
+        client.post('dogs:toggle_favorite', dog, headers=dict(AJAX))
+        client.post('accessories:toggle_favorite', accessory, headers=dict(AJAX))
+
+
+def cart(client, catalog, rng):
+    client.post('dogs:add_to_cart', reverse('dogs:add_to_cart', args=[rng.choice(catalog.dog_ids)]),
+                expect=(302,))
+    client.post('accessories:add_to_cart',
+                reverse('accessories:add_to_cart', args=[rng.choice(catalog.accessory_ids)]), expect=(302,))
+    client.get('accessories:cart', reverse('accessories:cart'))
+
+
+def checkout(client, catalog, rng):
+    """Up to the hand-off to Stripe: the payment redirect must point at ``catalog.stripe_url``."""
+    client.post('accessories:add_to_cart',
+                reverse('accessories:add_to_cart', args=[rng.choice(catalog.accessory_ids)]), expect=(302,))
+    client.get('accessories:checkout', reverse('accessories:checkout'))
+    client.post('accessories:checkout_pay', reverse('accessories:checkout_pay'), expect=(302,),
+                location=catalog.stripe_url)
+    # Stripe would send the shopper back here, which empties the cart
+    client.get('accessories:checkout_success', reverse('accessories:checkout_success'))
+
+
+def message(client, catalog, rng):
+    dog_pk = rng.choice(catalog.dog_ids)
+    response = client.post('messaging:send_message', reverse('messaging:send_message', args=[dog_pk]),
+                           data={'subject': 'Load test', 'content': f'Is dog {dog_pk} still available?'},
+                           expect=(302,))
+    if response is not None and response.status_code == 302:
+        client.get('messaging:conversation', response.headers['Location'])
+
+
+# name -> (journey, weight when picking journeys at random)
+JOURNEYS = {
+    'browse': (browse, 4),
+    'detail': (detail, 4),
+    'favorite': (favorite, 2),
+    'cart': (cart, 2),
+    'checkout': (checkout, 1),
+    'message': (message, 1),
+}
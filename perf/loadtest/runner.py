@@ -0,0 +1,127 @@
+"""Set up the accounts and catalog, run the virtual users and report."""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+from .client import Client, LoginFailed
+from .journeys import JOURNEYS
+from .stats import Stats, format_report
+from .stripe_stub import start_stripe_stub
+
+PASSWORD = 'loadtest-pw'
+CATALOG_SIZE = 200
+
+
+def prepare(users, stripe_url=None):
+    """Create any missing ``loadtest-buyer-<n>`` accounts and return the ``Catalog`` to shop from.
+
+    The listings already in the database are used; when dogs or accessories
+    have none, the query-budget listings are added for that table alone so
+    there is something to browse.
+    """
+    from accessories.models import Accessory
+    from accounts.models import User
+    from dogs.models import Dog
+    from perf.dataset import build_listings
+
+    dogs = Dog.objects.filter(status='available').exclude(seller__username__startswith='loadtest-')
+    accessories = Accessory.objects.filter(is_available=True, is_approved=True)
+    missing_dogs, missing_accessories = not dogs.exists(), not accessories.exists()
+    if missing_dogs or missing_accessories:
+        build_listings(dogs=missing_dogs, accessories=missing_accessories)
+    usernames = [f'loadtest-buyer-{i}' for i in range(users)]
+    existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    for username in usernames:
+        if username not in existing:
+            User.objects.create_user(username=username, password=PASSWORD)
+    return SimpleNamespace(
+        usernames=usernames,
+        dog_ids=list(dogs.order_by('pk').values_list('pk', flat=True)[:CATALOG_SIZE]),
+        accessory_ids=list(accessories.order_by('pk').values_list('pk', flat=True)[:CATALOG_SIZE]),
+        stripe_url=stripe_url,
+    )
+
+
+def _virtual_user(index, base_url, catalog, stats, names, deadline, iterations, seed):
+    rng = random.Random(seed + index)
+    client = Client(base_url, stats)
+    try:
+        client.login(catalog.usernames[index], PASSWORD)
+    except LoginFailed as exc:
+        # The rejected POST is already an accounts:login error in ``stats``,
+        # so the run fails; say why this user stopped
+        print(f'Virtual user {index}: login as {exc} failed', file=sys.stderr)
+        return
+    if iterations is not None:
+        # Every journey ``iterations`` times, in a seeded order
+        for name in rng.sample(names * iterations, len(names) * iterations):
+            JOURNEYS[name][0](client, catalog, rng)
+        return
+    weights = [JOURNEYS[name][1] for name in names]
+    while time.monotonic() < deadline:
+        JOURNEYS[rng.choices(names, weights)[0]][0](client, catalog, rng)
+
+
+def run(base_url, catalog, users=4, duration=30.0, iterations=None, journeys=None, seed=0):
+    """Run ``users`` concurrent virtual users; returns ``(report rows, elapsed seconds)``."""
+    names = list(journeys or JOURNEYS)
+    stats = Stats()
+    start = time.monotonic()
+    threads = [
+        threading.Thread(target=_virtual_user, name=f'loadtest-user-{i}',
+                         args=(i, base_url, catalog, stats, names, start + duration, iterations, seed))
+        for i in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    return stats.summary(elapsed), elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m perf.loadtest', description=__doc__)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--users', type=int, default=4, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run for')
+    parser.add_argument('--iterations', type=int, help='Run each journey this many times per user instead')
+    parser.add_argument('--journeys', help=f"Comma-separated subset of: {', '.join(JOURNEYS)}")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stripe-port', type=int, default=12111,
+                        help='Port for the Stripe stub (the server needs STRIPE_API_BASE pointing at it)')
+    parser.add_argument('--json', help='Also write the report rows to this file')
+    parser.add_argument('--allow-production', action='store_true',
+                        help='Run even when DEBUG is off (creates accounts with a known password)')
+    options = parser.parse_args(argv)
+    journeys = options.journeys.split(',') if options.journeys else None
+    unknown = set(journeys or ()) - set(JOURNEYS)
+    if unknown:
+        parser.error(f"Unknown journeys: {', '.join(sorted(unknown))}")
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dog_marketplace.dog_marketplace.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    if not settings.DEBUG and not options.allow_production:
+        parser.error(f'DEBUG is off: this would create loadtest-buyer-<n> accounts with the password '
+                     f'{PASSWORD!r}. Point the settings at a test database, or pass --allow-production.')
+
+    stub = start_stripe_stub(port=options.stripe_port)
+    try:
+        catalog = prepare(options.users, stripe_url=stub.url)
+        rows, elapsed = run(options.base_url, catalog, users=options.users, duration=options.duration,
+                            iterations=options.iterations, journeys=journeys, seed=options.seed)
+    finally:
+        stub.shutdown()
+    print(format_report(rows, elapsed))
+    if options.json:
+        with open(options.json, 'w') as f:
+            json.dump({'elapsed': round(elapsed, 2), 'users': options.users, 'endpoints': rows}, f, indent=2)
+    return 1 if any(row['errors'] for row in rows) else 0
+
@@ -0,0 +1,60 @@
+"""Latency samples per endpoint and the report built from them."""
+import math
+import threading
+from collections import Counter, defaultdict
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of already sorted ``samples``."""
+    if not samples:
+        return None
+    return samples[max(1, math.ceil(pct / 100 * len(samples))) - 1]
+
+
+class Stats:
+    """Thread-safe collector shared by every virtual user."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(list)
+        self._statuses = defaultdict(Counter)
+        self._errors = Counter()
+
+    def record(self, endpoint, seconds, status, ok):
+        with self._lock:
+            self._samples[endpoint].append(seconds)
+            self._statuses[endpoint][status or 'failed'] += 1
+            if not ok:
+                self._errors[endpoint] += 1
+
+    def summary(self, elapsed):
+        """One row per endpoint, slowest p95 first; times in milliseconds."""
+        rows = []
+        with self._lock:
+            for endpoint, samples in self._samples.items():
+                samples = sorted(samples)
+                rows.append({
+                    'endpoint': endpoint,
+                    'requests': len(samples),
+                    'errors': self._errors[endpoint],
+                    'statuses': {str(status): n for status, n in self._statuses[endpoint].items()},
+                    'p50_ms': round(percentile(samples, 50) * 1000, 1),
+                    'p95_ms': round(percentile(samples, 95) * 1000, 1),
+                    'p99_ms': round(percentile(samples, 99) * 1000, 1),
+                    'max_ms': round(samples[-1] * 1000, 1),
+                    'rps': round(len(samples) / elapsed, 2) if elapsed else None,
+                })
+        return sorted(rows, key=lambda row: -row['p95_ms'])
+
+
+def format_report(rows, elapsed):
+    header = f"{'endpoint':<36} {'reqs':>6} {'errs':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'req/s':>7}"
+    lines = [header, '-' * len(header)]
+    for row in rows:
+        lines.append(
+            f"{row['endpoint']:<36} {row['requests']:>6} {row['errors']:>5} {row['p50_ms']:>8} "
+            f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8} {row['rps']:>7}"
+        )
+    total = sum(row['requests'] for row in rows)
+    lines.append(f'{total} requests in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f} req/s); times in ms')
+    return '\n'.join(lines)
@@ -0,0 +1,39 @@
+"""A local stand-in for the one Stripe call checkout makes (creating a Checkout Session)."""
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.path.rstrip('/') != '/v1/checkout/sessions':
+            return self._reply(404, {'error': {'type': 'invalid_request_error', 'message': 'Not stubbed'}})
+        session_id = f'cs_test_{uuid.uuid4().hex}'
+        self._reply(200, {
+            'id': session_id,
+            'object': 'checkout.session',
+            'payment_status': 'unpaid',
+            'url': f'{self.server.url}/pay/{session_id}',
+        })
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Request-Id', f'req_{uuid.uuid4().hex[:14]}')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stripe_stub(host='127.0.0.1', port=0):
+    """Serve the stub on a background thread; the server's ``url`` goes in ``STRIPE_API_BASE``."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.url = f'http://{host}:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, name='stripe-stub', daemon=True).start()
+    return server
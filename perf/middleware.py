@@ -0,0 +1,77 @@
+"""Opt-in per-request timing: ``Server-Timing`` headers and one JSON log line per request.
+
+Enabled with ``PERF_INSTRUMENTATION=1``, which puts ``PerformanceMiddleware``
+first in ``MIDDLEWARE``. ``PERF_SAMPLE_RATE`` (0-1) picks the share of
+requests that are measured; the rest pass straight through, so a low rate
+can stay on in production. A measured request is logged on the
+``perf.requests`` logger with its wall time, SQL query count and time,
+cache hits and misses and template render time, plus the normalised SQL of
+any query slower than ``PERF_SLOW_QUERY_MS``; ``PERF_SERVER_TIMING`` also
+sends the timings to the browser's network panel.
+
+Only work done on the request's own thread is seen: for streamed responses
+(the event stream) wall time ends when the response starts.
+"""
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+
+from .instrument import Recorder, recording
+
+logger = logging.getLogger('perf.requests')
+
+# Slow queries listed per log line; the count is always complete
+SLOW_QUERY_LIMIT = 10
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= getattr(settings, 'PERF_SAMPLE_RATE', 1.0):
+            return self.get_response(request)
+        slow_ms = getattr(settings, 'PERF_SLOW_QUERY_MS', 100)
+        start = time.perf_counter()
+        with recording(Recorder(slow_query_time=slow_ms / 1000)) as recorder:
+            response = self.get_response(request)
+        wall_time = time.perf_counter() - start
+        if getattr(settings, 'PERF_SERVER_TIMING', True):
+            response['Server-Timing'] = self.server_timing(recorder, wall_time)
+        logger.info(json.dumps(self.record(request, response, recorder, wall_time)))
+        return response
+
+    def server_timing(self, recorder, wall_time):
+        return ', '.join([
+            f'total;dur={_ms(wall_time)}',
+            f'db;dur={_ms(recorder.sql_time)};desc="{recorder.queries} queries"',
+            f'cache;dur={_ms(recorder.cache_time)};desc="{recorder.cache_hits} hits, {recorder.cache_misses} misses"',
+            f'tpl;dur={_ms(recorder.render_time)}',
+        ])
+
+    def record(self, request, response, recorder, wall_time):
+        match = request.resolver_match
+        return {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'wall_ms': _ms(wall_time),
+            'db_queries': recorder.queries,
+            'db_ms': _ms(recorder.sql_time),
+            'cache_hits': recorder.cache_hits,
+            'cache_misses': recorder.cache_misses,
+            'cache_ms': _ms(recorder.cache_time),
+            'render_ms': _ms(recorder.render_time),
+            'slow_query_count': len(recorder.slow_queries),
+            'slow_queries': [
+                {'sql': sql, 'ms': _ms(duration)} for sql, duration in recorder.slow_queries[:SLOW_QUERY_LIMIT]
+            ],
+        }
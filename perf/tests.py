@@ -0,0 +1,171 @@
+import io
+import json
+import os
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+import stripe
+from django.test import LiveServerTestCase, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accessories.models import Accessory
+from accounts.models import User
+from dogs.models import Dog
+from dogs.tests import TEST_MEDIA_ROOT, make_dog
+from .budgets import load_budgets, measure_urls, over_budget, save_budgets, write_report
+from .dataset import build_dataset
+from .instrument import normalize_sql
+from .loadtest.runner import main, prepare, run
+from .loadtest.stripe_stub import start_stripe_stub
+
+INSTRUMENTED = ['perf.middleware.PerformanceMiddleware', *settings.MIDDLEWARE]
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=True, STRIPE_SECRET_KEY='')
+class QueryBudgetTests(TestCase):
+    """Fails when any view runs more queries than ``perf/query_budgets.json`` allows.
+
+    ``QUERY_BUDGETS_UPDATE=1`` rewrites the budgets from this run (review the
+    diff before committing it); ``QUERY_BUDGETS_REPORT=<path>`` also writes
+    every measurement, with timings, as JSON.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = build_dataset()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_views_stay_within_query_budgets(self):
+        results = measure_urls(self.dataset)
+        if os.environ.get('QUERY_BUDGETS_UPDATE'):
+            save_budgets(results)
+        failures = over_budget(results, load_budgets())
+        if os.environ.get('QUERY_BUDGETS_REPORT'):
+            write_report(results, os.environ['QUERY_BUDGETS_REPORT'])
+        self.assertEqual(
+            [], [f"{r['key']}: {r['queries']} queries (budget {r['budget']})" for r in failures],
+            'Views over their query budget; fix the regression or update perf/query_budgets.json',
+        )
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=True, STRIPE_SECRET_KEY='')
+class QueryScalingTests(TestCase):
+    """Fails when a view's query count depends on how much data it shows (an N+1)."""
+
+    SCALES = (3, 8)
+
+    def measure(self, scale):
+        cache.clear()
+        with transaction.atomic():
+            results = measure_urls(build_dataset(scale))
+            transaction.set_rollback(True)
+        # The next dataset can reuse the rolled-back ids
+        cache.clear()
+        return {result['key']: result['queries'] for result in results}
+
+    def test_query_counts_do_not_grow_with_the_dataset(self):
+        small, large = (self.measure(scale) for scale in self.SCALES)
+        self.assertEqual(
+            [], [f'{key}: {small[key]} queries at scale {self.SCALES[0]}, {large[key]} at {self.SCALES[1]}'
+                 for key in small if large.get(key) != small[key]],
+            'Query counts that grow with the data',
+        )
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ListPageQueryTests(TestCase):
+    def test_dog_list_queries_do_not_grow_with_the_catalogue(self):
+        seller = User.objects.create_user(username='seller', password='pw', role='seller')
+        url = reverse('dogs:list')
+        make_dog(seller)
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(url)
+        for i in range(12):
+            make_dog(seller, name=f'Extra {i}')
+        with self.assertNumQueries(len(before)):
+            self.client.get(url)
+
+
+class NormalizeSqlTests(SimpleTestCase):
+    def test_literals_and_in_lists_are_replaced(self):
+        self.assertEqual(
+            normalize_sql("SELECT *\n  FROM t WHERE id IN (%s, %s, %s) AND name = 'O''Brien' AND n > 10"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? AND n > ?',
+        )
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, MIDDLEWARE=INSTRUMENTED, PERF_SAMPLE_RATE=1.0,
+                   PERF_SLOW_QUERY_MS=0)
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_sampled_request_is_timed_and_logged(self):
+        with self.assertLogs('perf.requests', 'INFO') as logs:
+            response = self.client.get(reverse('home'))
+        timing = response['Server-Timing']
+        for metric in ('total;dur=', 'db;dur=', 'cache;dur=', 'tpl;dur='):
+            self.assertIn(metric, timing)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['view'], record['status']), ('home', 200))
+        self.assertGreater(record['db_queries'], 0)
+        self.assertGreater(record['render_ms'], 0)
+        # The homepage snapshot was not cached yet
+        self.assertGreaterEqual(record['cache_misses'], 1)
+        # Every query is "slow" at 0ms; they are reported without their parameters
+        self.assertEqual(record['slow_query_count'], record['db_queries'])
+        self.assertNotIn('%s', record['slow_queries'][0]['sql'])
+
+    @override_settings(PERF_SAMPLE_RATE=0.0)
+    def test_unsampled_request_is_left_alone(self):
+        with self.assertNoLogs('perf.requests'):
+            response = self.client.get(reverse('dogs:list'))
+        self.assertNotIn('Server-Timing', response)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=True, STRIPE_SECRET_KEY='sk_test_stub')
+class LoadTestJourneyTests(LiveServerTestCase):
+    def test_every_journey_runs_against_a_live_server(self):
+        stub = start_stripe_stub()
+        self.addCleanup(stub.shutdown)
+        self.addCleanup(setattr, stripe, 'api_base', stripe.api_base)
+        catalog = prepare(users=1, stripe_url=stub.url)
+        with override_settings(STRIPE_API_BASE=stub.url):
+            rows, _ = run(self.live_server_url, catalog, users=1, iterations=1)
+        self.assertEqual([], [(row['endpoint'], row['statuses']) for row in rows if row['errors']])
+        self.assertIn('accessories:checkout_pay', {row['endpoint'] for row in rows})
+
+    def test_failed_login_is_reported_as_an_error(self):
+        catalog = SimpleNamespace(usernames=['nobody'], dog_ids=[], accessory_ids=[], stripe_url=None)
+        with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+            rows, _ = run(self.live_server_url, catalog, users=1, iterations=1)
+        self.assertEqual({row['endpoint']: row['errors'] for row in rows}, {'accounts:login': 1})
+        self.assertIn('login as nobody failed', stderr.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=True)
+class LoadTestPrepareTests(TestCase):
+    def test_only_the_empty_listing_table_is_seeded(self):
+        build_dataset()
+        Accessory.objects.update(is_available=False)
+        catalog = prepare(users=1)
+        self.assertEqual(len(catalog.dog_ids), Dog.objects.count())
+        self.assertEqual(len(catalog.accessory_ids), 9)
+        self.assertEqual(User.objects.filter(username='perf-seller').count(), 1)
+
+
+class LoadTestRunnerTests(SimpleTestCase):
+    @override_settings(DEBUG=False)
+    def test_refuses_to_create_accounts_without_debug(self):
+        with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr, \
+                mock.patch('perf.loadtest.runner.prepare') as prepare_accounts:
+            with self.assertRaises(SystemExit):
+                main(['--users', '1'])
+        prepare_accounts.assert_not_called()
+        self.assertIn('--allow-production', stderr.getvalue())